@@ -5,4 +5,4 @@ from service import app
 logging.basicConfig(level=logging.WARNING)
 
 if __name__ == '__main__':
-    app.run()
+    app.main()
@@ -1,16 +1,273 @@
+import argparse
+import json
 import logging
+import os
+import signal
+from collections import Counter
+from contextlib import closing
 from datetime import datetime
+from pathlib import Path
+from typing import Any, List, Optional, Set, Tuple
 
-from service.config import load_from_yaml
-from service.worker import backup
+import yaml
+
+from service import benchmark
+from service.config import ArchiveRule, ConfigError, catalog_file, load_from_yaml, yaml_file
+from service.daemon import Daemon
+from service.routers.status import DEFAULT_HOST, DEFAULT_PORT, start_status_server
+from service.worker import backup, compress, dedup
+from service.worker.archive import Actualize, Archivator
+from service.worker.catalog import Catalog
+from service.worker.metrics import metrics
+from service.worker.pool import pool
+from service.worker.remotehost import HostPC
+from service.worker.stream import MB
+from service.worker.walker import split_path
 
 logger = logging.getLogger(__name__)
-config = load_from_yaml()
-start = datetime.now()
 
-def run():
+# Параметры команды bench: имя, тип, значение по умолчанию, описание
+BENCH_OPTIONS: Tuple[Tuple[str, Any, Any, str], ...] = (
+    ('--files', int, 100, 'количество файлов'),
+    ('--size-mb', float, 1, 'размер файла в MB'),
+    ('--targets', int, 1, 'количество целевых каталогов'),
+    ('--latency-ms', float, 2, 'задержка операции'),
+    ('--bandwidth-mb', float, 0, 'скорость сети, MB/s'),
+    ('--mode', str, 'tempfile', 'режим передачи файлов'),
+    ('--workers', int, 1, 'параллельных передач'),
+    ('--output', Path, None, 'JSON файл истории замеров'),
+    ('--label', str, '', 'метка замера, например версия'),
+)
+
+
+def run(report: Optional[Path] = None, prometheus: Optional[Path] = None):
+    """Запуск всех правил архивации.
+
+    Arguments:
+        report (Path): файл для JSON отчета с метриками SMB операций и передач.
+        prometheus (Path): файл метрик в текстовом формате Prometheus для node_exporter.
+    """
     logger.debug('start run fun')
-    backup.run(config)
+    start = datetime.now()
+    metrics.reset()
+    config = load_from_yaml()
+    results = backup.run(config)
     finish = datetime.now()
     long = finish - start
-    print(long)
+    print(backup.summary(results, long))
+    if report:
+        metrics.write_json(report)
+    if prometheus:
+        metrics.write_prometheus(prometheus)
+
+
+def run_daemon(config: Path, host: str, port: int):
+    """Запуск правил по расписанию schedule с HTTP интерфейсом состояния заданий."""
+    service_daemon = Daemon(config)
+    server = start_status_server(service_daemon, host, port)
+    signal.signal(signal.SIGTERM, lambda *_: service_daemon.stop())
+    logger.info(f'daemon started, status on http://{host}:{port}/status')
+    try:
+        service_daemon.serve()
+    except KeyboardInterrupt:
+        service_daemon.stop()
+    finally:
+        server.shutdown()
+
+
+def find_rule(name: str) -> ArchiveRule:
+    for rule in load_from_yaml():
+        if rule.name == name:
+            return rule
+    raise SystemExit(f'rule {name} not found in config')
+
+
+def restore(rule_name: str, filename: str, output: Path, target: int = 0):
+    """Восстановление файла, сохраненного правилом со сжатием или в режиме transfer_mode: dedup.
+
+    Файл правила с recursive задается путем относительно source_dir, например sub/a.bak.
+    Восстановленному из сжатой копии файлу возвращается время изменения источника.
+    """
+    target_data = find_rule(rule_name).filesmap.target[target]
+    target_host = HostPC(target_data.target_host)
+    header = None
+    with closing(pool):
+        with open(output, 'wb') as fh:
+            if target_data.compression is None:
+                size = dedup.restore(target_host, target_data.target_dir, filename, fh)
+            else:
+                copy_dir, name = split_path(target_data.target_dir, filename)
+                target_name = compress.copy_name(
+                    target_host, copy_dir, name, target_data.compression,
+                )
+                header = compress.restore(target_host, copy_dir, target_name, fh)
+                size = header['size']
+    if header is not None:
+        os.utime(output, (header['mtime'], header['mtime']))
+    print(f'{filename}: restored {size} bytes to {output}')
+
+
+def retention(rule_name: Optional[str], apply: bool = False):
+    """Вывод плана очистки целевых каталогов по политике хранения, с apply план выполняется."""
+    rule_list = [find_rule(rule_name)] if rule_name else load_from_yaml()
+    with closing(pool):
+        for rule in rule_list:
+            with Actualize(rule.filesmap, pool, rule.name) as archivator:
+                print_retention(rule.name, archivator, apply)
+
+
+def print_retention(name: str, archivator: Archivator, apply: bool) -> None:
+    for plan in archivator.retention_plan():
+        report = '\n'.join(plan.lines())
+        print(f'{name} {report}')
+    if apply and not archivator.garbage_clean():
+        print(f'{name}: some files were not deleted')
+
+
+def validate(config: Path):
+    """Проверка всех правил файла за один проход, без кэша и без подключения к хостам.
+
+    Raises:
+        SystemExit: файл правил не читается или содержит ошибки.
+    """
+    try:
+        rule_list = load_from_yaml(config, use_cache=False)
+    except (ConfigError, yaml.YAMLError, OSError) as exc:
+        errors = exc.errors if isinstance(exc, ConfigError) else [str(exc)]
+        for line in errors:
+            print(line)
+        errors_count = len(errors)
+        raise SystemExit(f'{config}: {errors_count} errors')
+    names = Counter(rule.name for rule in rule_list)
+    for name, count in names.items():
+        if count > 1:
+            print(f'rule name {name} is used {count} times')
+    rules_count = len(rule_list)
+    hosts_count = len(host_settings(rule_list))
+    print(f'{config}: {rules_count} rules, {hosts_count} host settings, OK')
+
+
+def host_settings(rule_list: List[ArchiveRule]) -> Set[int]:
+    """Функция возвращает различные настройки хостов правил, профиль считается один раз."""
+    source_hosts = {id(rule.filesmap.source_host) for rule in rule_list}
+    target_hosts = {
+        id(target.target_host) for rule in rule_list for target in rule.filesmap.target
+    }
+    return source_hosts | target_hosts
+
+
+def dedup_benchmark(paths: List[Path]):
+    """Оценка объема передачи в режиме dedup на последовательности локальных архивов."""
+    report = dedup.benchmark(paths)
+    logical = report['logical_bytes']
+    ratio = round(report['wire_bytes'] / logical, 4) if logical else 0
+    print(json.dumps({**report, 'wire_ratio': ratio}, indent=2))
+
+
+def run_benchmark(args: argparse.Namespace):
+    """Замер полного запуска правила на локальном имитаторе хранилищ."""
+    result_value = benchmark.run_benchmark(
+        files=args.files,
+        size=int(args.size_mb * MB),
+        targets=args.targets,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mb * MB,
+        transfer_mode=args.mode,
+        max_workers=args.workers,
+        max_host_workers=args.workers,
+    )
+    if args.output:
+        benchmark.save_result(result_value, args.output, args.label)
+    print(json.dumps(result_value, indent=2))
+
+
+def show_catalog(rule_name: Optional[str], filename: Optional[str]):
+    """Вывод истории копирования файлов из локального каталога."""
+    with closing(Catalog(catalog_file)) as catalog:
+        entries = catalog.history(rule=rule_name, filename=filename)
+    for entry in entries:
+        print(entry.describe())
+
+
+def add_run_command(commands: Any):
+    run_parser = commands.add_parser('run', help='выполнить все правила config.yaml')
+    run_parser.add_argument('--report', type=Path, help='JSON отчет о запуске')
+    run_parser.add_argument('--prometheus', type=Path, help='файл метрик для node_exporter')
+    run_parser.set_defaults(handler=lambda args: run(args.report, args.prometheus))
+
+
+def add_restore_command(commands: Any):
+    restore_parser = commands.add_parser('restore', help='восстановить сжатый или dedup файл')
+    restore_parser.add_argument('rule', help='имя правила архивации')
+    restore_parser.add_argument('filename', help='имя или путь исходного файла')
+    restore_parser.add_argument('output', type=Path, help='локальный путь для восстановления')
+    restore_parser.add_argument('--target', type=int, default=0, help='номер целевого каталога')
+    restore_parser.set_defaults(
+        handler=lambda args: restore(args.rule, args.filename, args.output, args.target),
+    )
+
+
+def add_dedup_bench_command(commands: Any):
+    bench_parser = commands.add_parser('dedup-bench', help='оценить эффект дедупликации')
+    bench_parser.add_argument('paths', type=Path, nargs='+', help='архивы в порядке создания')
+    bench_parser.set_defaults(handler=lambda args: dedup_benchmark(args.paths))
+
+
+def add_daemon_command(commands: Any):
+    daemon_parser = commands.add_parser('daemon', help='выполнять правила по расписанию')
+    daemon_parser.add_argument('--config', type=Path, default=yaml_file, help='файл правил')
+    daemon_parser.add_argument('--host', default=DEFAULT_HOST, help='адрес HTTP интерфейса')
+    daemon_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='порт HTTP')
+    daemon_parser.set_defaults(
+        handler=lambda args: run_daemon(args.config, args.host, args.port),
+    )
+
+
+def add_bench_command(commands: Any):
+    perf_parser = commands.add_parser('bench', help='замер скорости на имитаторе хранилищ')
+    for option, kind, default, help_text in BENCH_OPTIONS:
+        perf_parser.add_argument(option, type=kind, default=default, help=help_text)
+    perf_parser.set_defaults(handler=run_benchmark)
+
+
+def add_retention_command(commands: Any):
+    retention_parser = commands.add_parser('retention', help='план очистки целевых каталогов')
+    retention_parser.add_argument('--rule', help='имя правила архивации')
+    retention_parser.add_argument('--apply', action='store_true', help='выполнить удаление')
+    retention_parser.set_defaults(handler=lambda args: retention(args.rule, args.apply))
+
+
+def add_validate_command(commands: Any):
+    validate_parser = commands.add_parser('validate', help='проверить файл правил')
+    validate_parser.add_argument('--config', type=Path, default=yaml_file, help='файл правил')
+    validate_parser.set_defaults(handler=lambda args: validate(args.config))
+
+
+def add_catalog_command(commands: Any):
+    catalog_parser = commands.add_parser('catalog', help='история копирования файлов')
+    catalog_parser.add_argument('--rule', help='имя правила архивации')
+    catalog_parser.add_argument('--file', help='имя исходного файла')
+    catalog_parser.set_defaults(handler=lambda args: show_catalog(args.rule, args.file))
+
+
+COMMANDS = (
+    add_run_command,
+    add_restore_command,
+    add_dedup_bench_command,
+    add_daemon_command,
+    add_bench_command,
+    add_retention_command,
+    add_validate_command,
+    add_catalog_command,
+)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Разбор аргументов командной строки, без команды выполняются все правила."""
+    parser = argparse.ArgumentParser(prog='service')
+    parser.set_defaults(handler=lambda _: run())
+    commands = parser.add_subparsers(dest='command')
+    for add_command in COMMANDS:
+        add_command(commands)
+    args = parser.parse_args(argv)
+    args.handler(args)
@@ -0,0 +1,129 @@
+# Замер производительности архивации на локальном имитаторе SMB хранилищ
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from service.config import ArchiveRule
+from service.worker.archive import Actualize
+from service.worker.backends import LocalBackend
+from service.worker.metrics import metrics
+from service.worker.pool import ConnectionPool
+from service.worker.stream import MB
+
+SOURCE_DRIVE = 'share'
+SOURCE_DIR = '/archives/'
+
+# Параметры и результаты одного замера
+BenchResult = Dict[str, Any]
+
+
+def build_rule(files: int, size: int, targets: int, root: Path, **rule: Any) -> ArchiveRule:
+    """Функция создает исходный каталог из files файлов размером size и правило для него."""
+    source = root / 'source' / SOURCE_DRIVE / SOURCE_DIR.strip('/')
+    source.mkdir(parents=True)
+    for number in range(files):
+        archive_path = source / f'archive_{number:05d}.bak'
+        archive_path.write_bytes(os.urandom(size))
+    host = {
+        'pcname': 'bench',
+        'username': 'bench',
+        'pwd': '',  # noqa: S105 имитатор хранилищ не проверяет учетные данные
+        'namelocalpc': 'bench',
+    }
+    target_list = []
+    for position in range(targets):
+        target_name = f'target{position}'
+        backup_dir = root / target_name / SOURCE_DRIVE / 'backup'
+        backup_dir.mkdir(parents=True)
+        target_list.append({
+            'target_host': dict(host, host=target_name, backend='local'),
+            'target_dir': {'drive': SOURCE_DRIVE, 'dir': '/backup/'},
+            'target_limit_count': None,
+        })
+    return ArchiveRule(
+        name='benchmark',
+        method=1,
+        filesmap={
+            'source_host': dict(host, host='source', backend='local'),
+            'source_dir': {'drive': SOURCE_DRIVE, 'dir': SOURCE_DIR},
+            'rule': dict({'source_storage_days': -1}, **rule),
+            'target': target_list,
+        },
+    )
+
+
+def run_benchmark(
+    files: int = 100,
+    size: int = MB,
+    targets: int = 1,
+    latency: float = 0.002,
+    bandwidth: float = 0,
+    **rule: Any,
+) -> Dict[str, Any]:
+    """Функция выполняет полный запуск Actualize на имитаторе хранилищ и замеряет его.
+
+    Arguments:
+        files (int): количество файлов в исходном каталоге.
+        size (int): размер каждого файла в байтах.
+        targets (int): количество целевых каталогов.
+        latency (float): задержка каждой операции имитатора в секундах.
+        bandwidth (float): ограничение скорости передачи в байтах в секунду, 0 - без ограничения.
+        rule: дополнительные параметры правила (transfer_mode, max_workers и т.д.).
+
+    Returns:
+        Dict[str, Any]: параметры и результаты замера.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        archive_rule = build_rule(files, size, targets, root, **rule)
+        archivator, seconds = timed_run(archive_rule, root, latency, bandwidth)
+    round_trips = sum(op['count'] for op in metrics.report()['operations'])
+    copied = sum(stats.files for stats in archivator.stats.targets.values())
+    round_trips_per_file = round(round_trips / files, 2) if files else 0
+    mb_per_sec = round(copied * size / MB / seconds, 2)
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'files': files,
+        'size': size,
+        'targets': targets,
+        'latency': latency,
+        'bandwidth': bandwidth,
+        'rule': rule,
+        'seconds': round(seconds, 3),
+        'copied': copied,
+        'files_per_sec': round(copied / seconds, 2),
+        'mb_per_sec': mb_per_sec,
+        'round_trips_per_file': round_trips_per_file,
+    }
+
+
+def timed_run(
+    archive_rule: ArchiveRule, root: Path, latency: float, bandwidth: float,
+) -> Tuple[Actualize, float]:
+    """Функция выполняет правило на имитаторе хранилищ в root и возвращает время запуска."""
+    pool = ConnectionPool(backend=LocalBackend(root, latency, bandwidth or None))
+    archivator = Actualize(
+        archive_rule.filesmap,
+        pool,
+        archive_rule.name,
+        chunk_index_path=root / 'chunks.sqlite3',
+        catalog_path=root / 'catalog.sqlite3',
+    )
+    metrics.reset()
+    started = time.perf_counter()
+    archivator.run()
+    seconds = time.perf_counter() - started
+    pool.close()
+    return archivator, seconds
+
+
+def save_result(result_value: BenchResult, path: Path, label: str) -> List[BenchResult]:
+    """Функция дописывает результат в JSON файл истории замеров под меткой label."""
+    history = json.loads(path.read_text()) if path.exists() else []
+    history.append(dict(result_value, label=label))
+    path.write_text(json.dumps(history, indent=2))
+    return history
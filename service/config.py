@@ -1,21 +1,193 @@
+import hashlib
+import logging
+import os
+import pickle  # noqa: S403 кэш создается и читается только этим сервисом
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 
-from service.models import FilesMap
+from service.models import FilesMap, RemoteHost
+from service.worker.cron import CronSchedule
+
+logger = logging.getLogger(__name__)
 
 yaml_file = Path('config.yaml')
+chunk_index_file = Path('chunks.sqlite3')
+catalog_file = Path('catalog.sqlite3')
+
+HOSTS_KEY = 'hosts'
+RULES_KEY = 'rules'
+CACHE_SUFFIX = '.cache'
+
+# Профили хостов раздела hosts по именам
+Hosts = Dict[str, RemoteHost]
+
+# Загрузчик на libyaml, если PyYAML собран с ним, в несколько раз быстрее чистого Python
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
 class ArchiveRule(BaseModel):
     name: str
     method: int
     filesmap: FilesMap
+    schedule: Optional[str] = None  # расписание запуска в режиме daemon в формате cron
+
+    @validator('schedule')
+    def valid_schedule(cls, value: Optional[str]) -> Optional[str]:  # noqa: N805 pydantic
+        if value is not None:
+            CronSchedule(value)
+        return value
+
+
+class ConfigError(ValueError):
+    """Ошибки файла правил архивации, собранные по всем правилам.
+
+    Attributes:
+        errors (List[str]): описание каждой ошибки.
+    """
+
+    def __init__(self, errors: List[str]):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def host_profiles(section: Any) -> Tuple[Hosts, List[str]]:
+    """Функция строит профили хостов раздела hosts и возвращает их с ошибками."""
+    if not isinstance(section, dict):
+        return {}, [f'{HOSTS_KEY}: must be a mapping of profile names']
+    hosts: Hosts = {}
+    errors = []
+    for name, fields in section.items():
+        try:
+            hosts[str(name)] = RemoteHost(**fields)
+        except (ValueError, TypeError) as exc:
+            errors.append(f'host {name}: {exc}')
+    return hosts, errors
+
+
+def resolve_hosts(rule: Dict[str, Any], hosts: Hosts) -> Dict[str, Any]:
+    """Функция заменяет имена профилей в source_host и target_host правила объектами RemoteHost.
+
+    Ссылка на неизвестный профиль приводит к ValueError из host_profile.
+    """
+    filesmap = rule.get('filesmap')
+    if not isinstance(filesmap, dict):
+        return rule
+    filesmap = dict(filesmap)
+    source_host = filesmap.get('source_host')
+    if source_host is not None:
+        filesmap['source_host'] = host_profile(source_host, hosts)
+    if isinstance(filesmap.get('target'), list):
+        filesmap['target'] = [
+            dict(target, target_host=host_profile(target['target_host'], hosts))
+            if isinstance(target, dict) and 'target_host' in target else target
+            for target in filesmap['target']
+        ]
+    return dict(rule, filesmap=filesmap)
+
+
+def host_profile(value: Any, hosts: Hosts) -> Any:
+    """Функция возвращает профиль по имени value, значение другого типа - без изменений.
+
+    Raises:
+        ValueError: профиль с именем value не задан в разделе hosts.
+    """
+    if not isinstance(value, str):
+        return value
+    if value not in hosts:
+        raise ValueError(f'unknown host profile {value}')
+    return hosts[value]
+
+
+def compile_config(data: Any) -> List[ArchiveRule]:
+    """Функция строит правила архивации по содержимому config.yaml.
+
+    Файл - список правил либо словарь с разделами hosts (профили хостов) и rules (правила,
+    которые ссылаются на профили по имени). Проверяются все правила, ошибки собираются
+    в одно исключение.
+
+    Raises:
+        ConfigError: ошибки в профилях хостов или правилах.
+    """
+    hosts: Hosts = {}
+    errors: List[str] = []
+    rule_list = data
+    if isinstance(data, dict):
+        hosts, errors = host_profiles(data.get(HOSTS_KEY) or {})
+        rule_list = data.get(RULES_KEY)
+    if not isinstance(rule_list, list):
+        raise ConfigError(errors + [f'{RULES_KEY}: must be a list of rules'])
+    rules = []
+    for number, rule in enumerate(rule_list):
+        try:
+            rules.append(ArchiveRule(**resolve_hosts(rule, hosts)))
+        except (ValueError, TypeError) as exc:
+            label = rule_label(number, rule)
+            errors.append(f'{label}: {exc}')
+    if errors:
+        raise ConfigError(errors)
+    return rules
+
+
+def rule_label(number: int, rule: Any) -> str:
+    """Функция возвращает обозначение правила в сообщениях об ошибках."""
+    name = rule.get('name') if isinstance(rule, dict) else None
+    if name:
+        return f'rule {number} {name}'
+    return f'rule {number}'
+
+
+@lru_cache(maxsize=1)
+def schema_digest() -> bytes:
+    """Функция возвращает хеш моделей правил, при их изменении кэш правил не используется."""
+    digest = hashlib.sha256()
+    for module in (Path(__file__), Path(__file__).with_name('models.py')):
+        digest.update(module.read_bytes())
+    return digest.digest()
+
+
+def cache_path(path: Path) -> Path:
+    return path.with_name(f'{path.name}{CACHE_SUFFIX}')
+
+
+def read_cache(path: Path, key: str) -> Optional[List[ArchiveRule]]:
+    try:
+        with open(path, 'rb') as fh:
+            cached_key, rules = pickle.load(fh)  # noqa: S301 файл создан write_cache
+    except Exception:
+        return None
+    return rules if cached_key == key else None
+
+
+def write_cache(path: Path, key: str, rules: List[ArchiveRule]) -> None:
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    try:
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump((key, rules), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logger.debug(f'config cache {path} is not saved: {exc}')
+
 
+def load_from_yaml(path: Path = yaml_file, use_cache: bool = True) -> List[ArchiveRule]:
+    """Функция загружает правила архивации из config.yaml.
 
-def load_from_yaml() -> List[ArchiveRule]:
-    with open(yaml_file) as fh:
-        rule_list = yaml.safe_load(fh)
-    return [ArchiveRule(**rule) for rule in rule_list]
+    Построенные правила сохраняются в кэш рядом с файлом. Ключ кэша - хеш содержимого
+    файла и моделей правил, при совпадении ключа разбор YAML и проверка моделей
+    пропускаются. Ошибки в профилях хостов или правилах передаются исключением
+    ConfigError из compile_config.
+    """
+    content = Path(path).read_bytes()
+    key = hashlib.sha256(schema_digest() + content).hexdigest()
+    cache = cache_path(Path(path))
+    if use_cache:
+        rules = read_cache(cache, key)
+        if rules is not None:
+            return rules
+    rules = compile_config(yaml.load(content, Loader=YamlLoader))  # noqa: S506 SafeLoader
+    if use_cache:
+        write_cache(cache, key, rules)
+    return rules
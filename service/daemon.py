@@ -0,0 +1,249 @@
+# Режим daemon: запуск правил архивации по расписанию без перезапуска процесса
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from service.config import ArchiveRule, load_from_yaml, yaml_file
+from service.worker import backup
+from service.worker.archive import Archivator
+from service.worker.cron import CronSchedule
+from service.worker.pool import pool
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 5
+KEEPALIVE_SECONDS = 30
+
+
+def isoformat(moment: Optional[datetime]) -> Optional[str]:
+    return moment.isoformat(timespec='seconds') if moment else None
+
+
+def next_run(schedule: Optional[CronSchedule], moment: datetime) -> Optional[datetime]:
+    """Функция возвращает время следующего запуска, None если правило не запускается само."""
+    if schedule is None:
+        return None
+    try:
+        return schedule.next_after(moment)
+    except ValueError as exc:
+        logger.warning(str(exc))
+        return None
+
+
+def job_names(rule_list: List[ArchiveRule]) -> List[str]:
+    """Функция возвращает уникальные имена заданий, повторные имена правил нумеруются."""
+    seen: Dict[str, int] = {}
+    names = []
+    for rule in rule_list:
+        count = seen.get(rule.name, 0) + 1
+        seen[rule.name] = count
+        name = rule.name
+        if count > 1:
+            name = f'{name}#{count}'
+        names.append(name)
+    return names
+
+
+@dataclass
+class Job:
+    """Состояние правила архивации в режиме daemon."""
+
+    rule: ArchiveRule
+    schedule: Optional[CronSchedule]
+    next_run: Optional[datetime] = None
+    running: bool = False
+    runs: int = 0
+    last_start: Optional[datetime] = None
+    last_finish: Optional[datetime] = None
+    last_result: Optional[backup.RuleResult] = None
+    archivator: Optional[Archivator] = None
+
+    def is_due(self, now: datetime) -> bool:
+        """Метод проверяет, что задание не выполняется и время его запуска наступило."""
+        if self.running or self.next_run is None:
+            return False
+        return self.next_run <= now
+
+    def status(self) -> Dict[str, Any]:
+        progress = None
+        if self.running and self.archivator is not None:
+            progress = self.archivator.stats.snapshot()
+        return {
+            'rule': self.rule.name,
+            'schedule': self.rule.schedule,
+            'running': self.running,
+            'runs': self.runs,
+            'next_run': isoformat(self.next_run),
+            'last_start': isoformat(self.last_start),
+            'last_finish': isoformat(self.last_finish),
+            'last_result': asdict(self.last_result) if self.last_result else None,
+            'progress': progress,
+        }
+
+
+class Daemon:
+    """Планировщик, выполняющий правила config.yaml по их расписанию schedule.
+
+    config.yaml перечитывается при изменении файла, ошибочный файл не применяется и задания
+    продолжают работать по прежним правилам. Правила с общими хостами, как и в backup.run,
+    не выполняются одновременно. Общий пул соединений не закрывается между запусками,
+    простаивающие соединения периодически проверяются ConnectionPool.keepalive.
+
+    Attributes:
+        config_path (Path): файл правил архивации.
+        jobs (Dict[str, Job]): задания по именам правил.
+        config_error (str): ошибка последнего чтения config.yaml.
+    """
+
+    def __init__(
+        self, config_path: Path = yaml_file, max_parallel: int = backup.MAX_PARALLEL_RULES,
+    ):
+        self.config_path = config_path
+        self.jobs: Dict[str, Job] = {}
+        self.config_error: Optional[str] = None
+        self.started = datetime.now()
+        self._config_mtime: Optional[int] = None
+        self._config_digest: Optional[str] = None
+        self._executor = ThreadPoolExecutor(max(max_parallel, 1), thread_name_prefix='rule')
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def reload(self) -> bool:
+        """Метод перечитывает config.yaml, если файл изменился.
+
+        Returns:
+            bool: True если применены новые правила.
+        """
+        try:
+            mtime = self.config_path.stat().st_mtime_ns
+            if mtime == self._config_mtime:
+                return False
+            self._config_mtime = mtime
+            digest = hashlib.sha256(self.config_path.read_bytes()).hexdigest()
+            if digest == self._config_digest:
+                return False
+            rule_list = load_from_yaml(self.config_path)
+        except Exception as exc:
+            logger.error(f'config {self.config_path} is not applied: {exc}')
+            self.config_error = str(exc)
+            return False
+        self._config_digest = digest
+        self.config_error = None
+        self._apply(rule_list, datetime.now())
+        rules_count = len(rule_list)
+        logger.info(f'config {self.config_path} loaded, {rules_count} rules')
+        return True
+
+    def tick(self, now: datetime) -> None:
+        """Метод запускает задания, время которых наступило."""
+        self.reload()
+        with self._lock:
+            busy = self._busy_hosts()
+            for job in self.jobs.values():
+                if not job.is_due(now):
+                    continue
+                hosts = backup.rule_hosts(job.rule)
+                if hosts & busy:
+                    continue
+                busy |= hosts
+                self._start(job, now)
+
+    def trigger(self, name: str) -> bool:
+        """Метод ставит задание name на запуск при следующей проверке расписания."""
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is None:
+                return False
+            if not job.running:
+                job.next_run = datetime.now()
+            return True
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'started': isoformat(self.started),
+                'config': str(self.config_path),
+                'config_error': self.config_error,
+                'jobs': {name: job.status() for name, job in self.jobs.items()},
+            }
+
+    def serve(self) -> None:
+        """Метод выполняет задания по расписанию до вызова stop."""
+        with closing(pool):
+            with self._executor:
+                self._loop()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        keepalive_at = time.monotonic() + KEEPALIVE_SECONDS
+        while not self._stop.is_set():
+            self.tick(datetime.now())
+            if time.monotonic() >= keepalive_at:
+                pool.keepalive()
+                keepalive_at = time.monotonic() + KEEPALIVE_SECONDS
+            self._stop.wait(TICK_SECONDS)
+
+    def _busy_hosts(self) -> Set[str]:
+        busy: Set[str] = set()
+        for job in self.jobs.values():
+            if job.running:
+                busy |= backup.rule_hosts(job.rule)
+        return busy
+
+    def _start(self, job: Job, now: datetime) -> None:
+        job.running = True
+        job.last_start = now
+        job.archivator = None
+        self._executor.submit(self._run_job, job)
+
+    def _apply(self, rule_list: List[ArchiveRule], now: datetime) -> None:
+        with self._lock:
+            self.jobs = {
+                name: self._updated_job(name, rule, now)
+                for name, rule in zip(job_names(rule_list), rule_list)
+            }
+
+    def _updated_job(self, name: str, rule: ArchiveRule, now: datetime) -> Job:
+        """Метод возвращает задание name с правилом rule, сохраняя состояние прежнего задания.
+
+        При изменении расписания время следующего запуска пересчитывается, если задание
+        сейчас не выполняется.
+        """
+        job = self.jobs.get(name)
+        if job is not None and job.rule.schedule == rule.schedule:
+            job.rule = rule
+            return job
+        schedule = CronSchedule(rule.schedule) if rule.schedule else None
+        if job is None:
+            job = Job(rule, schedule)
+        job.rule = rule
+        job.schedule = schedule
+        if not job.running:
+            job.next_run = next_run(schedule, now)
+        return job
+
+    def _run_job(self, job: Job) -> None:
+        def attach(archivator: Archivator) -> None:
+            job.archivator = archivator
+
+        rule = job.rule
+        try:
+            result_value = backup.run_rule(rule, on_start=attach)
+        except Exception:
+            logger.exception(f'rule {rule.name} failed')
+            result_value = backup.RuleResult(rule.name, success=False, seconds=0)
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            job.last_finish = datetime.now()
+            job.last_result = result_value
+            job.next_run = next_run(job.schedule, job.last_finish)
@@ -1,16 +1,80 @@
+from datetime import time
+from enum import Enum
 from typing import Any, List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
+
+
+class RateWindow(BaseModel):
+    """Ограничение скорости обмена с компьютером в интервале времени суток.
+
+    Интервал с start больше end переходит через полночь. mb_per_sec: null снимает ограничение.
+    """
+
+    start: time
+    end: time
+    mb_per_sec: Optional[float]
+
+    @validator('start', 'end', pre=True)
+    def sexagesimal_time(cls, value: Any) -> Any:  # noqa: N805 метод класса pydantic
+        # YAML 1.1 читает 18:00 без кавычек как число минут 1080
+        if isinstance(value, int):
+            return time(value // 60, value % 60)
+        return value
+
+    @validator('mb_per_sec')
+    def positive_rate(cls, value: Optional[float]) -> Optional[float]:  # noqa: N805 pydantic
+        if value is not None and value <= 0:
+            raise ValueError('mb_per_sec must be greater than 0, null removes the limit')
+        return value
+
+
+class Timeouts(BaseModel):
+    """Таймауты операций с удаленным компьютером в секундах."""
+
+    connect: float = 20
+    listing: int = 30
+    stat: int = 30
+    transfer: int = 30  # ожидание очередного блока данных при чтении и записи файла
+    modify: int = 30  # удаление, переименование, создание каталога
+
+
+class RetryPolicy(BaseModel):
+    """Повторы операций при сетевых сбоях и отключение недоступного компьютера.
+
+    Операция повторяется до attempts раз с экспоненциальной задержкой от base_delay до
+    max_delay со случайным разбросом. После breaker_failures сбоев подряд обращения
+    к компьютеру сразу завершаются ошибкой, через breaker_reset секунд выполняется
+    пробное обращение.
+    """
+
+    attempts: int = 3
+    base_delay: float = 1
+    max_delay: float = 30
+    breaker_failures: int = 3
+    breaker_reset: float = 60
 
 
 class RemoteHost(BaseModel):
-    """Данные для подключения к удаленному компьютеру."""
+    """Данные для подключения к удаленному компьютеру.
+
+    rate_limits задает ограничения скорости по времени суток, вне интервалов скорость
+    не ограничивается. Профиль хоста из раздела hosts config.yaml передается во все
+    правила, которые на него ссылаются, одним объектом, без копирования.
+    """
+
+    class Config:
+        copy_on_model_validation = 'none'
 
     host: str
     pcname: str
     username: str
     pwd: str
     namelocalpc: str
+    backend: str = 'smb'
+    rate_limits: List[RateWindow] = []
+    timeouts: Timeouts = Timeouts()
+    retry: RetryPolicy = RetryPolicy()
 
 
 class RemoteDir(BaseModel):
@@ -20,11 +84,56 @@ class RemoteDir(BaseModel):
     dir: str
 
 
+class TransferMode(str, Enum):  # noqa: WPS600 строковое перечисление для yaml
+    """Способ передачи файла из источника в целевой каталог."""
+
+    tempfile = 'tempfile'  # через локальный временный файл
+    stream = 'stream'  # потоком через кольцевой буфер в памяти
+    dedup = 'dedup'  # блоками с дедупликацией в хранилище целевого каталога
+
+
+class CompressionMethod(str, Enum):  # noqa: WPS600 строковое перечисление для yaml
+    """Алгоритм сжатия файлов в целевом каталоге."""
+
+    zstd = 'zstd'  # требует пакет zstandard, без него используется lzma
+    lzma = 'lzma'
+
+
+class Compression(BaseModel):
+    """Настройки сжатия файлов при копировании в целевой каталог."""
+
+    method: CompressionMethod = CompressionMethod.zstd
+    level: int = 3
+    threads: int = 0  # 0 - по количеству ядер процессора
+
+
 class ActualizeRule(BaseModel):
     """Правила переноса файлов ."""
 
     source_storage_days: int
     source_delete: bool = False
+    transfer_mode: TransferMode = TransferMode.tempfile
+    stream_buffer_mb: int = 16
+    verify: bool = False
+    max_workers: int = 1
+    max_host_workers: int = 1
+    recursive: bool = False
+    walk_workers: int = 4
+    fanout: bool = False  # копировать файл во все целевые каталоги за одно чтение источника
+    quiet_seconds: int = 0  # файл копируется, если не менялся столько секунд, 0 - без проверки
+
+
+class Retention(BaseModel):
+    """Политика хранения копий в целевом каталоге по схеме GFS.
+
+    Сохраняются keep_last последних копий и самая новая копия в каждом из keep_daily
+    последних дней, keep_weekly недель и keep_monthly месяцев, остальные копии удаляются.
+    """
+
+    keep_last: int = 0
+    keep_daily: int = 0
+    keep_weekly: int = 0
+    keep_monthly: int = 0
 
 
 class TargetData(BaseModel):
@@ -33,6 +142,24 @@ class TargetData(BaseModel):
     target_host: RemoteHost
     target_dir: RemoteDir
     target_limit_count: Optional[int]
+    compression: Optional[Compression] = None
+    retention: Optional[Retention] = None
+
+
+class Selection(BaseModel):
+    """Отбор файлов источника по имени, размеру и возрасту.
+
+    Шаблоны имен - glob без учета регистра, шаблон с префиксом 're:' - регулярное выражение.
+    Файл отбирается, если подходит под один из include (или include пуст) и ни под один
+    из exclude. Возраст задается в днях от времени запуска.
+    """
+
+    include: List[str] = []
+    exclude: List[str] = []
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    min_age_days: Optional[float] = None
+    max_age_days: Optional[float] = None
 
 
 class FilesMap(BaseModel):
@@ -42,3 +169,4 @@ class FilesMap(BaseModel):
     source_dir: RemoteDir
     rule: Union[ActualizeRule, Any]
     target: List[TargetData]
+    selection: Selection = Selection()
@@ -0,0 +1,82 @@
+# HTTP интерфейс состояния заданий режима daemon
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Tuple
+from urllib.parse import unquote
+
+from service.worker.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+def job_to_run(path: str) -> Optional[str]:
+    """Функция возвращает имя правила из пути /jobs/<имя правила>/run, None для других путей."""
+    parts = path.strip('/').split('/')
+    if len(parts) != 3:
+        return None
+    prefix, name, action = parts
+    if prefix != 'jobs' or action != 'run':
+        return None
+    return unquote(name)
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов.
+
+    GET /status - состояние и ход выполнения заданий в JSON,
+    GET /metrics - метрики в текстовом формате Prometheus,
+    POST /jobs/<имя правила>/run - внеочередной запуск правила.
+    """
+
+    server: 'StatusServer'
+
+    def do_GET(self) -> None:  # noqa: N802 интерфейс BaseHTTPRequestHandler
+        if self.path == '/status':
+            body = json.dumps(self.server.daemon.status(), indent=2, ensure_ascii=False)
+            self._send(200, body, 'application/json')
+        elif self.path == '/metrics':
+            self._send(200, metrics.prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self._send(404, 'not found\n', 'text/plain')
+
+    def do_POST(self) -> None:  # noqa: N802 интерфейс BaseHTTPRequestHandler
+        name = job_to_run(self.path)
+        if name is not None and self.server.daemon.trigger(name):
+            self._send(202, 'scheduled\n', 'text/plain')
+        else:
+            self._send(404, 'not found\n', 'text/plain')
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 имя из базового класса
+        logger.debug(format % args)
+
+    def _send(self, code: int, body: str, content_type: str) -> None:
+        data = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StatusServer(ThreadingHTTPServer):
+    """HTTP сервер состояния, daemon - объект с методами status и trigger."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], daemon: Any):
+        super().__init__(address, StatusHandler)
+        self.daemon = daemon
+
+
+def start_status_server(
+    daemon: Any, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+) -> StatusServer:
+    """Функция запускает HTTP сервер состояния в фоновом потоке."""
+    server = StatusServer((host, port), daemon)
+    threading.Thread(target=server.serve_forever, name='status', daemon=True).start()
+    return server
@@ -1,202 +1,1382 @@
-import logging
-import tempfile
-from datetime import datetime, timedelta
-from typing import List
-
-from smb.base import SharedFile
-
-from service.models import FilesMap, RemoteDir, TargetData
-from service.worker.remotehost import HostPC
-
-logger = logging.getLogger(__name__)
-
-
-class Archivator:
-    """Класс отвечает за управление процессом архивации файлов."""
-
-    def __init__(self, navigator: FilesMap):
-        """Init Actualize class.
-
-        Arguments:
-            navigator (FilesMap): набор правил архивации.
-        """
-        self.source_host = HostPC(navigator.source_host)
-        self.source_conn = self.source_host.connection
-        self.source_dir = navigator.source_dir
-        self.rule = navigator.rule
-        self.target_list: List[TargetData] = navigator.target
-
-    def period_control(self, target_file: SharedFile, rule: int) -> bool:
-        """Метод сравнивает дату файла и теущую дату.
-
-        Возвращает True если дата файла меньше текущей даты на заданное rule количество дней.
-        Если задать rule отрицательным, тогда True если дата файла больше текущей даты на rule.
-        При rule = 0 месяца одинаковые.
-        """
-        file_date = datetime.fromtimestamp(target_file.last_write_time)
-        control_date = datetime.now() - timedelta(days=rule)
-        if rule != 0:
-            if control_date >= file_date:
-                return True
-            else:
-                return False  # noqa:WPS503 условие применяется для rule != 0
-        if control_date.month == file_date.month:
-            return True
-        return False
-
-    def delete_old_file(
-        self, source_file: SharedFile, source_dir: RemoteDir, del_tag: bool,
-    ) -> bool:
-        """Метод удаляет файл на удаленном компьютере при необходимости.
-
-        Arguments:
-            source_file (SharedFile): файл для удаления.
-            source_dir (RemoteDir): местонахождение файла.
-            del_tag (bool): признак необходиомти удаления файла.
-
-        Returns:
-            bool:  True если файл удален успешно.
-        """
-        if not del_tag:
-            return True
-        logger.debug(f'delete file {source_file.filename} {source_dir}')
-        return self.source_host.delete_file(source_file, source_dir)
-
-    def garbage_clean(self) -> bool:
-        """."""
-        for target in self.target_list:
-            if not target.target_limit_count:
-                return False
-            target_host = HostPC(target.target_host)
-            archive_files = target_host.remote_files(target.target_dir)
-            if not archive_files:
-                return False
-            garbage_files = self._get_garbage_files(target, archive_files)
-            if not garbage_files:
-                return False
-            for old_file in garbage_files:
-                if not self.delete_old_file(old_file, target.target_dir, del_tag=True):
-                    return False
-        return True
-
-    def _get_garbage_files(
-        self, target_rule: TargetData, archive_files: List[SharedFile],
-    ) -> List[SharedFile]:
-        """Метод формирует список файлов подлежащих удалению в заданной дирректории.
-
-        Arguments:
-            target_rule (TargetData): набор правил для удаленной дирректории с архивными файлами,
-                нам необходим target_rule.target_limit_count, который устанавливает минимальное
-                количество файлов, которые должны остаться в дирректории.
-            archive_files (List[SharedFile]): список файлов, находящихся в заданной директории,
-                которые проверяются на необходимость удаления.
-        """
-        
-        files_dict = {}
-        for archive_file in archive_files:
-            files_dict[archive_file] = datetime.fromtimestamp(archive_file.last_write_time)
-        garbage_dict = {
-            file: file_date for file, file_date in sorted(
-                files_dict.items(), key=lambda item: item[1],
-            )
-        }
-        old_items = len(list(garbage_dict)) - target_rule.target_limit_count
-        if old_items < 0:
-            return []
-        return list(garbage_dict)[:old_items]
-
-
-class Actualize(Archivator):
-    """Класс содержит правила по переносу файлов в зависимости от даты создания.
-
-    Attributes:
-        source_host (HostPC): настройки удаленного компьютера, откуда копируются файлы.
-        source_conn (SMBConnection): метод устанавливает соеденияние с удаленным компьютером.
-        source_dir (RemoteDir): сведения о пути до дирректории откуда копируются файлы.
-        target_list (List[TargetData]): перечень удаленных компьютеров и дирректорий куда \
-            архивируются файлы.
-    """
-
-    def copy_file(
-        self, source_file: SharedFile, target_host: HostPC, target_dir: RemoteDir,
-    ) -> bool:
-        """Метод копирует файл из источника в целевой каталог.
-
-        Arguments:
-            source_file (SharedFile): файл для копирования.
-            target_host (HostPC): настройки подключения к удаленному компьютеру.
-            target_dir (RemoteDir): расположения каталога куда копируются файлы.
-
-        Returns:
-            bool:  True если файл скопирован успешно.
-        """
-        source_path = '{0}{1}'.format(self.source_dir.dir, source_file.filename)
-        target_path = '{0}{1}'.format(target_dir.dir, source_file.filename)
-        if target_host.file_exists(source_file, target_dir):
-            return True
-        try:
-            with tempfile.NamedTemporaryFile() as tmp:
-                # Подключение к удаленному компьютеру получение файл_объект метод read
-                self.source_conn().retrieveFile(self.source_dir.drive, source_path, tmp)
-                # Переход в начало файл_объект
-                tmp.seek(0)
-                # Подключению к удаленному компьютеру запись файл_объекта в файл метод write
-                target_host.connection().storeFileFromOffset(target_dir.drive, target_path, tmp)
-            self.source_conn().close()
-            if target_host.file_exists(source_file, target_dir):
-                target_host.connection().close()
-                return True
-            return False
-        except Exception:
-            self.source_conn().close()
-            target_host.connection().close()
-            return False
-
-    def search_old_source(self, source_file: SharedFile) -> bool:
-        """Метод запускает процесс архивации если файл соответствует правилу времени.
-
-        В теле метода запускается цикл для каждого целевого каталога архивирования.
-
-        Arguments:
-            source_file (SharedFile): файл для архивации.
-
-        Returns:
-            bool:  True если файл архиврован успешно.
-        """
-        if self.period_control(source_file, self.rule.source_storage_days):
-            copy_errors = []
-            for target in self.target_list:
-                if not self.copy_file(source_file, HostPC(target.target_host), target.target_dir):
-                    copy_errors.append(True)
-            if not copy_errors:
-                return self.delete_old_file(source_file, self.source_dir, self.rule.source_delete)
-            return False
-        return False
-
-    def run(self) -> bool:
-        logger.debug('start run fun')
-        files = self.source_host.remote_files(self.source_dir)
-        logger.debug(f'Get files {files}')
-        if not files:
-            return False
-        for file in files:
-            if not file:
-                continue
-            result = self.search_old_source(file)
-            if not result:
-                message = """
-Файл {0} не обработан. Возраст файла не менее {1} дней, подлежит удалению \
-в исходном каталоге - {2}""".format(
-                    file.filename, self.rule.source_storage_days, self.rule.source_delete,
-                )
-                logger.debug(message)
-        logger.debug('operation complete')
-        self.garbage_clean()
-        return True
-
-
-class Overwrite(Archivator):
-    """Класс содержит правила по перезаписи существующих файлов на актуальные."""
-
-    def run(self):
-        return True
+import io
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from smb.base import SharedFile
+
+from service import config
+from service.models import (
+    Compression,
+    FilesMap,
+    RemoteDir,
+    RemoteHost,
+    Retention,
+    TargetData,
+    TransferMode,
+)
+from service.worker import catalog, compress, dedup, retention, stream
+from service.worker.checksum import HashingWriter
+from service.worker.dirindex import DirIndex
+from service.worker.metrics import metrics
+from service.worker.pool import ConnectionPool
+from service.worker.pool import pool as shared_pool
+from service.worker.remotehost import HostPC
+from service.worker.retry import HostUnavailable, backoff_delay
+from service.worker.scheduler import TransferScheduler, TransferStats, completed
+from service.worker.selection import FileSelector
+from service.worker.stability import StabilityCheck
+from service.worker.walker import TreeEntry, TreeWalker, subdir
+
+logger = logging.getLogger(__name__)
+
+PART_SUFFIX = '.part'
+MAX_CLEAN_HOSTS = 8
+
+CopyResult = Tuple[bool, Optional[str]]
+# Хранилище блоков режима dedup: хост и каталог
+ChunkStore = Tuple[HostPC, RemoteDir]
+# Результат копирования в один каталог общей передачи: успех, контрольная сумма и каталог копии
+FanoutResult = Tuple[bool, Optional[str], RemoteDir]
+# Подготовленная запись общей передачи с позицией ее каталога в результатах
+Prepared = Tuple[int, Any]
+
+
+def retrieve(target_host: HostPC, target_dir: RemoteDir, filename: str, output: Any) -> int:
+    """Функция читает копию, которая хранится как есть, в файл_объект output.
+
+    Returns:
+        int: количество прочитанных байт.
+    """
+    target_path = f'{target_dir.dir}{filename}'
+    with target_host.session() as target_conn:
+        _, size = target_conn.retrieveFile(target_dir.drive, target_path, output)
+    return size
+
+
+def resume_offset(source_file: SharedFile, part_file: Optional[SharedFile]) -> int:
+    """Функция возвращает позицию, с которой можно продолжить прерванное копирование.
+
+    Недокачанный файл продолжается, если он короче источника и источник не менялся после
+    начала копирования, иначе копирование начинается заново.
+    """
+    if part_file is None:
+        return 0
+    if part_file.file_size >= source_file.file_size:
+        return 0
+    if part_file.last_write_time < source_file.last_write_time:
+        return 0
+    return part_file.file_size
+
+
+def is_actual(
+    source_file: SharedFile, target_file: Optional[SharedFile], compressed: bool = False,
+) -> bool:
+    """Функция проверяет, что копия в целевом каталоге совпадает с исходным файлом.
+
+    Копия актуальна, если ее размер равен размеру источника и она записана не раньше
+    последнего изменения источника. Размер сжатой копии (compressed) не проверяется.
+    """
+    if target_file is None:
+        return False
+    if not compressed and target_file.file_size != source_file.file_size:
+        return False
+    return target_file.last_write_time >= source_file.last_write_time
+
+
+def has_copy(
+    source_file: SharedFile, index: DirIndex, compression: Optional[Compression] = None,
+) -> bool:
+    """Функция проверяет по индексу каталога, что в нем есть актуальная копия файла.
+
+    Сжатая копия ищется под именами со всеми суффиксами compress.SUFFIXES.
+    """
+    if compression is None:
+        return is_actual(source_file, index.get(source_file.filename))
+    return any(
+        is_actual(source_file, index.get(target_name), compressed=True)
+        for target_name in compress.compressed_names(source_file.filename, compression)
+    )
+
+
+def attach_sink(
+    hasher: HashingWriter, sink: Any, compressor: Optional[compress.CompressingWriter],
+) -> None:
+    """Функция направляет данные hasher в sink, при сжатии - через compressor."""
+    if compressor is None:
+        hasher.sink = sink
+        return
+    compressor.sink = sink
+    hasher.sink = compressor
+
+
+@dataclass
+class PartCopy:
+    """Запись копии файла во временный файл с суффиксом PART_SUFFIX.
+
+    Attributes:
+        offset (int): позиция, с которой продолжается недокачанный файл.
+        compressor (compress.CompressingWriter): сжатие копии, None если копия не сжимается.
+    """
+
+    target_host: HostPC
+    target_dir: RemoteDir
+    target_name: str
+    offset: int = 0
+    compressor: Optional[compress.CompressingWriter] = None
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def part_name(self) -> str:
+        return f'{self.target_name}{PART_SUFFIX}'
+
+    @property
+    def target_path(self) -> str:
+        directory = self.target_dir.dir
+        return f'{directory}{self.part_name}'
+
+    @property
+    def stats_key(self) -> str:
+        return self.target_host.location_key(self.target_dir)
+
+
+def store_part(part: PartCopy, pipe: Any) -> None:
+    """Функция записывает данные буфера pipe во временный файл part."""
+    with part.target_host.session() as target_conn:
+        target_conn.storeFileFromOffset(
+            part.target_dir.drive,
+            part.target_path,
+            pipe,
+            offset=part.offset,
+            truncate=not part.offset,
+        )
+
+
+def part_writer(part: PartCopy, pipe: Any) -> Any:
+    """Функция создает файл_объект записи копии part в буфер pipe общей передачи."""
+    if part.compressor is None:
+        return stream.SkippingWriter(pipe, part.offset)
+    part.compressor.sink = pipe
+    return part.compressor
+
+
+class Archivator:
+    """Класс отвечает за управление процессом архивации файлов."""
+
+    def __init__(
+        self,
+        navigator: FilesMap,
+        pool: Optional[ConnectionPool] = None,
+        name: str = '',
+        chunk_index_path: Path = config.chunk_index_file,
+        catalog_path: Path = config.catalog_file,
+    ):
+        """Init Actualize class.
+
+        Arguments:
+            navigator (FilesMap): набор правил архивации.
+            pool (ConnectionPool): пул соединений, общий для всех правил архивации.
+            name (str): имя правила архивации, под которым ведется каталог файлов.
+            chunk_index_path (Path): файл индекса блоков режима transfer_mode: dedup.
+            catalog_path (Path): файл каталога скопированных файлов.
+        """
+        self.name = name
+        self._pool = pool or shared_pool
+        self.source_host = self.host_pc(navigator.source_host)
+        self.source_dir = navigator.source_dir
+        self._selection = navigator.selection
+        self.rule = navigator.rule
+        self.target_list: List[TargetData] = navigator.target
+        self.stats = TransferStats(name)
+        self._chunk_index_path = chunk_index_path
+        self._chunk_index: Optional[dedup.ChunkIndex] = None
+        self._catalog_path = catalog_path
+        self._catalog: Optional[catalog.Catalog] = None
+        self._catalog_state: Dict[catalog.EntryKey, catalog.CatalogEntry] = {}
+        self._indexes: Dict[Tuple[str, str, str], DirIndex] = {}
+        self._index_lock = threading.Lock()
+        self._mirror_lock = threading.Lock()
+        self._created_dirs: Set[str] = set()
+        # Хранилища блоков, в которых после замены или удаления манифестов могли остаться
+        # блоки без ссылок, по ключу каталога
+        self._orphan_stores: Dict[str, ChunkStore] = {}
+
+    def __enter__(self) -> 'Archivator':
+        self.open_state()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close_state()
+
+    def host_pc(self, hostrules: RemoteHost) -> HostPC:
+        """Метод создает HostPC на общем пуле соединений с меткой правила для метрик."""
+        return HostPC(hostrules, self._pool, self.name)
+
+    def target_index(
+        self, target_host: HostPC, target_dir: RemoteDir, created: bool = False,
+    ) -> DirIndex:
+        """Метод возвращает индекс целевого каталога, каталог читается один раз за запуск.
+
+        В режиме rule.recursive листинг включает подкаталоги. Индекс только что созданного
+        каталога (created) заполняется без запроса к удаленному компьютеру. При ошибке
+        листинга индекс остается незагруженным и каталог читается при следующем обращении,
+        а ошибка list_dir передается вызывающему.
+        """
+        key = (target_host.host, target_dir.drive, target_dir.dir)
+        with self._index_lock:
+            index = self._indexes.setdefault(key, DirIndex())
+        if created:
+            return index.load(list)
+        return index.load(partial(target_host.list_dir, target_dir, self.rule.recursive))
+
+    def mirror_dir(
+        self, target_host: HostPC, target_dir: RemoteDir, relative: str,
+    ) -> Optional[RemoteDir]:
+        """Метод возвращает подкаталог relative целевого каталога, создавая недостающие уровни.
+
+        Наличие подкаталога проверяется по индексу родительского каталога, поэтому
+        createDirectory вызывается только для действительно отсутствующих каталогов.
+
+        Returns:
+            Optional[RemoteDir]: подкаталог или None, если его не удалось прочитать или создать.
+        """
+        location = target_dir
+        if not relative:
+            return location
+        with self._mirror_lock:
+            for name in relative.split('/'):
+                parent_index = self.load_index(target_host, location)
+                if parent_index is None:
+                    return None
+                location = subdir(location, name)
+                if parent_index.has_dir(name):
+                    continue
+                if not target_host.create_dir(location):
+                    return None
+                parent_index.add_dir(name)
+                self.target_index(target_host, location, created=True)
+        return location
+
+    def copy_index(
+        self, target_host: HostPC, target_dir: RemoteDir, relative: str,
+    ) -> Optional[DirIndex]:
+        """Метод возвращает индекс подкаталога relative целевого каталога, не создавая его.
+
+        Returns:
+            Optional[DirIndex]: индекс или None, если подкаталога нет или он не прочитан.
+        """
+        location = target_dir
+        for name in relative.split('/') if relative else []:
+            parent_index = self.load_index(target_host, location)
+            if parent_index is None or not parent_index.has_dir(name):
+                return None
+            location = subdir(location, name)
+        return self.load_index(target_host, location)
+
+    def load_index(self, target_host: HostPC, target_dir: RemoteDir) -> Optional[DirIndex]:
+        """Метод возвращает индекс целевого каталога или None, если каталог не прочитан."""
+        try:
+            return self.target_index(target_host, target_dir)
+        except Exception:
+            location = target_host.location_key(target_dir)
+            logger.warning(f'Fail read {location}')
+            return None
+
+    def reset_indexes(self) -> None:
+        """Метод сбрасывает индексы целевых каталогов перед новым запуском."""
+        with self._index_lock:
+            self._indexes = {}
+
+    def is_cataloged(self, source_file: SharedFile, target: str) -> bool:
+        """Метод проверяет по каталогу, что неизменный файл уже обработан для target."""
+        entry = self._catalog_state.get((source_file.filename, target))
+        if entry is None or entry.status not in catalog.DONE_STATUSES:
+            return False
+        return entry.matches(source_file)
+
+    def catalog_record(
+        self, source_file: SharedFile, target: str, status: str, checksum: Optional[str] = None,
+    ) -> None:
+        if self._catalog is None:
+            return
+        known = self._catalog_state.get((source_file.filename, target))
+        if checksum is None and known is not None and known.matches(source_file):
+            checksum = known.checksum
+        entry = self._catalog.record(self.name, source_file, target, status, checksum)
+        self._catalog_state[(entry.filename, entry.target)] = entry
+
+    def source_name(self, target_name: str, target: Optional[TargetData] = None) -> str:
+        """Метод возвращает имя исходного файла по имени файла в целевом каталоге."""
+        if target is not None and target.compression is not None:
+            return compress.original_name(target_name)
+        is_manifest = target_name.endswith(dedup.MANIFEST_SUFFIX)
+        if self.rule.transfer_mode == TransferMode.dedup and is_manifest:
+            return target_name[:-len(dedup.MANIFEST_SUFFIX)]
+        return target_name
+
+    def archive_time(
+        self, target: TargetData, archive_file: SharedFile, target_dir: RemoteDir,
+    ) -> float:
+        """Метод возвращает время изменения исходного файла для файла в каталоге target_dir.
+
+        Сжатая копия записывается позже источника, поэтому ее время берется из каталога
+        файлов, а при его отсутствии из заголовка копии.
+        """
+        if target.compression is None:
+            return archive_file.last_write_time
+        target_host = self.host_pc(target.target_host)
+        entry = self._catalog_state.get((
+            self.source_name(archive_file.filename, target),
+            target_host.location_key(target_dir),
+        ))
+        if entry is not None:
+            return entry.mtime
+        header = compress.read_header(target_host, target_dir, archive_file.filename)
+        if header is None:
+            return archive_file.last_write_time
+        return header['mtime']
+
+    def delete_old_file(
+        self, source_file: SharedFile, source_dir: RemoteDir, del_tag: bool,
+    ) -> bool:
+        """Метод удаляет файл на удаленном компьютере при необходимости.
+
+        Arguments:
+            source_file (SharedFile): файл для удаления.
+            source_dir (RemoteDir): местонахождение файла.
+            del_tag (bool): признак необходиомти удаления файла.
+
+        Returns:
+            bool:  True если файл удален успешно.
+        """
+        if not del_tag:
+            return True
+        logger.debug(f'delete file {source_file.filename} {source_dir}')
+        return self.source_host.delete_file(source_file, source_dir)
+
+    def retention_plan(self) -> List[retention.RetentionPlan]:
+        """Метод рассчитывает план очистки всех целевых каталогов с политикой хранения.
+
+        План строится по индексам каталогов, каталоги, еще не прочитанные в этом запуске,
+        читаются параллельно по одному листингу на каталог. В режиме rule.recursive
+        каждый подкаталог, повторяющий подкаталог источника, планируется отдельно,
+        хранилища блоков режима dedup в план не входят.
+        """
+        policies = map(retention.effective_policy, self.target_list)
+        targets = [
+            (target, policy)
+            for target, policy in zip(self.target_list, policies)
+            if policy is not None
+        ]
+        if not targets:
+            return []
+        planned = [target for target, _ in targets]
+        with ThreadPoolExecutor(min(len(planned), MAX_CLEAN_HOSTS)) as executor:
+            indexes = list(executor.map(self._load_target_index, planned))
+        plans: List[retention.RetentionPlan] = []
+        for (target, policy), index in zip(targets, indexes):
+            if index is not None:
+                plans.extend(self._plan_tree(target, policy, target.target_dir, index))
+        return plans
+
+    def garbage_clean(self) -> bool:
+        """Метод удаляет копии, которые не сохраняются политикой хранения целевых каталогов.
+
+        Удаления группируются по хостам: каталоги одного хоста очищаются последовательно,
+        файлы каталога удаляются в одной сессии, разные хосты очищаются параллельно.
+        Сбой в одном каталоге не останавливает очистку остальных. После очистки из
+        хранилищ блоков режима dedup удаляются блоки, на которые больше не ссылаются манифесты.
+
+        Returns:
+            bool: True если все запланированные удаления выполнены.
+        """
+        host_plans: Dict[str, List[retention.RetentionPlan]] = {}
+        for plan in self.retention_plan():
+            if plan.delete:
+                host_plans.setdefault(plan.target.target_host.host, []).append(plan)
+        cleaned: List[bool] = []
+        if host_plans:
+            with ThreadPoolExecutor(
+                min(len(host_plans), MAX_CLEAN_HOSTS), thread_name_prefix='clean',
+            ) as executor:
+                cleaned = list(executor.map(self._clean_host, host_plans.values()))
+        self.prune_chunks()
+        return all(cleaned)
+
+    def prune_chunks(self) -> None:
+        """Метод удаляет блоки хранилищ, освободившиеся после замены или удаления манифестов."""
+        stores = self._orphan_stores
+        self._orphan_stores = {}
+        for store, (target_host, target_dir) in stores.items():
+            index = self.load_index(target_host, target_dir)
+            if index is None:
+                continue
+            manifests = [
+                remote_file.filename
+                for remote_file in index.files()
+                if remote_file.filename.endswith(dedup.MANIFEST_SUFFIX)
+            ]
+            removed = dedup.prune(target_host, target_dir, self._open_chunk_index(), manifests)
+            logger.debug(f'prune {removed} chunks in {store}')
+
+    def open_state(self) -> None:
+        """Метод открывает каталог файлов правила и загружает его состояние."""
+        self._catalog = catalog.Catalog(self._catalog_path)
+        self._catalog_state = self._catalog.load(self.name)
+
+    def close_state(self) -> None:
+        if self._chunk_index is not None:
+            self._chunk_index.close()
+            self._chunk_index = None
+        if self._catalog is not None:
+            self._catalog.close()
+            self._catalog = None
+
+    def _load_target_index(self, target: TargetData) -> Optional[DirIndex]:
+        return self.load_index(self.host_pc(target.target_host), target.target_dir)
+
+    def _plan_tree(
+        self, target: TargetData, policy: Retention, target_dir: RemoteDir, index: DirIndex,
+    ) -> List[retention.RetentionPlan]:
+        """Метод планирует очистку каталога, в режиме rule.recursive - и его подкаталогов."""
+        plans = [self._plan_target(target, policy, target_dir, index)]
+        if not self.rule.recursive:
+            return plans
+        target_host = self.host_pc(target.target_host)
+        for name in index.dirs():
+            if name == dedup.CHUNK_DIR:
+                continue
+            child_dir = subdir(target_dir, name)
+            child_index = self.load_index(target_host, child_dir)
+            if child_index is not None:
+                plans.extend(self._plan_tree(target, policy, child_dir, child_index))
+        return plans
+
+    def _plan_target(
+        self, target: TargetData, policy: Retention, target_dir: RemoteDir, index: DirIndex,
+    ) -> retention.RetentionPlan:
+        dated_files = [
+            (archive_file, self._archive_datetime(target, archive_file, target_dir))
+            for archive_file in index.files()
+            if not archive_file.filename.endswith(PART_SUFFIX)
+        ]
+        return retention.plan_target(
+            target,
+            target_dir,
+            self.host_pc(target.target_host).location_key(target_dir),
+            dated_files,
+            policy,
+        )
+
+    def _archive_datetime(
+        self, target: TargetData, archive_file: SharedFile, target_dir: RemoteDir,
+    ) -> datetime:
+        return datetime.fromtimestamp(self.archive_time(target, archive_file, target_dir))
+
+    def _orphan_chunks(self, target_host: HostPC, target_dir: RemoteDir) -> None:
+        """Метод отмечает хранилище, в котором манифест заменен или удален."""
+        if self.rule.transfer_mode == TransferMode.dedup:
+            self._orphan_stores[target_host.location_key(target_dir)] = (target_host, target_dir)
+
+    def _clean_host(self, plans: List[retention.RetentionPlan]) -> bool:
+        cleaned = [self._clean_plan(plan) for plan in plans]
+        return all(cleaned)
+
+    def _clean_plan(self, plan: retention.RetentionPlan) -> bool:
+        """Метод удаляет копии, которые план не сохраняет, True если удалены все."""
+        target = plan.target
+        target_host = self.host_pc(target.target_host)
+        index = self.target_index(target_host, plan.target_dir)
+        garbage_files = [planned.file for planned in plan.delete]
+        garbage_count = len(garbage_files)
+        logger.debug(f'delete {garbage_count} files in {plan.location}')
+        deleted = target_host.delete_files(garbage_files, plan.target_dir)
+        for old_file in deleted:
+            index.remove(old_file.filename)
+            if self._catalog is not None:
+                self._catalog.set_status(
+                    self.name,
+                    self.source_name(old_file.filename, target),
+                    plan.location,
+                    catalog.PRUNED,
+                )
+        manifests = [
+            deleted_file
+            for deleted_file in deleted
+            if deleted_file.filename.endswith(dedup.MANIFEST_SUFFIX)
+        ]
+        if manifests:
+            self._orphan_chunks(target_host, plan.target_dir)
+        return len(deleted) == garbage_count
+
+    def _open_chunk_index(self) -> dedup.ChunkIndex:
+        with self._index_lock:
+            if self._chunk_index is None:
+                self._chunk_index = dedup.ChunkIndex(self._chunk_index_path)
+            return self._chunk_index
+
+
+class Actualize(Archivator):
+    """Класс содержит правила по переносу файлов в зависимости от даты создания.
+
+    Attributes:
+        source_host (HostPC): настройки удаленного компьютера, откуда копируются файлы.
+        pool (ConnectionPool): пул соединений, через который работают все HostPC правила.
+        source_dir (RemoteDir): сведения о пути до дирректории откуда копируются файлы.
+        target_list (List[TargetData]): перечень удаленных компьютеров и дирректорий куда \
+            архивируются файлы.
+        stats (TransferStats): статистика скорости копирования по целевым каталогам.
+    """
+
+    def has_actual_copy(
+        self, source_file: SharedFile, index: DirIndex, compression: Optional[Compression] = None,
+    ) -> bool:
+        """Метод проверяет по индексу целевого каталога, что копия файла актуальна."""
+        if self.rule.transfer_mode == TransferMode.dedup:
+            manifest_file = index.get(f'{source_file.filename}{dedup.MANIFEST_SUFFIX}')
+            if manifest_file is None:
+                return False
+            return manifest_file.last_write_time >= source_file.last_write_time
+        return has_copy(source_file, index, compression)
+
+    def copy_file(
+        self,
+        source_file: SharedFile,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        relative: str = '',
+        compression: Optional[Compression] = None,
+    ) -> bool:
+        """Метод копирует файл из источника в целевой каталог.
+
+        Данные записываются во временный файл с суффиксом PART_SUFFIX, который после полной
+        записи переименовывается в итоговое имя. Недокачанный ранее файл продолжается с места
+        остановки, актуальная копия пропускается, устаревшая или усеченная перезаписывается.
+        Неудачное копирование повторяется по политике retry целевого хоста, пока источник и
+        целевой хост не отключены CircuitBreaker. В режиме recursive в целевом каталоге
+        создается такой же подкаталог, в режиме transfer_mode: dedup сжатие не применяется.
+
+        Arguments:
+            source_file (SharedFile): файл для копирования.
+            target_host (HostPC): настройки подключения к удаленному компьютеру.
+            target_dir (RemoteDir): расположения каталога куда копируются файлы.
+            relative (str): подкаталог файла относительно source_dir в режиме recursive.
+            compression (Compression): настройки сжатия целевого каталога.
+
+        Returns:
+            bool:  True если файл скопирован успешно.
+        """
+        if not target_host.breaker.available:
+            logger.warning(f'Skip copy file {source_file.filename}, {target_host.host} is down')
+            self.stats.record(target_host.location_key(target_dir), 0, 0, success=False)
+            return False
+        mirror = self.mirror_dir(target_host, target_dir, relative)
+        if mirror is None:
+            return False
+        copied, checksum = self._retry_copy(
+            source_file,
+            subdir(self.source_dir, relative),
+            target_host,
+            mirror,
+            compression,
+        )
+        if copied:
+            self.catalog_record(
+                source_file, target_host.location_key(mirror), catalog.COPIED, checksum,
+            )
+        return copied
+
+    def fanout_file(
+        self, source_file: SharedFile, targets: List[TargetData], relative: str = '',
+    ) -> bool:
+        """Метод копирует файл во все каталоги targets за одно чтение источника.
+
+        Копии, которые не удалось записать при общей передаче, копируются по отдельности
+        через copy_file с повторами по политике целевого хоста, если хост не отключен
+        CircuitBreaker.
+
+        Returns:
+            bool:  True если файл скопирован во все каталоги.
+        """
+        source_dir = subdir(self.source_dir, relative)
+        target_hosts = [self.host_pc(target.target_host) for target in targets]
+        copier = self._fanout_copy
+        if self.rule.transfer_mode == TransferMode.dedup:
+            copier = self._dedup_fanout
+        results = copier(source_file, source_dir, targets, target_hosts, relative)
+        settled = [
+            self._settle_fanout(source_file, target, target_host, fanout_result, relative)
+            for target, target_host, fanout_result in zip(targets, target_hosts, results)
+        ]
+        return all(settled)
+
+    def search_old_source(
+        self, source_file: SharedFile, scheduler: TransferScheduler, relative: str = '',
+    ) -> List['Future[bool]']:
+        """Метод запускает процесс архивации файла, отобранного select_files.
+
+        Для каждого целевого каталога архивирования в планировщик ставится задача копирования.
+        При rule.fanout файл для нескольких каталогов копируется одной задачей fanout_file,
+        которая читает источник один раз, в режиме dedup блоки файла также считаются один раз.
+
+        Arguments:
+            source_file (SharedFile): файл для архивации.
+            scheduler (TransferScheduler): планировщик параллельного копирования.
+            relative (str): путь каталога файла относительно source_dir.
+
+        Returns:
+            List[Future[bool]]: задачи копирования.
+        """
+        pending = self.pending_targets(source_file, relative)
+        copies = [
+            completed(result=True)
+            for _ in range(len(self.target_list) - len(pending))
+        ]
+        if self.rule.fanout and len(pending) > 1:
+            hosts = [self.source_host.host] + [target.target_host.host for target in pending]
+            copies.append(scheduler.submit(
+                hosts, self.fanout_file, source_file, pending, relative,
+            ))
+            return copies
+        for target in pending:
+            target_host = self.host_pc(target.target_host)
+            copies.append(scheduler.submit(
+                [self.source_host.host, target_host.host],
+                self.copy_file,
+                source_file,
+                target_host,
+                target.target_dir,
+                relative,
+                target.compression,
+            ))
+        return copies
+
+    def pending_targets(self, source_file: SharedFile, relative: str = '') -> List[TargetData]:
+        """Метод возвращает целевые каталоги, для которых файл еще не отмечен в каталоге файлов."""
+        pending = []
+        for target in self.target_list:
+            target_host = self.host_pc(target.target_host)
+            target_key = target_host.location_key(subdir(target.target_dir, relative))
+            if not self.is_cataloged(source_file, target_key):
+                pending.append(target)
+        return pending
+
+    def is_archived(self, entry: TreeEntry) -> bool:
+        """Метод проверяет, что во всех целевых каталогах уже есть актуальная копия файла.
+
+        Копии ищутся по каталогу файлов, затем по индексам целевых каталогов. Копия,
+        найденная по индексу, записывается в каталог файлов.
+        """
+        relative, source_file = entry
+        for target in self.pending_targets(source_file, relative):
+            target_host = self.host_pc(target.target_host)
+            index = self.copy_index(target_host, target.target_dir, relative)
+            if index is None or not self.has_actual_copy(source_file, index, target.compression):
+                return False
+            target_key = target_host.location_key(subdir(target.target_dir, relative))
+            self.catalog_record(source_file, target_key, catalog.COPIED)
+        return True
+
+    def finish_source(
+        self, source_file: SharedFile, copies: List['Future[bool]'], relative: str = '',
+    ) -> bool:
+        """Метод дожидается копирования файла во все каталоги и удаляет его из источника.
+
+        Returns:
+            bool:  True если файл архиврован успешно.
+        """
+        if not copies:
+            return False
+        copy_results = [copy.result() for copy in copies]
+        if not all(copy_results):
+            return False
+        return self.delete_old_file(
+            source_file, subdir(self.source_dir, relative), self.rule.source_delete,
+        )
+
+    def source_files(self) -> Iterable[TreeEntry]:
+        """Метод выдает файлы источника с путем их каталога относительно source_dir.
+
+        В режиме rule.recursive дерево каталогов обходится параллельно и файлы выдаются
+        по мере чтения каталогов, иначе читается только сам source_dir.
+        """
+        if self.rule.recursive:
+            return TreeWalker(self.source_host, self.source_dir, self.rule.walk_workers).walk()
+        files = self.source_host.remote_files(self.source_dir)
+        logger.debug(f'Get files {files}')
+        return [('', file) for file in files if file]
+
+    def select_files(self, files: Iterable[TreeEntry]) -> Iterable[TreeEntry]:
+        """Метод отбирает файлы источника по правилам selection и source_storage_days.
+
+        Листинг каталога отбирается целиком двоичным поиском по времени изменения, файлы
+        рекурсивного обхода проверяются по одному, не задерживая копирование.
+        """
+        selector = FileSelector(self._selection, self.rule.source_storage_days)
+        if isinstance(files, list):
+            return selector.select(files)
+        return (entry for entry in files if selector.accepts(entry[1]))
+
+    def stable_files(self, files: Iterable[TreeEntry]) -> Iterable[TreeEntry]:
+        """Метод оставляет файлы, которые не менялись rule.quiet_seconds секунд.
+
+        Так файл, который еще записывается в источник, не копируется в недописанном виде.
+        Уже архивированные и давно измененные файлы выдаются без проверки, остальные
+        проверяются повторным листингом своего каталога через quiet_seconds после первого.
+        """
+        if not self.rule.quiet_seconds:
+            return files
+        return StabilityCheck(
+            self.source_host, self.source_dir, self.rule.quiet_seconds, self.rule.walk_workers,
+        ).stable(files, self.is_archived)
+
+    def run(self) -> bool:
+        logger.debug('start run fun')
+        files = self.source_files()
+        if not files:
+            return False
+        self.reset_indexes()
+        scheduler = TransferScheduler(self.rule.max_workers, self.rule.max_host_workers)
+        with self:
+            with scheduler:
+                self._copy_files(files, scheduler)
+            logger.debug('operation complete')
+            for line in self.stats.report():
+                logger.info(line)
+            self.garbage_clean()
+        return True
+
+    def _retry_copy(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        compression: Optional[Compression],
+    ) -> CopyResult:
+        """Метод повторяет копирование по политике retry целевого хоста.
+
+        Повторы прекращаются, если источник или целевой хост отключены CircuitBreaker.
+        """
+        policy = target_host.hostrules.retry
+        for attempt in range(1, policy.attempts):
+            copy_result = self._copy_once(
+                source_file, source_dir, target_host, target_dir, compression,
+            )
+            hosts_available = self.source_host.breaker.available and target_host.breaker.available
+            if copy_result[0] or not hosts_available:
+                return copy_result
+            metrics.retry(self.name, target_host.host, 'copy')
+            time.sleep(backoff_delay(policy, attempt))
+        return self._copy_once(source_file, source_dir, target_host, target_dir, compression)
+
+    def _copy_once(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        compression: Optional[Compression],
+    ) -> CopyResult:
+        if self.rule.transfer_mode == TransferMode.dedup:
+            return self._dedup_copy(source_file, source_dir, target_host, target_dir)
+        return self._plain_copy(source_file, source_dir, target_host, target_dir, compression)
+
+    def _plain_copy(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        compression: Optional[Compression] = None,
+    ) -> CopyResult:
+        """Метод копирует файл, контрольная сумма считается по пути данных из источника.
+
+        При заданном compression файл сжимается по пути в целевой каталог, сжатая копия
+        всегда записывается заново, без продолжения с места остановки. Уже записанное
+        начало недокачанного файла перечитывается для контрольной суммы только при
+        rule.verify, иначе контрольная сумма продолженной копии не сохраняется.
+        """
+        try:
+            part = self._prepare_part(source_file, target_host, target_dir, compression)
+        except Exception:
+            return self._fail_prepare(source_file, target_host, target_dir)
+        if part is None:
+            return True, None
+        source_path = '{0}{1}'.format(source_dir.dir, source_file.filename)
+        hasher = HashingWriter()
+        try:
+            if part.offset and self.rule.verify:
+                self._hash_prefix(
+                    target_host, target_dir.drive, part.target_path, part.offset, hasher,
+                )
+            copy = self._tempfile_copy
+            if self.rule.transfer_mode == TransferMode.stream:
+                copy = self._stream_copy
+            copy(
+                source_path,
+                target_host,
+                target_dir.drive,
+                part.target_path,
+                part.offset,
+                hasher,
+                part.compressor,
+            )
+        except Exception:
+            return self._fail_part(source_file, part)
+        return self._finish_part(source_file, part, hasher)
+
+    def _prepare_part(
+        self,
+        source_file: SharedFile,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        compression: Optional[Compression] = None,
+    ) -> Optional['PartCopy']:
+        """Метод готовит запись копии во временный файл, None если копия уже актуальна."""
+        index = self.target_index(target_host, target_dir)
+        target_name = source_file.filename
+        if compression is not None:
+            target_name = compress.compressed_name(source_file.filename, compression)
+        if has_copy(source_file, index, compression):
+            return None
+        part = PartCopy(target_host, target_dir, target_name)
+        if compression is None:
+            part.offset = resume_offset(source_file, index.get(part.part_name))
+        else:
+            part.compressor = compress.CompressingWriter(source_file, compression)
+        return part
+
+    def _fail_prepare(
+        self, source_file: SharedFile, target_host: HostPC, target_dir: RemoteDir,
+    ) -> CopyResult:
+        """Метод отмечает неудачное копирование в каталог, который не удалось прочитать."""
+        stats_key = target_host.location_key(target_dir)
+        logger.warning(f'Fail copy file {source_file.filename}, {stats_key} is not readable')
+        self.stats.record(stats_key, 0, 0, success=False)
+        return False, None
+
+    def _fail_part(self, source_file: SharedFile, part: 'PartCopy') -> CopyResult:
+        target_host = part.target_host
+        logger.warning(f'Fail copy file {source_file.filename} to {target_host.host}')
+        elapsed = time.monotonic() - part.started
+        self.stats.record(part.stats_key, 0, elapsed, success=False)
+        if part.compressor is None:
+            self._refresh_part(part.part_name, target_host, part.target_dir)
+        return False, None
+
+    def _finish_part(
+        self, source_file: SharedFile, part: 'PartCopy', hasher: HashingWriter,
+    ) -> CopyResult:
+        """Метод проверяет записанный временный файл и переименовывает его в итоговое имя.
+
+        Контрольная сумма возвращается, только если hasher получил файл целиком.
+        """
+        target_host, target_dir = part.target_host, part.target_dir
+        size = source_file.file_size if part.compressor is None else part.compressor.size
+        verify: Optional[Callable[[str], bool]] = None
+        if self.rule.verify:
+            restorer = retrieve if part.compressor is None else compress.restore
+            verify = partial(
+                self._verify_restored, restorer, target_host, target_dir, hasher=hasher,
+            )
+        copied = self._commit_part(part.target_name, size, target_host, target_dir, verify)
+        self.stats.record(
+            part.stats_key,
+            size - part.offset,
+            time.monotonic() - part.started,
+            copied,
+            hasher.seconds,
+        )
+        if hasher.size != source_file.file_size:
+            return copied, None
+        return copied, hasher.checksum()
+
+    def _hash_prefix(
+        self,
+        target_host: HostPC,
+        target_drive: str,
+        target_path: str,
+        offset: int,
+        hasher: HashingWriter,
+    ) -> None:
+        """Метод хеширует уже записанное начало недокачанного файла перед продолжением."""
+        with target_host.session() as target_conn:
+            target_conn.retrieveFileFromOffset(
+                target_drive, target_path, hasher, 0, max_length=offset,
+            )
+
+    def _refresh_part(self, part_name: str, target_host: HostPC, target_dir: RemoteDir) -> None:
+        """Метод обновляет в индексе недокачанный файл, чтобы повтор продолжил копирование."""
+        index = self.target_index(target_host, target_dir)
+        part_file = target_host.stat_file(part_name, target_dir)
+        if part_file is None:
+            index.remove(part_name)
+        else:
+            index.add(part_file)
+
+    def _commit_part(
+        self,
+        filename: str,
+        size: int,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        verify: Optional[Callable[[str], bool]] = None,
+    ) -> bool:
+        """Метод переименовывает полностью записанный временный файл в итоговое имя.
+
+        Копия под итоговым именем появляется только после проверки размера и, при verify,
+        содержимого временного файла, поэтому недописанная или поврежденная копия не
+        заменяет предыдущую.
+
+        Arguments:
+            filename (str): итоговое имя файла, временный файл имеет суффикс PART_SUFFIX.
+            size (int): ожидаемый размер полностью записанного файла.
+            target_host (HostPC): настройки подключения к удаленному компьютеру.
+            target_dir (RemoteDir): расположения каталога куда копируются файлы.
+            verify (Callable): проверка содержимого временного файла по его имени.
+        """
+        index = self.target_index(target_host, target_dir)
+        part_name = f'{filename}{PART_SUFFIX}'
+        part_file = target_host.stat_file(part_name, target_dir)
+        if part_file is None or part_file.file_size != size:
+            logger.warning(f'Incomplete copy {part_name} on {target_host.host}')
+            return False
+        if verify is not None and not verify(part_name):
+            return False
+        stale_file = index.get(filename)
+        if stale_file is not None and not target_host.delete_file(stale_file, target_dir):
+            return False
+        if not target_host.rename_file(part_name, filename, target_dir):
+            return False
+        index.remove(part_name)
+        part_file.filename = filename
+        index.add(part_file)
+        return True
+
+    def _dedup_copy(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+    ) -> CopyResult:
+        """Метод копирует файл в хранилище блоков целевого каталога с дедупликацией.
+
+        Передаются только блоки, которых еще нет в хранилище, вместо файла в каталоге
+        сохраняется манифест <имя файла>.manifest, восстановление - service.worker.dedup.restore.
+        """
+        try:
+            actual = self._manifest_actual(source_file, target_host, target_dir)
+        except Exception:
+            return self._fail_prepare(source_file, target_host, target_dir)
+        if actual:
+            return True, None
+        return self._dedup_transfer(source_file, source_dir, [(target_host, target_dir)])[0]
+
+    def _manifest_actual(
+        self, source_file: SharedFile, target_host: HostPC, target_dir: RemoteDir,
+    ) -> bool:
+        return self.has_actual_copy(source_file, self.target_index(target_host, target_dir))
+
+    def _dedup_transfer(
+        self, source_file: SharedFile, source_dir: RemoteDir, stores: List[ChunkStore],
+    ) -> List[CopyResult]:
+        """Метод разбивает файл на блоки за одно чтение источника и сохраняет их во все stores.
+
+        Блоки и контрольная сумма считаются один раз, новые блоки записываются в хранилища
+        параллельно. Хранилище, в которое не удалось записать блок, исключается из передачи,
+        остальные продолжают ее.
+
+        Returns:
+            List[CopyResult]: результаты копирования по stores.
+        """
+        chunk_index = self._open_chunk_index()
+        uploaders = [
+            dedup.DedupUploader(target_host, target_dir, chunk_index, self._created_dirs)
+            for target_host, target_dir in stores
+        ]
+        started = time.monotonic()
+        hasher = HashingWriter()
+        failed = self._upload_chunks(source_file, source_dir, uploaders, hasher)
+        return [
+            self._fail_upload(source_file, uploader, started)
+            if position in failed
+            else self._store_manifest(source_file, uploader, hasher, started)
+            for position, uploader in enumerate(uploaders)
+        ]
+
+    def _fail_upload(
+        self, source_file: SharedFile, uploader: dedup.DedupUploader, started: float,
+    ) -> CopyResult:
+        logger.warning(f'Fail copy file {source_file.filename} to {uploader.store}')
+        seconds = time.monotonic() - started
+        self.stats.record(uploader.store, 0, seconds, success=False)
+        return False, None
+
+    def _upload_chunks(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        uploaders: List[dedup.DedupUploader],
+        hasher: HashingWriter,
+    ) -> Set[int]:
+        """Метод читает файл источника через hasher и записывает его блоки всеми uploaders.
+
+        Returns:
+            Set[int]: позиции uploaders, запись блоков которыми не удалась.
+        """
+        failed: Set[int] = set()
+        positions = range(len(uploaders))
+
+        def put_chunk(position: int, chunk: bytes) -> None:
+            if position in failed:
+                return
+            try:
+                uploaders[position].put_chunk(chunk)
+            except Exception:
+                failed.add(position)
+
+        def put_all(chunk: bytes) -> None:
+            store_chunk = partial(put_chunk, chunk=chunk)
+            list(executor.map(store_chunk, positions))
+            if len(failed) == len(uploaders):
+                raise OSError(f'no chunk store accepts {source_file.filename}')
+
+        chunker = dedup.Chunker(put_all)
+        hasher.sink = chunker
+        try:
+            with ThreadPoolExecutor(len(uploaders), thread_name_prefix='dedup') as executor:
+                with self.source_host.session() as source_conn:
+                    source_conn.retrieveFile(
+                        source_dir.drive, f'{source_dir.dir}{source_file.filename}', hasher,
+                    )
+                chunker.flush()
+        except Exception:
+            failed.update(positions)
+        return failed
+
+    def _store_manifest(
+        self,
+        source_file: SharedFile,
+        uploader: dedup.DedupUploader,
+        hasher: HashingWriter,
+        started: float,
+    ) -> CopyResult:
+        """Метод записывает манифест файла, блоки которого сохранены uploader."""
+        target_host, target_dir = uploader.target_host, uploader.target_dir
+        stats_key = uploader.store
+        manifest_name = f'{source_file.filename}{dedup.MANIFEST_SUFFIX}'
+        manifest = uploader.manifest(source_file)
+        try:
+            with target_host.session() as target_conn:
+                target_conn.storeFile(
+                    target_dir.drive,
+                    f'{target_dir.dir}{manifest_name}{PART_SUFFIX}',
+                    io.BytesIO(manifest),
+                )
+            replaced = self.target_index(target_host, target_dir).exists(manifest_name)
+        except Exception:
+            logger.warning(f'Fail copy file {source_file.filename} to {target_host.host}')
+            self.stats.record(stats_key, 0, time.monotonic() - started, success=False)
+            return False, None
+        copied = self._commit_part(manifest_name, len(manifest), target_host, target_dir)
+        if copied and replaced:
+            self._orphan_chunks(target_host, target_dir)
+        if copied and self.rule.verify:
+            copied = self._verify_restored(
+                dedup.restore, target_host, target_dir, source_file.filename, hasher,
+            )
+        self.stats.record(
+            stats_key,
+            uploader.sent_bytes + len(manifest),
+            time.monotonic() - started,
+            copied,
+            hasher.seconds,
+        )
+        return copied, hasher.checksum()
+
+    def _verify_restored(
+        self,
+        restorer: Callable[..., Any],
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        filename: str,
+        hasher: HashingWriter,
+    ) -> bool:
+        """Метод восстанавливает файл функцией restorer и сверяет его контрольную сумму.
+
+        restorer читает копию как есть (retrieve), из сжатого файла или из хранилища блоков.
+        Время проверки добавляется к времени хеширования hasher.
+        """
+        check = HashingWriter(algorithm=hasher.algorithm)
+        try:
+            restorer(target_host, target_dir, filename, check)
+        except Exception:
+            logger.warning(f'Fail verify {filename} on {target_host.host}')
+            return False
+        finally:
+            hasher.seconds += check.seconds
+        if check.checksum() != hasher.checksum():
+            logger.warning(f'Checksum mismatch {filename} on {target_host.host}')
+            return False
+        return True
+
+    def _tempfile_copy(
+        self,
+        source_path: str,
+        target_host: HostPC,
+        target_drive: str,
+        target_path: str,
+        offset: int,
+        hasher: HashingWriter,
+        compressor: Optional[compress.CompressingWriter] = None,
+    ) -> None:
+        """Метод копирует файл через локальный временный файл начиная с позиции offset.
+
+        Raises:
+            HostUnavailable: целевой хост отключен, источник в этом случае не читается.
+        """
+        if not target_host.breaker.available:
+            raise HostUnavailable(f'host {target_host.host} is unavailable')
+        with tempfile.NamedTemporaryFile() as tmp:
+            attach_sink(hasher, tmp, compressor)
+            # Получение файл_объекта с удаленного компьютера через сессию из пула
+            with self.source_host.session() as source_conn:
+                source_conn.retrieveFileFromOffset(
+                    self.source_dir.drive, source_path, hasher, offset,
+                )
+            if compressor is not None:
+                compressor.close()
+            # Переход в начало файл_объект
+            tmp.seek(0)
+            # Запись файл_объекта в файл на целевом компьютере
+            with target_host.session() as target_conn:
+                target_conn.storeFileFromOffset(
+                    target_drive, target_path, tmp, offset, truncate=not offset,
+                )
+
+    def _stream_copy(
+        self,
+        source_path: str,
+        target_host: HostPC,
+        target_drive: str,
+        target_path: str,
+        offset: int,
+        hasher: HashingWriter,
+        compressor: Optional[compress.CompressingWriter] = None,
+    ) -> None:
+        """Метод копирует файл потоком без записи на локальный диск.
+
+        Чтение из источника, сжатие и запись в целевой каталог идут одновременно через
+        кольцевой буфер размером rule.stream_buffer_mb.
+        """
+        def download(pipe: Any) -> None:
+            attach_sink(hasher, pipe, compressor)
+            source_conn.retrieveFileFromOffset(
+                self.source_dir.drive, source_path, hasher, offset=offset,
+            )
+            if compressor is not None:
+                compressor.close()
+
+        with self.source_host.session() as source_conn:
+            with target_host.session() as target_conn:
+                stream.pipe_copy(
+                    download=download,
+                    upload=partial(
+                        target_conn.storeFileFromOffset,
+                        target_drive,
+                        target_path,
+                        offset=offset,
+                        truncate=not offset,
+                    ),
+                    capacity=self.rule.stream_buffer_mb * stream.MB,
+                )
+
+    def _settle_fanout(
+        self,
+        source_file: SharedFile,
+        target: TargetData,
+        target_host: HostPC,
+        fanout_result: FanoutResult,
+        relative: str,
+    ) -> bool:
+        """Метод учитывает копию общей передачи, неудачную копию повторяет через copy_file."""
+        copied, checksum, target_dir = fanout_result
+        if copied:
+            self.catalog_record(
+                source_file, target_host.location_key(target_dir), catalog.COPIED, checksum,
+            )
+            return True
+        if not target_host.breaker.available:
+            return False
+        return self.copy_file(
+            source_file, target_host, target.target_dir, relative, target.compression,
+        )
+
+    def _fanout_copy(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        targets: List[TargetData],
+        target_hosts: List[HostPC],
+        relative: str,
+    ) -> List[FanoutResult]:
+        """Метод передает файл потоком одновременно во все целевые каталоги.
+
+        Источник читается с начала, контрольная сумма считается один раз. Приемник,
+        продолжающий недокачанный файл, пропускает уже записанное начало, сжатие
+        выполняется отдельно для каждого каталога. Каталог, который не удалось
+        подготовить, или хост, отключенный CircuitBreaker, в передаче не участвует.
+
+        Returns:
+            List[FanoutResult]: результаты копирования по targets.
+        """
+        def prepare(target: TargetData, target_host: HostPC, target_dir: RemoteDir) -> Any:
+            return self._prepare_part(source_file, target_host, target_dir, target.compression)
+
+        results, parts = self._fanout_prepare(
+            source_file, targets, target_hosts, relative, prepare,
+        )
+        if not parts:
+            return results
+        hasher = HashingWriter()
+        errors = self._fanout_stream(source_file, source_dir, hasher, [part for _, part in parts])
+        for (position, part), error in zip(parts, errors):
+            if error is None:
+                copied, checksum = self._finish_part(source_file, part, hasher)
+            else:
+                copied, checksum = self._fail_part(source_file, part)
+            results[position] = (copied, checksum, part.target_dir)
+        return results
+
+    def _fanout_stream(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        hasher: HashingWriter,
+        parts: List[PartCopy],
+    ) -> stream.BranchErrors:
+        """Метод читает источник через hasher и записывает его во временные файлы parts.
+
+        Returns:
+            stream.BranchErrors: ошибки записи по parts, None для успешной записи.
+        """
+        source_path = '{0}{1}'.format(source_dir.dir, source_file.filename)
+
+        def download(fan: Any) -> None:
+            hasher.sink = fan
+            with self.source_host.session() as source_conn:
+                source_conn.retrieveFileFromOffset(source_dir.drive, source_path, hasher)
+
+        try:
+            return stream.fanout_copy(
+                download,
+                [partial(store_part, part) for part in parts],
+                self.rule.stream_buffer_mb * stream.MB,
+                [partial(part_writer, part) for part in parts],
+            )
+        except Exception as exc:
+            return [exc for _ in parts]
+
+    def _dedup_fanout(
+        self,
+        source_file: SharedFile,
+        source_dir: RemoteDir,
+        targets: List[TargetData],
+        target_hosts: List[HostPC],
+        relative: str,
+    ) -> List[FanoutResult]:
+        """Метод копирует файл в хранилища блоков всех целевых каталогов за одно чтение.
+
+        Returns:
+            List[FanoutResult]: результаты копирования по targets.
+        """
+        def prepare(target: TargetData, target_host: HostPC, target_dir: RemoteDir) -> Any:
+            if self._manifest_actual(source_file, target_host, target_dir):
+                return None
+            return target_host, target_dir
+
+        results, stores = self._fanout_prepare(
+            source_file, targets, target_hosts, relative, prepare,
+        )
+        if not stores:
+            return results
+        copied = self._dedup_transfer(source_file, source_dir, [store for _, store in stores])
+        for (position, store), (success, checksum) in zip(stores, copied):
+            results[position] = (success, checksum, store[1])
+        return results
+
+    def _fanout_prepare(
+        self,
+        source_file: SharedFile,
+        targets: List[TargetData],
+        target_hosts: List[HostPC],
+        relative: str,
+        prepare: Callable[[TargetData, HostPC, RemoteDir], Any],
+    ) -> Tuple[List[FanoutResult], List[Prepared]]:
+        """Метод готовит каталоги общей передачи.
+
+        prepare(target, target_host, target_dir) возвращает запись для передачи или None,
+        если копия в каталоге уже актуальна. Каталог хоста, отключенного CircuitBreaker,
+        или каталог, который не удалось подготовить, в передаче не участвует.
+
+        Returns:
+            результаты по targets с отмеченными актуальными копиями и подготовленные записи
+            с позицией их каталога в результатах.
+        """
+        results: List[FanoutResult] = []
+        pending: List[Prepared] = []
+        for target, target_host in zip(targets, target_hosts):
+            results.append((False, None, target.target_dir))
+            target_dir = self._fanout_dir(target, target_host, relative)
+            if target_dir is None:
+                continue
+            try:
+                prepared = prepare(target, target_host, target_dir)
+            except Exception:
+                self._fail_prepare(source_file, target_host, target_dir)
+                continue
+            if prepared is None:
+                results[-1] = (True, None, target_dir)
+            else:
+                pending.append((len(results) - 1, prepared))
+        return results, pending
+
+    def _fanout_dir(
+        self, target: TargetData, target_host: HostPC, relative: str,
+    ) -> Optional[RemoteDir]:
+        if not target_host.breaker.available:
+            return None
+        return self.mirror_dir(target_host, target.target_dir, relative)
+
+    def _copy_files(self, files: Iterable[TreeEntry], scheduler: TransferScheduler) -> None:
+        planned = [
+            (relative, file, self.search_old_source(file, scheduler, relative))
+            for relative, file in self.stable_files(self.select_files(files))
+        ]
+        for relative, file, copies in planned:
+            if not self.finish_source(file, copies, relative):
+                self._report_skipped(file)
+
+    def _report_skipped(self, file: SharedFile) -> None:
+        message = """
+Файл {0} не обработан. Возраст файла не менее {1} дней, подлежит удалению \
+в исходном каталоге - {2}""".format(
+            file.filename, self.rule.source_storage_days, self.rule.source_delete,
+        )
+        logger.debug(message)
+
+
+class Overwrite(Archivator):
+    """Класс содержит правила по перезаписи существующих файлов на актуальные."""
+
+    def run(self):
+        return True
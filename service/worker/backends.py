@@ -0,0 +1,251 @@
+# В модуле представлены хранилища, через которые HostPC работает с удаленными ПК
+import fnmatch
+import os
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, BinaryIO, Callable, List, Mapping, Optional, Tuple
+
+from smb import smb_constants as cnst
+from smb.base import SharedFile
+from smb.smb_structs import OperationFailure
+from smb.SMBConnection import SMBConnection
+
+from service.models import RemoteHost
+
+SMB_PORT = 139
+IO_BLOCK = 64 * 1024
+
+# Фабрика соединений: по настройкам хоста возвращает объект с интерфейсом SMBConnection
+Backend = Callable[[RemoteHost], Any]
+
+
+def smb_connect(hostrules: RemoteHost) -> SMBConnection:
+    """Функция открывает SMB соединение с удаленным компьютером.
+
+    Raises:
+        OSError: удаленный компьютер отклонил учетные данные.
+    """
+    conn = SMBConnection(
+        hostrules.username, hostrules.pwd, hostrules.namelocalpc, hostrules.pcname,
+    )
+    if not conn.connect(hostrules.host, SMB_PORT, timeout=hostrules.timeouts.connect):
+        raise OSError(f'authentication failed on {hostrules.host}')
+    return conn
+
+
+class LocalConnection:
+    """Имитация SMBConnection поверх локальной файловой системы.
+
+    Общий ресурс (drive) соответствует каталогу root/<drive>. Для оценки поведения на
+    медленной сети каждая операция задерживается на latency секунд, а передача данных
+    ограничивается скоростью bandwidth байт в секунду.
+    """
+
+    def __init__(self, root: Path, latency: float = 0, bandwidth: Optional[float] = None):
+        self.root = root
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def echo(self, data: bytes, timeout: int = 10) -> bytes:
+        self._delay()
+        return data
+
+    def close(self) -> None:
+        """Локальному соединению нечего закрывать."""
+
+    def listPath(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        search: int = 65591,
+        pattern: str = '*',
+        timeout: int = 30,
+    ) -> List[SharedFile]:
+        self._delay()
+        directory = self._path(service_name, path)
+        if not directory.is_dir():
+            raise OperationFailure(f'Failed to list {path} on {service_name}', [])
+        with_dirs = bool(search & cnst.SMB_FILE_ATTRIBUTE_DIRECTORY)
+        names = ['.', '..'] if with_dirs else []
+        names.extend(sorted(os.listdir(directory)))
+        return [
+            self._shared_file(directory / name, name)
+            for name in names
+            if fnmatch.fnmatch(name, pattern) and (with_dirs or not (directory / name).is_dir())
+        ]
+
+    def getAttributes(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        timeout: int = 30,
+    ) -> SharedFile:
+        self._delay()
+        local_path = self._existing(service_name, path)
+        return self._shared_file(local_path, local_path.name)
+
+    def retrieveFile(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        file_obj: BinaryIO,
+        timeout: int = 30,
+    ) -> Tuple[int, int]:
+        return self.retrieveFileFromOffset(service_name, path, file_obj)
+
+    def retrieveFileFromOffset(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        file_obj: BinaryIO,
+        offset: int = 0,
+        max_length: int = -1,
+        timeout: int = 30,
+    ) -> Tuple[int, int]:
+        self._delay()
+        local_path = self._existing(service_name, path)
+        sent = 0
+        with open(local_path, 'rb') as fh:
+            fh.seek(offset)
+            while max_length < 0 or sent < max_length:
+                block_size = IO_BLOCK if max_length < 0 else min(IO_BLOCK, max_length - sent)
+                block = fh.read(block_size)
+                if not block:
+                    break
+                self._throttle(len(block))
+                file_obj.write(block)
+                sent += len(block)
+        return cnst.SMB_FILE_ATTRIBUTE_ARCHIVE, sent
+
+    def storeFile(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        file_obj: BinaryIO,
+        timeout: int = 30,
+    ) -> int:
+        return self.storeFileFromOffset(service_name, path, file_obj, truncate=True)
+
+    def storeFileFromOffset(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        file_obj: BinaryIO,
+        offset: int = 0,
+        truncate: bool = False,
+        timeout: int = 30,
+    ) -> int:
+        self._delay()
+        local_path = self._path(service_name, path)
+        if not local_path.parent.is_dir():
+            raise OperationFailure(f'Failed to store {path} on {service_name}', [])
+        mode = 'r+b' if local_path.exists() and not truncate else 'wb'
+        with open(local_path, mode) as fh:
+            fh.seek(offset)
+            while True:
+                block = file_obj.read(IO_BLOCK)
+                if not block:
+                    break
+                self._throttle(len(block))
+                fh.write(block)
+            return fh.tell()
+
+    def deleteFiles(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path_file_pattern: str,
+        delete_matching_folders: bool = False,
+        timeout: int = 30,
+    ) -> None:
+        self._delay()
+        self._existing(service_name, path_file_pattern).unlink()
+
+    def rename(self, service_name: str, old_path: str, new_path: str, timeout: int = 30) -> None:
+        self._delay()
+        target = self._path(service_name, new_path)
+        if target.exists():
+            raise OperationFailure(f'Failed to rename {old_path}: {new_path} exists', [])
+        os.rename(self._existing(service_name, old_path), target)
+
+    def createDirectory(  # noqa: N802 интерфейс SMBConnection
+        self,
+        service_name: str,
+        path: str,
+        timeout: int = 30,
+    ) -> None:
+        self._delay()
+        try:
+            self._path(service_name, path).mkdir()
+        except OSError as exc:
+            raise OperationFailure(f'Failed to create {path}: {exc}', [])
+
+    def _path(self, service_name: str, path: str) -> Path:
+        return self.root / service_name / path.strip('/')
+
+    def _existing(self, service_name: str, path: str) -> Path:
+        local_path = self._path(service_name, path)
+        if not local_path.exists():
+            raise OperationFailure(f'Unable to open {path} on {service_name}', [])
+        return local_path
+
+    def _shared_file(self, local_path: Path, name: str) -> SharedFile:
+        stat = local_path.stat()
+        attributes = cnst.SMB_FILE_ATTRIBUTE_ARCHIVE
+        if local_path.is_dir():
+            attributes = cnst.SMB_FILE_ATTRIBUTE_DIRECTORY
+        return SharedFile(
+            stat.st_ctime,
+            stat.st_atime,
+            stat.st_mtime,
+            stat.st_mtime,
+            stat.st_size,
+            stat.st_size,
+            attributes,
+            '',
+            name,
+        )
+
+    def _delay(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _throttle(self, size: int) -> None:
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+
+class LocalBackend:
+    """Фабрика соединений LocalConnection.
+
+    Если root не задан, корнем хранилища хоста считается каталог из поля host.
+    """
+
+    def __init__(
+        self, root: Optional[Path] = None, latency: float = 0, bandwidth: Optional[float] = None,
+    ):
+        self.root = root
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def __call__(self, hostrules: RemoteHost) -> LocalConnection:
+        root = self.root / hostrules.host if self.root else Path(hostrules.host)
+        return LocalConnection(root, self.latency, self.bandwidth)
+
+
+BACKENDS: Mapping[str, Backend] = MappingProxyType({
+    'smb': smb_connect,
+    'local': LocalBackend(),
+})
+
+
+def open_connection(hostrules: RemoteHost) -> Any:
+    """Функция открывает соединение через хранилище, указанное в настройках хоста.
+
+    Raises:
+        OSError: хранилище с таким именем не зарегистрировано.
+    """
+    backend = BACKENDS.get(hostrules.backend)
+    if backend is None:
+        raise OSError(f'unknown backend {hostrules.backend} for host {hostrules.host}')
+    return backend(hostrules)
@@ -1,10 +1,131 @@
-from typing import List
-
-from service.config import ArchiveRule
-from service.worker.archive import Actualize
-
-
-def run(rule_list: List[ArchiveRule]):
-    for rule in rule_list:
-        if rule.method == 1:
-            Actualize(rule.filesmap).run()
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import timedelta
+from operator import itemgetter
+from typing import Callable, List, Optional, Set
+
+from service.config import ArchiveRule
+from service.worker.archive import Actualize, Archivator
+from service.worker.pool import pool
+from service.worker.stream import MB
+
+logger = logging.getLogger(__name__)
+
+MAX_PARALLEL_RULES = 4
+
+
+@dataclass
+class RuleResult:
+    """Итог выполнения одного правила архивации."""
+
+    name: str
+    success: bool
+    seconds: float
+    files: int = 0
+    bytes: int = 0
+
+
+def rule_hosts(rule: ArchiveRule) -> Set[str]:
+    """Функция возвращает все хосты, с которыми работает правило."""
+    hosts = {rule.filesmap.source_host.host}
+    hosts.update(target.target_host.host for target in rule.filesmap.target)
+    return hosts
+
+
+def group_rules(rule_list: List[ArchiveRule]) -> List[List[int]]:
+    """Функция объединяет в группы номера правил, имеющих общие хосты.
+
+    Правила одной группы выполняются последовательно в порядке config.yaml, разные группы
+    не пересекаются по хостам и могут выполняться параллельно.
+    """
+    groups: List[List[int]] = []
+    group_hosts: List[Set[str]] = []
+    for rule_index, rule in enumerate(rule_list):
+        hosts = rule_hosts(rule)
+        joined = [index for index, used in enumerate(group_hosts) if used & hosts]
+        merged = [rule_index]
+        for index in reversed(joined):
+            hosts |= group_hosts.pop(index)
+            merged.extend(groups.pop(index))
+        groups.append(sorted(merged))
+        group_hosts.append(hosts)
+    return groups
+
+
+def run_rule(
+    rule: ArchiveRule, on_start: Optional[Callable[[Archivator], None]] = None,
+) -> RuleResult:
+    """Функция выполняет одно правило архивации.
+
+    Через on_start можно следить за ходом выполнения правила по archivator.stats.
+
+    Arguments:
+        rule (ArchiveRule): правило архивации.
+        on_start (Callable): вызывается с архиватором до начала копирования.
+    """
+    started = time.monotonic()
+    if rule.method != 1:
+        logger.warning(f'rule {rule.name}: method {rule.method} is not supported, skipped')
+        return RuleResult(rule.name, success=False, seconds=0)
+    archivator = Actualize(rule.filesmap, pool, rule.name)
+    if on_start is not None:
+        on_start(archivator)
+    try:
+        success = archivator.run()
+    except Exception:
+        logger.exception(f'rule {rule.name} failed')
+        success = False
+    stats = archivator.stats.targets.values()
+    return RuleResult(
+        rule.name,
+        success=success,
+        seconds=time.monotonic() - started,
+        files=sum(target.files for target in stats),
+        bytes=sum(target.bytes for target in stats),
+    )
+
+
+def run_group(rule_group: List[ArchiveRule]) -> List[RuleResult]:
+    return [run_rule(rule) for rule in rule_group]
+
+
+def run(
+    rule_list: List[ArchiveRule], max_parallel: int = MAX_PARALLEL_RULES,
+) -> List[RuleResult]:
+    """Функция выполняет правила архивации, независимые по хостам правила идут параллельно.
+
+    Правила с общим хостом источника или приемника выполняются последовательно, чтобы
+    не перегружать одно хранилище.
+
+    Returns:
+        List[RuleResult]: итоги правил в порядке config.yaml.
+    """
+    index_groups = group_rules(rule_list)
+    groups = [[rule_list[index] for index in group] for group in index_groups]
+    results: List[RuleResult] = []
+    with closing(pool):
+        with ThreadPoolExecutor(max(max_parallel, 1), thread_name_prefix='rule') as executor:
+            for group_results in executor.map(run_group, groups):
+                results.extend(group_results)
+    order = [index for group in index_groups for index in group]
+    ranked = sorted(zip(order, results), key=itemgetter(0))
+    return [result for _, result in ranked]
+
+
+def summary(results: List[RuleResult], total: timedelta) -> str:
+    """Функция формирует текстовый отчет о времени выполнения правил."""
+    lines = [
+        '{0:<30} {1:<6} {2:>10.1f}s {3:>6} files {4:>10.1f} MB'.format(
+            result.name,
+            'ok' if result.success else 'fail',
+            result.seconds,
+            result.files,
+            result.bytes / MB,
+        )
+        for result in results
+    ]
+    lines.append(f'total: {total}')
+    return '\n'.join(lines)
@@ -0,0 +1,119 @@
+# В модуле представлен локальный каталог состояния архивации файлов
+import sqlite3
+import threading
+from dataclasses import astuple, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from smb.base import SharedFile
+
+COPIED = 'copied'
+PRUNED = 'pruned'
+DONE_STATUSES = frozenset((COPIED, PRUNED))
+
+FILES_TABLE = """
+    CREATE TABLE IF NOT EXISTS files (
+        rule TEXT, filename TEXT, target TEXT, size INTEGER, mtime REAL,
+        status TEXT, checksum TEXT, updated_at TEXT,
+        PRIMARY KEY (rule, filename, target)
+    )
+"""
+SET_STATUS = """
+    UPDATE files SET status = ?, updated_at = ?
+    WHERE rule = ? AND filename = ? AND target = ?
+"""
+
+EntryKey = Tuple[str, str]
+
+
+@dataclass
+class CatalogEntry:
+    """Состояние копии исходного файла в одном целевом каталоге."""
+
+    rule: str
+    filename: str
+    target: str
+    size: int
+    mtime: float
+    status: str
+    checksum: Optional[str]
+    updated_at: str
+
+    def matches(self, source_file: SharedFile) -> bool:
+        """Метод проверяет, что исходный файл не менялся с момента записи в каталог."""
+        return self.size == source_file.file_size and self.mtime == source_file.last_write_time
+
+    def describe(self) -> str:
+        """Метод возвращает строку истории копирования для вывода в консоль."""
+        parts = (self.updated_at, self.rule, self.filename, '->', self.target, self.status)
+        return ' '.join(parts)
+
+
+class Catalog:
+    """Каталог файлов правил архивации в SQLite.
+
+    Для каждого исходного файла и целевого каталога хранится размер, время изменения,
+    контрольная сумма и статус копии. Каталог загружается в память один раз за запуск,
+    поэтому проверка неизменившегося файла стоит одного обращения к словарю.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(FILES_TABLE)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def load(self, rule: str) -> Dict[EntryKey, CatalogEntry]:
+        """Метод возвращает состояние файлов правила с ключом (filename, target)."""
+        return {
+            (entry.filename, entry.target): entry for entry in self.history(rule=rule)
+        }
+
+    def record(
+        self,
+        rule: str,
+        source_file: SharedFile,
+        target: str,
+        status: str,
+        checksum: Optional[str] = None,
+    ) -> CatalogEntry:
+        entry = CatalogEntry(
+            rule=rule,
+            filename=source_file.filename,
+            target=target,
+            size=source_file.file_size,
+            mtime=source_file.last_write_time,
+            status=status,
+            checksum=checksum,
+            updated_at=datetime.now().isoformat(timespec='seconds'),
+        )
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', astuple(entry),
+            )
+            self._db.commit()
+        return entry
+
+    def set_status(self, rule: str, filename: str, target: str, status: str) -> None:
+        """Метод меняет статус копии, сохраняя сведения об исходном файле."""
+        with self._lock:
+            updated_at = datetime.now().isoformat(timespec='seconds')
+            self._db.execute(SET_STATUS, (status, updated_at, rule, filename, target))
+            self._db.commit()
+
+    def history(
+        self, rule: Optional[str] = None, filename: Optional[str] = None,
+    ) -> List[CatalogEntry]:
+        """Метод отвечает на вопрос что и когда было скопировано, не обращаясь к хранилищам."""
+        query = 'SELECT * FROM files WHERE (? IS NULL OR rule = ?) AND (? IS NULL OR filename = ?)'
+        with self._lock:
+            rows = self._db.execute(
+                f'{query} ORDER BY updated_at', (rule, rule, filename, filename),
+            ).fetchall()
+        return [CatalogEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
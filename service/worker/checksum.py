@@ -0,0 +1,69 @@
+# В модуле представлен расчет контрольных сумм файлов в процессе передачи
+import hashlib
+import importlib
+import time
+from types import ModuleType
+from typing import Any, Optional
+
+
+def optional_module(name: str) -> Optional[ModuleType]:
+    """Функция импортирует необязательный пакет, None - пакет не установлен."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+xxhash = optional_module('xxhash')
+blake3 = optional_module('blake3')
+
+
+def default_algorithm() -> str:
+    """Функция выбирает самый быстрый из установленных алгоритмов хеширования."""
+    if xxhash is not None:
+        return 'xxh3_128'
+    if blake3 is not None:
+        return 'blake3'
+    return 'blake2b'
+
+
+def new_hasher(algorithm: str) -> Any:
+    if algorithm == 'xxh3_128' and xxhash is not None:
+        return xxhash.xxh3_128()
+    if algorithm == 'blake3' and blake3 is not None:
+        return blake3.blake3()
+    return hashlib.new(algorithm)
+
+
+class HashingWriter:
+    """Файл_объект, который считает контрольную сумму данных по пути в sink.
+
+    Хеш обновляется в том же проходе, в котором данные записываются в sink, отдельного
+    чтения файла не требуется. Время хеширования накапливается в seconds.
+
+    Attributes:
+        algorithm (str): имя алгоритма хеширования.
+        seconds (float): суммарное время, потраченное на хеширование.
+        size (int): количество прохешированных байт.
+    """
+
+    def __init__(self, sink: Optional[Any] = None, algorithm: Optional[str] = None):
+        self.sink = sink
+        self.algorithm = algorithm or default_algorithm()
+        self.seconds: float = 0
+        self.size = 0
+        self._hasher = new_hasher(self.algorithm)
+
+    def write(self, chunk: bytes) -> int:
+        started = time.perf_counter()
+        self._hasher.update(chunk)
+        self.seconds += time.perf_counter() - started
+        self.size += len(chunk)
+        if self.sink is not None:
+            self.sink.write(chunk)
+        return len(chunk)
+
+    def checksum(self) -> str:
+        """Метод возвращает контрольную сумму в виде '<алгоритм>:<hex>'."""
+        digest = self._hasher.hexdigest()
+        return f'{self.algorithm}:{digest}'
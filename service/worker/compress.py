@@ -0,0 +1,299 @@
+# В модуле представлено сжатие файлов при передаче в целевой каталог и их восстановление
+import io
+import json
+import lzma
+import os
+import struct
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, BinaryIO, Deque, Dict, List, Optional, Tuple
+
+from smb.base import SharedFile
+
+from service.models import Compression, CompressionMethod, RemoteDir
+from service.worker.checksum import optional_module
+from service.worker.remotehost import HostPC
+from service.worker.stream import MB
+
+zstandard = optional_module('zstandard')
+
+SUFFIXES = MappingProxyType({
+    CompressionMethod.zstd: '.zst',
+    CompressionMethod.lzma: '.xz',
+})
+# Заголовок оформлен как skippable frame формата zstd, утилита zstd его пропускает
+HEADER_MAGIC = 0x184D2A5E
+HEADER_PREFIX = struct.Struct('<II')
+HEADER_LIMIT = 64 * 1024
+HEADER_READ = 4096
+LZMA_BLOCK = 4 * MB
+
+Header = Dict[str, Any]
+
+
+def effective_method(compression: Compression) -> CompressionMethod:
+    """Функция возвращает используемый алгоритм, без пакета zstandard zstd заменяется на lzma."""
+    if compression.method == CompressionMethod.zstd and zstandard is None:
+        return CompressionMethod.lzma
+    return compression.method
+
+
+def compressed_name(filename: str, compression: Compression) -> str:
+    suffix = SUFFIXES[effective_method(compression)]
+    return f'{filename}{suffix}'
+
+
+def compressed_names(filename: str, compression: Compression) -> List[str]:
+    """Функция возвращает возможные имена сжатой копии, первым - имя для новой копии.
+
+    Без пакета zstandard новые копии сжимаются lzma, но записанные ранее копии .zst
+    остаются в целевом каталоге, поэтому копия ищется под именами со всеми суффиксами.
+    """
+    preferred = compressed_name(filename, compression)
+    names = [f'{filename}{suffix}' for suffix in SUFFIXES.values()]
+    return [preferred] + [name for name in names if name != preferred]
+
+
+def original_name(target_name: str) -> str:
+    """Функция возвращает имя исходного файла по имени сжатой копии."""
+    for suffix in SUFFIXES.values():
+        if target_name.endswith(suffix):
+            return target_name[:-len(suffix)]
+    return target_name
+
+
+def pack_header(source_file: SharedFile, method: CompressionMethod) -> bytes:
+    meta = json.dumps({
+        'name': source_file.filename,
+        'mtime': source_file.last_write_time,
+        'size': source_file.file_size,
+        'method': method.value,
+    }).encode()
+    return HEADER_PREFIX.pack(HEADER_MAGIC, len(meta)) + meta
+
+
+def unpack_header(data: bytes) -> Optional[Tuple[Header, int]]:
+    """Функция разбирает заголовок в начале data.
+
+    Returns:
+        Optional[Tuple[Header, int]]: заголовок и его длина, None если data содержит
+            заголовок не полностью.
+
+    Raises:
+        ValueError: данные не начинаются с заголовка сжатой копии.
+    """
+    if len(data) < HEADER_PREFIX.size:
+        return None
+    magic, length = HEADER_PREFIX.unpack_from(data)
+    if magic != HEADER_MAGIC or length > HEADER_LIMIT:
+        raise ValueError('compression header not found')
+    end = HEADER_PREFIX.size + length
+    if len(data) < end:
+        return None
+    return json.loads(bytes(data[HEADER_PREFIX.size:end])), end
+
+
+class LzmaBlocks:
+    """Сжатие lzma независимыми блоками в пуле потоков.
+
+    Каждый блок LZMA_BLOCK сжимается в отдельный поток xz, результаты записываются в исходном
+    порядке. lzma освобождает GIL, поэтому блоки сжимаются параллельно на нескольких ядрах,
+    в памяти одновременно находится не больше 2 * threads блоков.
+    """
+
+    def __init__(self, level: int, threads: int):
+        self.level = level
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='lzma')
+        self._buffer = bytearray()
+        self._pending: Deque['Future[bytes]'] = deque()
+        self._blocks = 0
+
+    def compress(self, data: bytes) -> bytes:
+        self._buffer += data
+        while len(self._buffer) >= LZMA_BLOCK:
+            self._submit(bytes(self._buffer[:LZMA_BLOCK]))
+            del self._buffer[:LZMA_BLOCK]  # noqa: WPS420 освобождает начало буфера без копии
+        return self._collect(keep=self.threads)
+
+    def flush(self) -> bytes:
+        if self._buffer or not self._blocks:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        with self._executor:
+            return self._collect(keep=0)
+
+    def _submit(self, block: bytes) -> None:
+        self._blocks += 1
+        future = self._executor.submit(lzma.compress, block, preset=self.level)
+        self._pending.append(future)
+
+    def _collect(self, keep: int) -> bytes:
+        compressed = bytearray()
+        while len(self._pending) > keep:
+            compressed += self._pending.popleft().result()
+        return bytes(compressed)
+
+
+class XzStreams:
+    """Распаковка последовательности потоков xz, записанных LzmaBlocks."""
+
+    def __init__(self):
+        self._decompressor = lzma.LZMADecompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        unpacked = bytearray()
+        while data:
+            unpacked += self._decompressor.decompress(data)
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = lzma.LZMADecompressor()
+        return bytes(unpacked)
+
+
+def new_compressor(method: CompressionMethod, level: int, threads: int) -> Any:
+    if method == CompressionMethod.zstd and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level, threads=threads).compressobj()
+    return LzmaBlocks(level, threads)
+
+
+def new_decompressor(method: str) -> Any:
+    if method == CompressionMethod.zstd.value:
+        if zstandard is None:
+            raise ValueError('zstandard package is required to restore zstd copies')
+        return zstandard.ZstdDecompressor().decompressobj()
+    return XzStreams()
+
+
+class CompressingWriter:
+    """Файл_объект, который сжимает данные по пути в sink.
+
+    Первым в sink записывается заголовок с именем, временем изменения и размером исходного
+    файла, после последнего блока данных необходимо вызвать close.
+
+    Attributes:
+        method (CompressionMethod): используемый алгоритм сжатия.
+        size (int): количество байт, записанных в sink.
+    """
+
+    def __init__(
+        self, source_file: SharedFile, compression: Compression, sink: Optional[Any] = None,
+    ):
+        self.sink = sink
+        self.method = effective_method(compression)
+        self.size = 0
+        self._header = pack_header(source_file, self.method)
+        threads = compression.threads or os.cpu_count() or 1
+        self._compressor = new_compressor(self.method, compression.level, threads)
+
+    def write(self, chunk: bytes) -> int:
+        self._emit_header()
+        self._emit(self._compressor.compress(chunk))
+        return len(chunk)
+
+    def close(self) -> None:
+        self._emit_header()
+        self._emit(self._compressor.flush())
+
+    def _emit_header(self) -> None:
+        if self._header:
+            self._emit(self._header)
+            self._header = b''
+
+    def _emit(self, data: bytes) -> None:
+        if not data:
+            return
+        if self.sink is None:
+            raise ValueError('compressed data has no sink to be written to')
+        self.sink.write(data)
+        self.size += len(data)
+
+
+class DecompressingWriter:
+    """Файл_объект, который разбирает заголовок сжатой копии и распаковывает данные в output.
+
+    Attributes:
+        header (Header): заголовок копии, доступен после получения первых байт.
+        size (int): количество распакованных байт.
+    """
+
+    def __init__(self, output: BinaryIO):
+        self.output = output
+        self.header: Optional[Header] = None
+        self.size = 0
+        self._buffer = bytearray()
+        self._decompressor: Any = None
+
+    def write(self, chunk: bytes) -> int:
+        data = chunk
+        if self.header is None:
+            self._buffer += chunk
+            parsed = unpack_header(self._buffer)
+            if parsed is None:
+                return len(chunk)
+            header, length = parsed
+            data = bytes(self._buffer[length:])
+            self._buffer = bytearray()
+            self._decompressor = new_decompressor(header['method'])
+            self.header = header
+        unpacked = self._decompressor.decompress(data)
+        self.output.write(unpacked)
+        self.size += len(unpacked)
+        return len(chunk)
+
+
+def restore(target_host: HostPC, target_dir: RemoteDir, filename: str, output: BinaryIO) -> Header:
+    """Функция распаковывает сжатую копию filename из целевого каталога в output.
+
+    Returns:
+        Header: заголовок копии с именем, временем изменения и размером исходного файла.
+
+    Raises:
+        ValueError: копия повреждена или не является сжатой копией.
+    """
+    writer = DecompressingWriter(output)
+    with target_host.session() as conn:
+        conn.retrieveFile(target_dir.drive, f'{target_dir.dir}{filename}', writer)
+    header = writer.header
+    if header is None:
+        raise ValueError(f'{filename}: compression header not found')
+    expected = header['size']
+    if writer.size != expected:
+        raise ValueError(f'{filename}: restored {writer.size} of {expected} bytes')
+    return header
+
+
+def read_header(target_host: HostPC, target_dir: RemoteDir, filename: str) -> Optional[Header]:
+    """Функция читает только заголовок сжатой копии, None если его не удалось прочитать."""
+    head = io.BytesIO()
+    target_path = f'{target_dir.dir}{filename}'
+    try:
+        with target_host.session() as conn:
+            conn.retrieveFileFromOffset(
+                target_dir.drive, target_path, head, 0, max_length=HEADER_READ,
+            )
+        parsed = unpack_header(head.getvalue())
+    except Exception:
+        return None
+    if parsed is None:
+        return None
+    return parsed[0]
+
+
+def copy_name(
+    target_host: HostPC, target_dir: RemoteDir, filename: str, compression: Compression,
+) -> str:
+    """Функция возвращает имя существующей сжатой копии filename в целевом каталоге.
+
+    Если ни одно из имен compressed_names в каталоге не найдено, возвращается имя для
+    новой копии.
+    """
+    names = compressed_names(filename, compression)
+    listed = {
+        remote_file.filename
+        for remote_file in target_host.remote_files(target_dir)
+        if remote_file is not None
+    }
+    return next((name for name in names if name in listed), names[0])
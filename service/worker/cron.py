@@ -0,0 +1,120 @@
+# В модуле представлено расписание запуска правил в формате cron
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Optional, Set, Tuple
+
+ALIASES = MappingProxyType({
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+})
+# Поля выражения в порядке записи и их допустимые значения
+FIELD_RANGES = MappingProxyType({
+    'minutes': (0, 59),
+    'hours': (0, 23),
+    'days': (1, 31),
+    'months': (1, 12),
+    'weekdays': (0, 7),  # 0 и 7 - воскресенье
+})
+SEARCH_DAYS = 366 * 5
+
+
+def span_bounds(span: str, low: int, high: int, stepped: bool) -> Tuple[int, int]:
+    """Функция возвращает границы диапазона поля cron без шага, '*' - все значения."""
+    if span == '*':
+        return low, high
+    if '-' in span:
+        start, end = span.split('-', 1)
+        return int(start), int(end)
+    start_value = int(span)
+    return start_value, high if stepped else start_value
+
+
+def parse_range(part: str, low: int, high: int) -> range:
+    """Функция разбирает один элемент списка поля cron.
+
+    Raises:
+        ValueError: элемент записан с ошибкой или выходит за пределы low-high.
+    """
+    span, _, step_text = part.partition('/')
+    step = int(step_text) if step_text else 1
+    start, end = span_bounds(span, low, high, stepped=bool(step_text))
+    if start < low or end > high or start > end or step < 1:
+        raise ValueError(f'cron field {part} out of range {low}-{high}')
+    return range(start, end + 1, step)
+
+
+def parse_field(text: str, low: int, high: int) -> Set[int]:
+    """Функция разбирает поле cron: ``*``, ``a``, ``a-b``, ``*/n``, ``a-b/n`` и их списки.
+
+    Элементы списка записываются через запятую.
+    """
+    values_set: Set[int] = set()
+    for part in text.split(','):
+        values_set.update(parse_range(part, low, high))
+    return values_set
+
+
+class CronSchedule:
+    """Расписание в формате cron из пяти полей: минута, час, день месяца, месяц, день недели.
+
+    Как и в cron, если ограничены и день месяца, и день недели, подходит любой из них.
+    Поддерживаются сокращения @hourly, @daily, @weekly и @monthly.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        texts = ALIASES.get(expression.strip(), expression).split()
+        if len(texts) != len(FIELD_RANGES):
+            raise ValueError(f'cron expression must have 5 fields: {expression}')
+        fields = dict(zip(FIELD_RANGES, texts))
+        values = {
+            name: parse_field(fields[name], low, high)
+            for name, (low, high) in FIELD_RANGES.items()
+        }
+        self.minutes = values['minutes']
+        self.hours = values['hours']
+        self.days = values['days']
+        self.months = values['months']
+        self.weekdays = {weekday % 7 for weekday in values['weekdays']}
+        self._any_day = fields['days'] == '*' or fields['weekdays'] == '*'
+
+    def day_matches(self, moment: datetime) -> bool:
+        weekday = (moment.weekday() + 1) % 7
+        in_month = moment.day in self.days
+        in_week = weekday in self.weekdays
+        if self._any_day:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Метод возвращает ближайшее время запуска строго после moment.
+
+        Raises:
+            ValueError: по расписанию нет запусков, например 30 февраля.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=SEARCH_DAYS)
+        while candidate < limit:
+            following = self.skip(candidate)
+            if following is None:
+                return candidate
+            candidate = following
+        raise ValueError(f'cron expression never fires: {self.expression}')
+
+    def skip(self, candidate: datetime) -> Optional[datetime]:
+        """Метод возвращает следующее проверяемое время, None если candidate подходит.
+
+        Неподходящий месяц, день или час пропускается целиком.
+        """
+        if candidate.month not in self.months:
+            month_start = candidate.replace(day=1, hour=0, minute=0)
+            return (month_start + timedelta(days=32)).replace(day=1)
+        if not self.day_matches(candidate):
+            return candidate.replace(hour=0, minute=0) + timedelta(days=1)
+        if candidate.hour not in self.hours:
+            return candidate.replace(minute=0) + timedelta(hours=1)
+        if candidate.minute not in self.minutes:
+            return candidate + timedelta(minutes=1)
+        return None
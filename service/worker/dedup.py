@@ -0,0 +1,369 @@
+# В модуле представлена передача файлов с дедупликацией блоков переменной длины
+import hashlib
+import io
+import json
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import suppress
+from functools import partial
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Set, Tuple
+
+from smb.base import SharedFile
+from smb.SMBConnection import SMBConnection
+
+from service.models import RemoteDir
+from service.worker.remotehost import HostPC
+from service.worker.retry import BROKEN_CONNECTION
+from service.worker.walker import split_path
+
+logger = logging.getLogger(__name__)
+
+CHUNK_DIR = '.chunks'
+MANIFEST_SUFFIX = '.manifest'
+MIN_CHUNK = 256 * 1024
+AVG_CHUNK = 1024 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+ANCHOR_COUNT = 16
+ANCHOR_BITS = 4  # байт из ANCHOR_COUNT значений встречается с вероятностью 1 / 2 ** ANCHOR_BITS
+
+
+def byte_digest(byte: int) -> bytes:
+    return hashlib.sha256(bytes([byte])).digest()
+
+
+# Опорные байты границы блока: фиксированный псевдослучайный набор, 0x00 и 0xFF исключены,
+# так как ими бывают заполнены целые области файлов
+ANCHOR_ORDER = sorted(range(1, 255), key=byte_digest)
+ANCHOR_BYTES = frozenset(ANCHOR_ORDER[:ANCHOR_COUNT])
+# Таблица для bytes.translate: опорный байт отображается в 0, остальные в 1
+ANCHOR_TABLE = bytes(int(byte not in ANCHOR_BYTES) for byte in range(256))
+
+CHUNKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS chunks
+    (store TEXT, hash TEXT, size INTEGER, PRIMARY KEY (store, hash))
+"""
+
+ChunkRef = Tuple[str, int]
+
+
+class Chunker:
+    """Разбиение потока данных на блоки по содержимому (content-defined chunking).
+
+    Граница блока ставится после серии опорных байт ANCHOR_BYTES, длина серии подобрана
+    так, чтобы она встречалась в среднем раз в avg_size байт. Граница зависит только от
+    последних байт, поэтому вставка или удаление данных в начале файла не сдвигает границы
+    остальных блоков и они дедуплицируются. Серия ищется регулярным выражением в копии
+    данных, отображенной bytes.translate, то есть без цикла Python по каждому байту.
+    Объект пригоден как файл_объект для retrieveFile.
+    """
+
+    def __init__(
+        self,
+        on_chunk: Callable[[bytes], None],
+        min_size: int = MIN_CHUNK,
+        avg_size: int = AVG_CHUNK,
+        max_size: int = MAX_CHUNK,
+    ):
+        self.on_chunk = on_chunk
+        self.min_size = min_size
+        self.max_size = max_size
+        bits = avg_size.bit_length() - 1
+        self._run = max(1, round(bits / ANCHOR_BITS))
+        self._anchor = re.compile(bytes(self._run))
+        self._buffer = bytearray()
+        self._mapped = bytearray()
+        self._pos = 0
+
+    def write(self, chunk: bytes) -> int:
+        self._buffer += chunk
+        self._mapped += bytes(chunk).translate(ANCHOR_TABLE)
+        while self._scan():
+            self._pos = 0
+        return len(chunk)
+
+    def flush(self) -> None:
+        """Метод отдает последний неполный блок."""
+        if self._buffer:
+            self._emit(len(self._buffer))
+
+    def _scan(self) -> bool:
+        """Метод ищет границу блока, True если блок найден и отдан."""
+        pos = max(self._pos, self.min_size - self._run)
+        limit = min(len(self._mapped), self.max_size)
+        found = self._anchor.search(self._mapped, pos, limit)
+        if found is not None:
+            self._emit(found.end())
+            return True
+        if limit >= self.max_size:
+            self._emit(self.max_size)
+            return True
+        # Серия, начатая в последних байтах, может продолжиться в следующей записи
+        self._pos = max(pos, limit - self._run + 1)
+        return False
+
+    def _emit(self, size: int) -> None:
+        chunk = bytes(self._buffer[:size])
+        # удаление из начала bytearray сдвигает начало буфера без копирования данных
+        del self._buffer[:size]  # noqa: WPS420
+        del self._mapped[:size]  # noqa: WPS420
+        self.on_chunk(chunk)
+
+
+def chunk_hash(chunk: bytes) -> str:
+    return hashlib.sha256(chunk).hexdigest()
+
+
+class ChunkIndex:
+    """Локальный индекс блоков, уже сохраненных в хранилищах целевых каталогов (SQLite)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(CHUNKS_TABLE)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def has(self, store: str, digest: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT 1 FROM chunks WHERE store = ? AND hash = ?', (store, digest),
+            ).fetchone()
+        return row is not None
+
+    def add(self, store: str, digest: str, size: int) -> None:
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO chunks VALUES (?, ?, ?)', (store, digest, size),
+            )
+            self._db.commit()
+
+    def hashes(self, store: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT hash FROM chunks WHERE store = ?', (store,)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, store: str, digests: Iterable[str]) -> None:
+        with self._lock:
+            self._db.executemany(
+                'DELETE FROM chunks WHERE store = ? AND hash = ?',
+                [(store, digest) for digest in digests],
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def chunk_subdir(target_dir: RemoteDir, digest: str) -> str:
+    prefix = digest[:2]
+    return f'{target_dir.dir}{CHUNK_DIR}/{prefix}'
+
+
+def chunk_path(target_dir: RemoteDir, digest: str) -> str:
+    subdir = chunk_subdir(target_dir, digest)
+    return f'{subdir}/{digest}'
+
+
+class DedupUploader:
+    """Запись файла в хранилище блоков целевого каталога.
+
+    Блоки, уже имеющиеся в хранилище по данным ChunkIndex, повторно не передаются.
+    После записи всех блоков в каталог помещается манифест файла, по которому
+    выполняется восстановление.
+
+    Attributes:
+        store (str): ключ хранилища целевого каталога в ChunkIndex и статистике.
+        sent_bytes (int): объем данных, фактически переданных в целевой каталог.
+        chunks (List[ChunkRef]): хеши и размеры блоков файла по порядку.
+    """
+
+    def __init__(
+        self,
+        target_host: HostPC,
+        target_dir: RemoteDir,
+        chunk_index: ChunkIndex,
+        created_dirs: Set[str],
+    ):
+        self.target_host = target_host
+        self.target_dir = target_dir
+        self.store = target_host.location_key(target_dir)
+        self.sent_bytes = 0
+        self.chunks: List[ChunkRef] = []
+        self._chunk_index = chunk_index
+        self._created_dirs = created_dirs
+        self._chunk_root = f'{target_dir.dir}{CHUNK_DIR}'
+        # created_dirs общий для всех целевых каталогов правила, ключ включает хост и диск
+        self._dir_prefix = f'{target_host.host}/{target_dir.drive}'
+
+    def put_chunk(self, chunk: bytes) -> None:
+        digest = chunk_hash(chunk)
+        self.chunks.append((digest, len(chunk)))
+        if self._chunk_index.has(self.store, digest):
+            return
+        self._ensure_dir(self._chunk_root)
+        self._ensure_dir(chunk_subdir(self.target_dir, digest))
+        with self.target_host.session() as conn:
+            conn.storeFile(
+                self.target_dir.drive,
+                chunk_path(self.target_dir, digest),
+                io.BytesIO(chunk),
+            )
+        self.sent_bytes += len(chunk)
+        self._chunk_index.add(self.store, digest, len(chunk))
+
+    def manifest(self, source_file: SharedFile) -> bytes:
+        return json.dumps({
+            'name': source_file.filename,
+            'size': source_file.file_size,
+            'mtime': source_file.last_write_time,
+            'chunks': self.chunks,
+        }).encode()
+
+    def _ensure_dir(self, path: str) -> None:
+        dir_key = f'{self._dir_prefix}{path}'
+        if dir_key in self._created_dirs:
+            return
+        # Ошибка создания означает, что каталог уже существует
+        with suppress(Exception):
+            with self.target_host.session() as conn:
+                conn.createDirectory(self.target_dir.drive, path)
+        self._created_dirs.add(dir_key)
+
+
+def read_manifest(conn: SMBConnection, target_dir: RemoteDir, manifest_name: str) -> Any:
+    """Функция читает манифест manifest_name каталога target_dir в открытой сессии conn."""
+    manifest_file = io.BytesIO()
+    conn.retrieveFile(target_dir.drive, f'{target_dir.dir}{manifest_name}', manifest_file)
+    return json.loads(manifest_file.getvalue())
+
+
+def restore(
+    target_host: HostPC, target_dir: RemoteDir, filename: str, output: BinaryIO,
+) -> int:
+    """Функция восстанавливает файл по манифесту из хранилища блоков целевого каталога.
+
+    filename в режиме recursive - путь файла относительно target_dir, блоки читаются из
+    хранилища каталога, в котором находится манифест.
+
+    Returns:
+        int: количество восстановленных байт.
+
+    Raises:
+        ValueError: блок хранилища поврежден.
+    """
+    store_dir, name = split_path(target_dir, filename)
+    with target_host.session() as conn:
+        manifest = read_manifest(conn, store_dir, f'{name}{MANIFEST_SUFFIX}')
+        restored = 0
+        for digest, size in manifest['chunks']:
+            chunk_file = io.BytesIO()
+            conn.retrieveFile(store_dir.drive, chunk_path(store_dir, digest), chunk_file)
+            chunk = chunk_file.getvalue()
+            if len(chunk) != size or chunk_hash(chunk) != digest:
+                raise ValueError(f'chunk {digest} of {filename} is corrupted')
+            output.write(chunk)
+            restored += size
+    return restored
+
+
+def referenced_chunks(
+    target_host: HostPC, target_dir: RemoteDir, manifests: Iterable[str],
+) -> Set[str]:
+    """Функция читает манифесты manifests целевого каталога и возвращает хеши их блоков.
+
+    Ошибка чтения манифеста не перехватывается: набор используемых блоков неизвестен.
+    """
+    referenced: Set[str] = set()
+    with target_host.session() as conn:
+        for manifest_name in manifests:
+            manifest = read_manifest(conn, target_dir, manifest_name)
+            referenced.update(digest for digest, _ in manifest['chunks'])
+    return referenced
+
+
+def prune(
+    target_host: HostPC, target_dir: RemoteDir, chunk_index: ChunkIndex, manifests: Iterable[str],
+) -> int:
+    """Функция удаляет из хранилища каталога блоки, на которые не ссылается ни один манифест.
+
+    Кандидаты на удаление - блоки хранилища из ChunkIndex, используемые блоки читаются из
+    всех манифестов manifests, оставшихся в каталоге. Если хотя бы один манифест не
+    прочитан, блоки не удаляются.
+
+    Returns:
+        int: количество удаленных блоков.
+    """
+    store = target_host.location_key(target_dir)
+    try:
+        referenced = referenced_chunks(target_host, target_dir, manifests)
+    except Exception:
+        logger.warning(f'Fail read manifests in {store}, chunks are not pruned')
+        return 0
+    removed = delete_chunks(target_host, target_dir, set(chunk_index.hashes(store)) - referenced)
+    # Блок, который не удалось удалить, забывается индексом и при повторе будет записан заново
+    chunk_index.remove(store, removed)
+    return len(removed)
+
+
+def delete_chunks(target_host: HostPC, target_dir: RemoteDir, digests: Set[str]) -> List[str]:
+    """Функция удаляет блоки digests из хранилища каталога в одной сессии.
+
+    Returns:
+        List[str]: хеши блоков, удаление которых выполнено или которых уже нет.
+    """
+    pending = sorted(digests)
+    removed: List[str] = []
+
+    def delete_batch(conn: SMBConnection) -> None:
+        while pending:
+            digest = pending[0]
+            try:
+                conn.deleteFiles(target_dir.drive, chunk_path(target_dir, digest))
+            except BROKEN_CONNECTION:  # noqa: WPS329 разрыв соединения повторяет call
+                raise
+            except Exception:
+                logger.warning(f'Fail delete chunk {digest} on host {target_host.host}')
+            removed.append(pending.pop(0))
+
+    try:
+        target_host.call('delete', delete_batch)
+    except BROKEN_CONNECTION:
+        logger.warning(f'Fail connect to host {target_host.pcname}, {target_host.host}\n\n')
+    return removed
+
+
+def benchmark(paths: Iterable[Path], read_size: int = AVG_CHUNK) -> Dict[str, int]:
+    """Функция оценивает эффект дедупликации на последовательности локальных файлов.
+
+    Файлы обрабатываются по порядку, как ежедневные архивы одного каталога, с общим
+    индексом блоков в памяти.
+
+    Returns:
+        Dict[str, int]: логический объем данных и объем, который был бы передан по сети.
+    """
+    known: Set[str] = set()
+    report = {'files': 0, 'logical_bytes': 0, 'wire_bytes': 0, 'chunks': 0, 'new_chunks': 0}
+
+    def account(chunk: bytes) -> None:
+        digest = chunk_hash(chunk)
+        report['chunks'] += 1
+        # В манифест для каждого блока записывается хеш и размер
+        report['wire_bytes'] += len(json.dumps([digest, len(chunk)]))
+        if digest not in known:
+            known.add(digest)
+            report['new_chunks'] += 1
+            report['wire_bytes'] += len(chunk)
+
+    for path in paths:
+        chunker = Chunker(account)
+        with open(path, 'rb') as fh:
+            for block in iter(partial(fh.read, read_size), b''):
+                chunker.write(block)
+        chunker.flush()
+        report['files'] += 1
+        report['logical_bytes'] += path.stat().st_size
+    return report
@@ -0,0 +1,72 @@
+# В модуле представлен индекс содержимого удаленного каталога
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from smb.base import SharedFile
+
+Loader = Callable[[], Iterable[Optional[SharedFile]]]
+
+SPECIAL_DIRS = frozenset(('.', '..'))
+
+
+class DirIndex:
+    """Индекс файлов удаленного каталога, построенный по одному листингу.
+
+    Индекс заменяет отдельные запросы getAttributes для каждого файла: каталог читается
+    один раз за запуск, далее индекс обновляется после каждого копирования или удаления.
+    Если листинг содержит подкаталоги, их имена также сохраняются в индексе.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._files: Dict[str, SharedFile] = {}
+        self._dirs: Set[str] = set()
+        self._lock = threading.RLock()
+
+    def load(self, loader: Loader) -> 'DirIndex':
+        """Метод заполняет индекс результатом листинга, листинг выполняется один раз."""
+        with self._lock:
+            if not self.loaded:
+                for entry in loader():
+                    self._add_entry(entry)
+                self.loaded = True
+        return self
+
+    def get(self, filename: str) -> Optional[SharedFile]:
+        with self._lock:
+            return self._files.get(filename)
+
+    def exists(self, filename: str) -> bool:
+        return self.get(filename) is not None
+
+    def add(self, entry: SharedFile) -> None:
+        with self._lock:
+            self._files[entry.filename] = entry
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            self._files.pop(filename, None)
+
+    def has_dir(self, name: str) -> bool:
+        with self._lock:
+            return name in self._dirs
+
+    def add_dir(self, name: str) -> None:
+        with self._lock:
+            self._dirs.add(name)
+
+    def files(self) -> List[SharedFile]:
+        with self._lock:
+            return list(self._files.values())
+
+    def dirs(self) -> List[str]:
+        with self._lock:
+            return sorted(self._dirs)
+
+    def _add_entry(self, entry: Optional[SharedFile]) -> None:
+        if not entry or entry.filename in SPECIAL_DIRS:
+            return
+        if entry.isDirectory:
+            self._dirs.add(entry.filename)
+        else:
+            self._files[entry.filename] = entry
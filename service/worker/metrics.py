@@ -0,0 +1,325 @@
+# В модуле представлен сбор метрик операций с удаленными ПК и отчеты о запуске
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from itertools import chain
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from service.worker.stream import MB
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    20,
+    60,
+)
+PROMETHEUS_PREFIX = 'reserv_copy'
+OPERATION_METRIC = f'{PROMETHEUS_PREFIX}_smb_operation'
+TRANSFER_METRIC = f'{PROMETHEUS_PREFIX}_transfer'
+# Счетчики операций, которые выводятся в Prometheus отдельными метриками
+OPERATION_COUNTERS = ('errors', 'retries', 'bytes')
+MAX_TRANSFERS = 1000  # количество последних передач файлов в отчете
+
+# Имена методов SMBConnection и соответствующие им операции в метриках
+SMB_OPERATIONS = MappingProxyType({
+    'echo': 'echo',
+    'listPath': 'list',
+    'getAttributes': 'stat',
+    'retrieveFile': 'retrieve',
+    'retrieveFileFromOffset': 'retrieve',
+    'storeFile': 'store',
+    'storeFileFromOffset': 'store',
+    'deleteFiles': 'delete',
+    'rename': 'rename',
+    'createDirectory': 'mkdir',
+})
+
+OpKey = Tuple[str, str, str]
+TargetKey = Tuple[str, str]
+
+
+@dataclass
+class OpStats:
+    """Накопленная статистика одной операции для пары правило/хост."""
+
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0
+    bytes: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0 for _ in LATENCY_BUCKETS])
+
+
+@dataclass
+class TransferRecord:
+    """Результат передачи одного файла в один целевой каталог."""
+
+    rule: str
+    target: str
+    bytes: int
+    seconds: float
+    success: bool
+
+    @property
+    def mb_per_sec(self) -> float:
+        if not self.seconds:
+            return 0
+        return self.bytes / MB / self.seconds
+
+
+@dataclass
+class TransferTotals:
+    """Накопленные итоги передач файлов правила в один целевой каталог."""
+
+    files: int = 0
+    errors: int = 0
+    bytes: int = 0
+    seconds: float = 0
+
+
+class Metrics:
+    """Потокобезопасный реестр метрик запуска.
+
+    Операции группируются по правилу, хосту и типу операции: количество, ошибки,
+    повторы, переданные байты и гистограмма задержек. Передачи файлов накапливаются
+    в итогах по правилу и целевому каталогу, отдельно хранятся результаты последних
+    MAX_TRANSFERS передач со скоростью в MB/s, поэтому в режиме daemon реестр не растет.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.ops: Dict[OpKey, OpStats] = {}
+        self.transfers: Deque[TransferRecord] = deque(maxlen=MAX_TRANSFERS)
+        self.targets: Dict[TargetKey, TransferTotals] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.ops = {}
+            self.transfers.clear()
+            self.targets = {}
+
+    def observe(
+        self,
+        rule: str,
+        host: str,
+        op: str,
+        seconds: float,
+        size: int = 0,
+        success: bool = True,
+    ) -> None:
+        with self._lock:
+            stats = self.ops.setdefault((rule, host, op), OpStats())
+            stats.count += 1
+            stats.seconds += seconds
+            stats.bytes += size
+            stats.errors += int(not success)
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                stats.buckets[position] += int(seconds <= bound)
+
+    def retry(self, rule: str, host: str, op: str) -> None:
+        with self._lock:
+            self.ops.setdefault((rule, host, op), OpStats()).retries += 1
+
+    def transfer(self, rule: str, target: str, size: int, seconds: float, success: bool) -> None:
+        with self._lock:
+            self.transfers.append(TransferRecord(rule, target, size, seconds, success))
+            totals = self.targets.setdefault((rule, target), TransferTotals())
+            totals.bytes += size
+            totals.seconds += seconds
+            totals.files += int(success)
+            totals.errors += int(not success)
+
+    def timed_call(
+        self,
+        rule: str,
+        host: str,
+        op: str,
+        method: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """Метод вызывает method и записывает время выполнения операции op.
+
+        Raises:
+            Exception: ошибка method, записанная в метрики как неуспешная операция.
+        """
+        started = time.perf_counter()
+        try:
+            result_value = method(*args, **kwargs)
+        except Exception:
+            seconds = time.perf_counter() - started
+            self.observe(rule, host, op, seconds, success=False)
+            raise
+        seconds = time.perf_counter() - started
+        self.observe(rule, host, op, seconds, moved_bytes(op, result_value))
+        return result_value
+
+    def report(self) -> Dict[str, Any]:
+        """Метод формирует отчет о запуске для сохранения в JSON."""
+        with self._lock:
+            ops = [
+                dict(rule=rule, host=host, op=op, **asdict(stats))
+                for (rule, host, op), stats in sorted(self.ops.items())
+            ]
+            transfers = [
+                dict(asdict(record), mb_per_sec=round(record.mb_per_sec, 3))
+                for record in self.transfers
+            ]
+            targets = [
+                dict(rule=rule, target=target, **asdict(totals))
+                for (rule, target), totals in sorted(self.targets.items())
+            ]
+        return {
+            'started': self.started,
+            'finished': time.time(),
+            'latency_buckets': list(LATENCY_BUCKETS),
+            'operations': ops,
+            'transfers': transfers,
+            'targets': targets,
+        }
+
+    def prometheus(self) -> str:
+        """Метод формирует метрики в текстовом формате Prometheus для node_exporter."""
+        with self._lock:
+            lines = operation_metrics(sorted(self.ops.items()))
+            lines.extend(transfer_metrics(sorted(self.targets.items())))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def write_json(self, path: Path) -> None:
+        write_atomic(path, json.dumps(self.report(), indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path: Path) -> None:
+        write_atomic(path, self.prometheus())
+
+
+class TimedConnection:
+    """Обертка SMBConnection, которая записывает в Metrics время каждой операции.
+
+    Операциям без явного timeout подставляется значение из timeouts, последняя ошибка
+    операции сохраняется в last_error.
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        registry: Metrics,
+        rule: str,
+        host: str,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.conn = conn
+        self.registry = registry
+        self.rule = rule
+        self.host = host
+        self.timeouts = timeouts or {}
+        self.last_error: Optional[BaseException] = None
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self.conn, name)
+        if name not in SMB_OPERATIONS:
+            return method
+        op = SMB_OPERATIONS[name]
+        timeout = self.timeouts.get(op)
+        timed_call = partial(self.registry.timed_call, self.rule, self.host, op, method)
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            if timeout is not None:
+                kwargs.setdefault('timeout', timeout)
+            try:
+                return timed_call(*args, **kwargs)
+            except Exception as exc:
+                self.last_error = exc
+                raise
+        return timed
+
+
+def sample(metric: str, labels: str, value: Any) -> str:
+    return f'{metric}{{{labels}}} {value}'
+
+
+def operation_labels(key: OpKey) -> str:
+    rule, host, op = key
+    return f'rule="{rule}",host="{host}",op="{op}"'
+
+
+def operation_metrics(ops: List[Tuple[OpKey, OpStats]]) -> List[str]:
+    """Функция формирует гистограммы задержек и счетчики SMB операций."""
+    series = f'{OPERATION_METRIC}_seconds'
+    lines = [
+        f'# HELP {series} SMB operation latency.',
+        f'# TYPE {series} histogram',
+    ]
+    counters = {
+        counter: [f'# TYPE {OPERATION_METRIC}_{counter}_total counter']
+        for counter in OPERATION_COUNTERS
+    }
+    for key, stats in ops:
+        labels = operation_labels(key)
+        lines.extend(histogram(series, labels, stats))
+        for counter, samples in counters.items():
+            metric = f'{OPERATION_METRIC}_{counter}_total'
+            samples.append(sample(metric, labels, getattr(stats, counter)))
+    lines.extend(chain.from_iterable(counters.values()))
+    return lines
+
+
+def histogram(series: str, labels: str, stats: OpStats) -> List[str]:
+    bucket = f'{series}_bucket'
+    lines = [
+        sample(bucket, f'{labels},le="{bound}"', hits)
+        for bound, hits in zip(LATENCY_BUCKETS, stats.buckets)
+    ]
+    lines.append(sample(bucket, f'{labels},le="+Inf"', stats.count))
+    seconds = f'{stats.seconds:.6f}'
+    lines.append(sample(f'{series}_sum', labels, seconds))
+    lines.append(sample(f'{series}_count', labels, stats.count))
+    return lines
+
+
+def transfer_metrics(targets: List[Tuple[TargetKey, TransferTotals]]) -> List[str]:
+    """Функция формирует счетчики переданных байт и времени передач по целевым каталогам."""
+    lines = []
+    for counter in ('bytes', 'seconds'):
+        metric = f'{TRANSFER_METRIC}_{counter}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for (rule, target), totals in targets:
+            labels = f'rule="{rule}",target="{target}"'
+            lines.append(sample(metric, labels, getattr(totals, counter)))
+    return lines
+
+
+def moved_bytes(op: str, result_value: Any) -> int:
+    """Функция извлекает объем переданных данных из результата операции SMBConnection."""
+    if op == 'retrieve':
+        return result_value[1]
+    if op == 'store':
+        return result_value
+    return 0
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Функция записывает файл через временное имя, node_exporter не увидит его частично."""
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+metrics = Metrics()
@@ -0,0 +1,146 @@
+# В модуле представлен пул соединений с удаленными компьютерами
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from smb.SMBConnection import SMBConnection
+
+from service.models import RemoteHost
+from service.worker.backends import Backend, open_connection
+from service.worker.metrics import metrics
+
+logger = logging.getLogger('service')
+
+PoolKey = Tuple[str, str, str]
+IdleConnection = Tuple[SMBConnection, float]
+ECHO_TIMEOUT = 5
+ECHO_AFTER = 5
+
+
+def pool_key(hostrules: RemoteHost) -> PoolKey:
+    return (hostrules.host, hostrules.username, hostrules.pcname)
+
+
+class ConnectionPool:
+    """Пул SMB соединений, общий для всех классов архивации.
+
+    Соединения хранятся отдельно для каждой комбинации host/username/pcname. Выданное
+    соединение принадлежит только одному потребителю до его возврата в пул.
+
+    Attributes:
+        max_idle (float): время в секундах, после которого простаивающее соединение закрывается.
+        max_size (int): количество простаивающих соединений, хранимых для одного хоста.
+        echo_after (float): простой в секундах, после которого соединение проверяется echo.
+        backend (Backend): фабрика соединений, по умолчанию выбирается по полю backend хоста.
+    """
+
+    def __init__(
+        self,
+        max_idle: float = 60,
+        max_size: int = 4,
+        backend: Optional[Backend] = None,
+        echo_after: float = ECHO_AFTER,
+    ):
+        self.max_idle = max_idle
+        self.max_size = max_size
+        self.echo_after = echo_after
+        self.backend = backend or open_connection
+        self._idle: Dict[PoolKey, List[IdleConnection]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, hostrules: RemoteHost, rule: str = '') -> SMBConnection:
+        """Метод выдает живое соединение из пула или открывает новое.
+
+        Соединение, простаивавшее дольше echo_after, проверяется запросом echo. Недавно
+        возвращенное соединение выдается без проверки: его обрыв обнаружится на первой
+        операции, и HostPC.session закроет его, не возвращая в пул. Время подключения и
+        проверки соединения записывается в метрики правила rule. Ошибка подключения
+        к удаленному компьютеру (OSError) передается вызывающему.
+        """
+        while True:
+            idle = self._pop_idle(pool_key(hostrules))
+            if idle is None:
+                return metrics.timed_call(rule, hostrules.host, 'connect', self.connect, hostrules)
+            conn, released = idle
+            if time.monotonic() - released <= self.echo_after:
+                return conn
+            if metrics.timed_call(rule, hostrules.host, 'echo', self._is_alive, conn):
+                return conn
+            logger.debug(f'drop dead connection to {hostrules.host}')
+            self.discard(conn)
+
+    def release(self, hostrules: RemoteHost, conn: SMBConnection) -> None:
+        """Метод возвращает соединение в пул для повторного использования."""
+        with self._lock:
+            idle = self._idle.setdefault(pool_key(hostrules), [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    def discard(self, conn: SMBConnection) -> None:
+        """Метод закрывает соединение, не возвращая его в пул."""
+        try:
+            conn.close()
+        except Exception:  # noqa: S110 соединение уже могло быть разорвано
+            logger.debug('connection already closed')
+
+    def close(self) -> None:
+        """Метод закрывает все простаивающие соединения пула."""
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn, _ in conns]
+            self._idle.clear()
+        for conn in idle:
+            self.discard(conn)
+
+    def keepalive(self) -> None:
+        """Метод проверяет простаивающие соединения и продлевает срок жизни живых.
+
+        Вызывается периодически в режиме daemon, чтобы соединения между запусками правил
+        не закрывались ни пулом по max_idle, ни сервером по бездействию.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for key, conns in idle.items():
+            alive = []
+            for conn, _ in conns:
+                if self._is_alive(conn):
+                    alive.append(conn)
+                else:
+                    self.discard(conn)
+            now = time.monotonic()
+            refreshed = [(alive_conn, now) for alive_conn in alive]
+            with self._lock:
+                self._idle.setdefault(key, []).extend(refreshed)
+
+    def connect(self, hostrules: RemoteHost) -> SMBConnection:
+        """Метод открывает новое соединение с удаленным компьютером."""
+        return self.backend(hostrules)
+
+    def _pop_idle(self, key: PoolKey) -> Optional[IdleConnection]:
+        expired = []
+        found: Optional[IdleConnection] = None
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, released = idle.pop()
+                if now - released <= self.max_idle:
+                    found = (conn, released)
+                    break
+                expired.append(conn)
+        for old_conn in expired:
+            self.discard(old_conn)
+        return found
+
+    def _is_alive(self, conn: SMBConnection) -> bool:
+        try:
+            conn.echo(b'ping', timeout=ECHO_TIMEOUT)
+        except Exception:
+            return False
+        return True
+
+
+pool = ConnectionPool()
@@ -1,94 +1,274 @@
-# В модуле представлены классы для подключения и управления операциями на удаленных ПК
-import logging
-from typing import List, Optional
-
-from smb import smb_constants as cnst
-from smb.base import SharedFile
-from smb.SMBConnection import SMBConnection
-
-from service.models import RemoteDir, RemoteHost
-
-logger = logging.getLogger('service')
-
-
-class HostPC:
-    """Класс управляет процессом подключения и взаимодействия с удаленноым компьютером."""
-
-    def __init__(self, hostrules: RemoteHost):
-        self.host = hostrules.host
-        self.pcname = hostrules.pcname
-        self.username = hostrules.username
-        self.pwd = hostrules.pwd
-        self.namelocalpc = hostrules.namelocalpc
-
-    def connection(self) -> SMBConnection:
-        """Метод осуществляет подключение к удаленному компьютеру."""
-        try:
-            conn = SMBConnection(self.username, self.pwd, self.namelocalpc, self.pcname)
-            conn.connect(self.host, 139, timeout=20)
-            return conn
-        except OSError:
-            logger.warning(f'Fail connect to host {self.pcname}, {self.host}\n\n')
-            return False
-
-    def remote_map(self, location: RemoteDir) -> List[Optional[SharedFile]]:
-        """Метод возвращает список файлов и каталогов на удаленном компьютере."""
-        conn = self.connection()
-        if not conn:
-            return []
-        items = conn.listPath(location.drive, location.dir)
-        conn.close()
-        if not items:
-            return []
-        return items
-
-    def remote_dirs(self, location: RemoteDir) -> List[Optional[SharedFile]]:
-        """Метод возвращает список каталогов на удаленном компьютере."""
-        conn = self.connection()
-        if not conn:
-            return []
-        dirs = conn.listPath(
-            location.drive,
-            location.dir,
-            search=cnst.SMB_FILE_ATTRIBUTE_DIRECTORY,
-        )
-        conn.close()
-        if not dirs:
-            return []
-        return dirs
-
-    def remote_files(self, location: RemoteDir) -> List[Optional[SharedFile]]:
-        """Метод возвращает список файлов на удаленном компьютере."""
-        conn = self.connection()
-        if not conn:
-            return []
-        files = conn.listPath(
-            location.drive,
-            location.dir,
-            search=cnst.SMB_FILE_ATTRIBUTE_ARCHIVE | cnst.SMB_FILE_ATTRIBUTE_INCL_NORMAL,
-            timeout=10,
-        )
-        conn.close()
-        if not files:
-            return []
-        return files
-
-    def file_exists(self, remote_file: SharedFile, location: RemoteDir) -> SharedFile:
-        """Метод проверяет наличие файла на удаленном компьютере."""
-        file_path = f'{location.dir}{remote_file.filename}'
-        try:
-            self.connection().getAttributes(location.drive, file_path)
-            self.connection().close()
-            return True
-        except Exception:
-            return False
-
-    def delete_file(self, remote_file: SharedFile, location: RemoteDir) -> bool:
-        """Метод удаляет файл на удаленном компьютере."""
-        conn = self.connection()
-        if not conn:
-            return False
-        file_path = f'{location.dir}{remote_file.filename}'
-        conn.deleteFiles(location.drive, file_path, delete_matching_folders=True)
-        conn.close()
-        return True
+# В модуле представлены классы для подключения и управления операциями на удаленных ПК
+import logging
+import operator
+import time
+from contextlib import contextmanager
+from functools import reduce
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from smb import smb_constants as cnst
+from smb.base import SharedFile
+from smb.smb_structs import OperationFailure
+from smb.SMBConnection import SMBConnection
+
+from service.models import RemoteDir, RemoteHost, Timeouts
+from service.worker.metrics import TimedConnection, metrics
+from service.worker.pool import ConnectionPool
+from service.worker.pool import pool as shared_pool
+from service.worker.retry import BROKEN_CONNECTION, HostUnavailable, backoff_delay, breakers
+from service.worker.throttle import ThrottledConnection, limiters
+
+logger = logging.getLogger('service')
+
+ALL_ENTRIES = reduce(operator.or_, (
+    cnst.SMB_FILE_ATTRIBUTE_READONLY,
+    cnst.SMB_FILE_ATTRIBUTE_HIDDEN,
+    cnst.SMB_FILE_ATTRIBUTE_SYSTEM,
+    cnst.SMB_FILE_ATTRIBUTE_DIRECTORY,
+    cnst.SMB_FILE_ATTRIBUTE_ARCHIVE,
+    cnst.SMB_FILE_ATTRIBUTE_INCL_NORMAL,
+))
+FILE_ENTRIES = cnst.SMB_FILE_ATTRIBUTE_ARCHIVE | cnst.SMB_FILE_ATTRIBUTE_INCL_NORMAL
+
+
+def operation_timeouts(timeouts: Timeouts) -> Dict[str, float]:
+    """Функция сопоставляет операциям метрик таймауты из настроек хоста."""
+    return {
+        'list': timeouts.listing,
+        'stat': timeouts.stat,
+        'retrieve': timeouts.transfer,
+        'store': timeouts.transfer,
+        'delete': timeouts.modify,
+        'rename': timeouts.modify,
+        'mkdir': timeouts.modify,
+    }
+
+
+class HostPC:
+    """Класс управляет процессом подключения и взаимодействия с удаленноым компьютером.
+
+    Соединения берутся из общего пула ConnectionPool, поэтому несколько экземпляров HostPC
+    для одного хоста используют одни и те же SMB сессии. Время каждой операции с
+    удаленным компьютером записывается в метрики с меткой правила rule, передача данных
+    ограничивается общим для хоста TokenBucket, если в настройках заданы rate_limits.
+
+    Операции повторяются при сетевых сбоях по политике hostrules.retry, после серии сбоев
+    общий для хоста CircuitBreaker отключает хост и обращения к нему сразу завершаются
+    ошибкой HostUnavailable.
+    """
+
+    def __init__(
+        self, hostrules: RemoteHost, pool: Optional[ConnectionPool] = None, rule: str = '',
+    ):
+        self.hostrules = hostrules
+        self.host = hostrules.host
+        self.pcname = hostrules.pcname
+        self.breaker = breakers.breaker(hostrules)
+        self._rule = rule
+        self._pool = pool or shared_pool
+        self._bucket = limiters.bucket(hostrules)
+        self._timeouts = operation_timeouts(hostrules.timeouts)
+
+    def location_key(self, location: RemoteDir) -> str:
+        """Метод возвращает строковый ключ каталога на этом компьютере для индексов и отчетов."""
+        return f'{self.host}/{location.drive}{location.dir}'
+
+    @contextmanager
+    def session(self) -> Iterator[SMBConnection]:
+        """Метод выдает соединение из пула и возвращает его обратно после использования.
+
+        Соединение, на котором произошел сетевой сбой, в пул не возвращается, сбой
+        учитывается в CircuitBreaker хоста. Операции получают таймауты из настроек хоста.
+
+        Yields:
+            SMBConnection: соединение с учетом времени операций в метриках.
+
+        Raises:
+            BROKEN_CONNECTION: хост отключен после серии сбоев (HostUnavailable) или
+                к нему не удалось подключиться.
+        """
+        self.breaker.check()
+        try:
+            conn = self._pool.acquire(self.hostrules, self._rule)
+        except BROKEN_CONNECTION:
+            self.breaker.failure()
+            raise
+        timed = TimedConnection(conn, metrics, self._rule, self.host, self._timeouts)
+        try:
+            yield timed if self._bucket is None else ThrottledConnection(timed, self._bucket)
+        finally:
+            if isinstance(timed.last_error, BROKEN_CONNECTION):
+                self._pool.discard(conn)
+                self.breaker.failure()
+            else:
+                self._pool.release(self.hostrules, conn)
+                self.breaker.success()
+
+    def call(self, op: str, action: Callable[[SMBConnection], Any]) -> Any:
+        """Метод выполняет action(conn) в сессии с повторами при сетевых сбоях.
+
+        Задержка между попытками растет экспоненциально со случайным разбросом, повторы
+        прекращаются, если хост отключен CircuitBreaker.
+
+        Arguments:
+            op (str): имя операции для учета повторов в метриках.
+            action (Callable): операция над соединением.
+
+        Raises:
+            BROKEN_CONNECTION: сбой последней попытки или HostUnavailable от CircuitBreaker.
+        """
+        policy = self.hostrules.retry
+        for attempt in range(1, policy.attempts):
+            try:
+                return self._attempt(action)
+            except BROKEN_CONNECTION as exc:
+                if isinstance(exc, HostUnavailable) or not self.breaker.available:
+                    raise
+            metrics.retry(self._rule, self.host, op)
+            time.sleep(backoff_delay(policy, attempt))
+        return self._attempt(action)
+
+    def remote_map(self, location: RemoteDir) -> List[Optional[SharedFile]]:
+        """Метод возвращает список файлов и каталогов на удаленном компьютере."""
+        return self._list(location, ALL_ENTRIES)
+
+    def remote_dirs(self, location: RemoteDir) -> List[Optional[SharedFile]]:
+        """Метод возвращает список каталогов на удаленном компьютере."""
+        return self._list(location, cnst.SMB_FILE_ATTRIBUTE_DIRECTORY)
+
+    def remote_files(self, location: RemoteDir) -> List[Optional[SharedFile]]:
+        """Метод возвращает список файлов на удаленном компьютере."""
+        return self._list(location, FILE_ENTRIES)
+
+    def file_exists(self, remote_file: SharedFile, location: RemoteDir) -> bool:
+        """Метод проверяет наличие файла на удаленном компьютере."""
+        return self.stat_file(remote_file.filename, location) is not None
+
+    def stat_file(self, filename: str, location: RemoteDir) -> Optional[SharedFile]:
+        """Метод возвращает атрибуты файла на удаленном компьютере или None.
+
+        Имя в возвращаемом SharedFile приводится к filename, как в результатах listPath.
+        """
+        try:
+            attributes = self.call('stat', lambda conn: conn.getAttributes(
+                location.drive, f'{location.dir}{filename}',
+            ))
+        except Exception:
+            return None
+        attributes.filename = filename
+        return attributes
+
+    def rename_file(self, old_name: str, new_name: str, location: RemoteDir) -> bool:
+        """Метод переименовывает файл внутри каталога на удаленном компьютере."""
+        old_path = f'{location.dir}{old_name}'
+        new_path = f'{location.dir}{new_name}'
+        rename = operator.methodcaller('rename', location.drive, old_path, new_path)
+        try:
+            self.call('rename', rename)
+        except Exception:
+            location_key = self.location_key(location)
+            logger.warning(f'Fail rename {old_name} in {location_key}')
+            return False
+        return True
+
+    def delete_file(self, remote_file: SharedFile, location: RemoteDir) -> bool:
+        """Метод удаляет файл на удаленном компьютере."""
+        file_path = f'{location.dir}{remote_file.filename}'
+        try:
+            self.call('delete', lambda conn: conn.deleteFiles(
+                location.drive, file_path, delete_matching_folders=True,
+            ))
+        except Exception:
+            location_key = self.location_key(location)
+            logger.warning(f'Fail delete {remote_file.filename} in {location_key}')
+            return False
+        return True
+
+    def delete_files(self, files: List[SharedFile], location: RemoteDir) -> List[SharedFile]:
+        """Метод удаляет файлы одного каталога в одной сессии.
+
+        Ошибка удаления одного файла не прерывает удаление остальных, после обрыва
+        соединения удаление продолжается в новой сессии по политике повторов.
+
+        Returns:
+            List[SharedFile]: успешно удаленные файлы.
+        """
+        deleted: List[SharedFile] = []
+        pending = list(files)
+
+        def delete_batch(conn: SMBConnection) -> None:
+            while pending:
+                remote_file = pending[0]
+                if self._delete_file(conn, remote_file, location):
+                    deleted.append(remote_file)
+                pending.pop(0)
+
+        try:
+            self.call('delete', delete_batch)
+        except BROKEN_CONNECTION:
+            logger.warning(f'Fail connect to host {self.pcname}, {self.host}\n\n')
+        return deleted
+
+    def create_dir(self, location: RemoteDir) -> bool:
+        """Метод создает каталог на удаленном компьютере."""
+        try:
+            self.call('mkdir', lambda conn: conn.createDirectory(
+                location.drive, location.dir.rstrip('/'),
+            ))
+        except Exception:
+            location_key = self.location_key(location)
+            logger.warning(f'Fail create {location_key}')
+            return False
+        return True
+
+    def list_dir(self, location: RemoteDir, recursive: bool = False) -> List[SharedFile]:
+        """Метод возвращает листинг каталога, с recursive - вместе с подкаталогами.
+
+        В отличие от remote_files ошибка чтения каталога не заменяется пустым листингом:
+        OSError при отказе подключения и OperationFailure для отсутствующего или
+        недоступного каталога передаются вызывающему.
+        """
+        search = ALL_ENTRIES if recursive else FILE_ENTRIES
+        return [item for item in self._list_path(location, search) if item]
+
+    def _list(self, location: RemoteDir, search: int) -> List[Optional[SharedFile]]:
+        try:
+            return self._list_path(location, search)
+        except OSError:
+            logger.warning(f'Fail connect to host {self.pcname}, {self.host}\n\n')
+        except OperationFailure:
+            location_key = self.location_key(location)
+            logger.warning(f'Fail read {location_key} on host {self.pcname}')
+        return []
+
+    def _list_path(self, location: RemoteDir, search: int) -> List[Optional[SharedFile]]:
+        list_path = operator.methodcaller('listPath', location.drive, location.dir, search=search)
+        return self.call('list', list_path) or []
+
+    def _attempt(self, action: Callable[[SMBConnection], Any]) -> Any:
+        with self.session() as conn:
+            return action(conn)
+
+    def _delete_file(
+        self,
+        conn: SMBConnection,
+        remote_file: SharedFile,
+        location: RemoteDir,
+    ) -> bool:
+        """Метод удаляет один файл каталога location.
+
+        Returns:
+            bool: True если файл удален.
+
+        Raises:
+            BROKEN_CONNECTION: разрыв соединения, call повторяет удаление в новой сессии.
+        """
+        file_path = f'{location.dir}{remote_file.filename}'
+        try:
+            conn.deleteFiles(location.drive, file_path)
+        except BROKEN_CONNECTION:  # noqa: WPS329 разрыв соединения повторяет call
+            raise
+        except Exception:
+            logger.warning(f'Fail delete {remote_file.filename} on host {self.host}')
+            return False
+        return True
@@ -0,0 +1,117 @@
+# В модуле представлен расчет удаления старых копий по политике хранения целевого каталога
+from dataclasses import dataclass, field
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smb.base import SharedFile
+
+from service.models import RemoteDir, Retention, TargetData
+
+# Ключ периода по времени копии, копии одного периода имеют одинаковый ключ
+PeriodKey = Callable[[datetime], Any]
+# Периоды GFS: имя поля keep_<период> и ключ периода по времени копии
+PERIODS: Tuple[Tuple[str, PeriodKey], ...] = (
+    ('daily', lambda moment: moment.date()),
+    ('weekly', lambda moment: moment.isocalendar()[:2]),
+    ('monthly', lambda moment: (moment.year, moment.month)),
+)
+
+
+@dataclass
+class PlannedFile:
+    """Копия в целевом каталоге, время ее исходного файла и причины сохранения."""
+
+    file: SharedFile
+    created: datetime
+    reasons: List[str] = field(default_factory=list)
+
+    def describe(self, action: str) -> str:
+        """Метод возвращает строку плана с действием action и причинами сохранения."""
+        created = self.created.strftime('%Y-%m-%d %H:%M')
+        filename = self.file.filename
+        line = f'  {action:<6} {created} {filename}'
+        if not self.reasons:
+            return line
+        reasons = ', '.join(self.reasons)
+        return f'{line} ({reasons})'
+
+
+@dataclass
+class RetentionPlan:
+    """План очистки одного целевого каталога или его подкаталога в режиме recursive."""
+
+    target: TargetData
+    target_dir: RemoteDir
+    location: str
+    keep: List[PlannedFile]
+    delete: List[PlannedFile]
+
+    def lines(self) -> List[str]:
+        """Метод формирует текстовое описание плана для режима без удаления."""
+        keep_count = len(self.keep)
+        delete_count = len(self.delete)
+        lines = [f'{self.location}: keep {keep_count}, delete {delete_count}']
+        lines.extend(planned.describe('keep') for planned in self.keep)
+        lines.extend(planned.describe('delete') for planned in self.delete)
+        return lines
+
+
+def effective_policy(target: TargetData) -> Optional[Retention]:
+    """Функция возвращает политику хранения каталога с учетом target_limit_count.
+
+    target_limit_count задает keep_last, если он не указан в retention явно. Политика,
+    которая не сохраняет ни одной копии, не применяется.
+    """
+    policy = target.retention or Retention()
+    if target.target_limit_count and not policy.keep_last:
+        policy = policy.copy(update={'keep_last': target.target_limit_count})
+    if not any((policy.keep_last, policy.keep_daily, policy.keep_weekly, policy.keep_monthly)):
+        return None
+    return policy
+
+
+def mark_periods(ordered: List[PlannedFile], period: str, period_key: PeriodKey, limit: int):
+    """Функция отмечает самую новую копию каждого из limit последних периодов period."""
+    seen: Dict[Any, PlannedFile] = {}
+    for planned in ordered:
+        if len(seen) >= limit:
+            return
+        key = period_key(planned.created)
+        if key not in seen:
+            seen[key] = planned
+            planned.reasons.append(period)
+
+
+def plan_target(
+    target: TargetData,
+    target_dir: RemoteDir,
+    location: str,
+    dated_files: List[Tuple[SharedFile, datetime]],
+    policy: Retention,
+) -> RetentionPlan:
+    """Функция распределяет копии каталога на сохраняемые и удаляемые.
+
+    Arguments:
+        target (TargetData): целевой каталог.
+        target_dir (RemoteDir): очищаемый каталог, target_dir цели или его подкаталог.
+        location (str): ключ каталога для отчета.
+        dated_files (List[Tuple[SharedFile, datetime]]): копии и время их исходных файлов.
+        policy (Retention): политика хранения.
+    """
+    ordered = sorted(
+        (PlannedFile(archive_file, created) for archive_file, created in dated_files),
+        key=attrgetter('created'),
+        reverse=True,
+    )
+    for last in ordered[:policy.keep_last]:
+        last.reasons.append('last')
+    for period, period_key in PERIODS:
+        mark_periods(ordered, period, period_key, getattr(policy, f'keep_{period}'))
+    return RetentionPlan(
+        target=target,
+        target_dir=target_dir,
+        location=location,
+        keep=[kept for kept in ordered if kept.reasons],
+        delete=[old for old in reversed(ordered) if not old.reasons],
+    )
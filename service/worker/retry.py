@@ -0,0 +1,97 @@
+# В модуле представлены повторы операций при сетевых сбоях и отключение недоступных хостов
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from smb.base import NotConnectedError, SMBTimeout
+
+from service.models import RemoteHost, RetryPolicy
+
+# Сбои соединения, после которых операцию имеет смысл повторить
+BROKEN_CONNECTION = (NotConnectedError, SMBTimeout, OSError)
+
+
+class HostUnavailable(OSError):
+    """Обращение к хосту отклонено: хост отключен после серии сбоев."""
+
+
+def backoff_delay(policy: RetryPolicy, attempt: int) -> float:
+    """Функция возвращает задержку перед повтором номер attempt (full jitter)."""
+    ceiling = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)  # noqa: S311 разброс задержки, а не секрет
+
+
+class CircuitBreaker:
+    """Автомат отключения хоста после серии сетевых сбоев.
+
+    После failures сбоев подряд обращения к хосту сразу завершаются HostUnavailable, не
+    дожидаясь таймаута. Через reset секунд пропускается одно пробное обращение: успех
+    включает хост, сбой снова отключает его на reset секунд.
+    """
+
+    def __init__(self, host: str, failures: int = 3, reset: float = 60):
+        self.host = host
+        self.failures = failures
+        self.reset = reset
+        self._failed = 0
+        self._opened: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        with self._lock:
+            return self._opened is None or (self._expired() and not self._probing)
+
+    def check(self) -> None:
+        """Метод разрешает обращение к хосту или отклоняет его.
+
+        Raises:
+            HostUnavailable: хост отключен.
+        """
+        with self._lock:
+            if self._opened is None:
+                return
+            if not self._expired() or self._probing:
+                raise HostUnavailable(f'host {self.host} is unavailable')
+            self._probing = True
+
+    def success(self) -> None:
+        with self._lock:
+            self._failed = 0
+            self._opened = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failed += 1
+            self._probing = False
+            if self._failed >= self.failures:
+                self._opened = time.monotonic()
+
+    def _expired(self) -> bool:
+        if self._opened is None:
+            return False
+        return time.monotonic() - self._opened >= self.reset
+
+
+class CircuitBreakers:
+    """Реестр автоматов отключения, один CircuitBreaker на хост для всех правил."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, hostrules: RemoteHost) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(hostrules.host)
+            if breaker is None:
+                breaker = CircuitBreaker(hostrules.host)
+                self._breakers[hostrules.host] = breaker
+            breaker.failures = max(hostrules.retry.breaker_failures, 1)
+            breaker.reset = hostrules.retry.breaker_reset
+            return breaker
+
+
+breakers = CircuitBreakers()
@@ -0,0 +1,153 @@
+# В модуле представлен планировщик параллельного копирования файлов
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List
+
+from service.worker.metrics import metrics
+from service.worker.stream import MB
+
+logger = logging.getLogger('service')
+
+
+@dataclass
+class TargetStats:
+    """Статистика копирования в один целевой каталог."""
+
+    files: int = 0
+    errors: int = 0
+    bytes: int = 0
+    seconds: float = 0
+    hash_seconds: float = 0
+
+    @property
+    def mb_per_sec(self) -> float:
+        if not self.seconds:
+            return 0
+        return self.bytes / MB / self.seconds
+
+    @property
+    def hash_mb_per_sec(self) -> float:
+        """Скорость хеширования, по ней выбирается алгоритм контрольных сумм."""
+        if not self.hash_seconds:
+            return 0
+        return self.bytes / MB / self.hash_seconds
+
+    def summary(self) -> str:
+        """Метод возвращает строку отчета о копировании в целевой каталог."""
+        megabytes = self.bytes / MB
+        parts = (
+            f'files={self.files}',
+            f'errors={self.errors}',
+            f'{megabytes:.1f} MB',
+            f'{self.mb_per_sec:.1f} MB/s',
+            f'hash {self.hash_seconds:.2f}s',
+            f'({self.hash_mb_per_sec:.0f} MB/s)',
+        )
+        return ' '.join(parts)
+
+
+class TransferStats:
+    """Потокобезопасный накопитель статистики копирования по целевым каталогам.
+
+    Каждая передача дополнительно записывается в метрики запуска с меткой правила rule.
+    """
+
+    def __init__(self, rule: str = ''):
+        self.rule = rule
+        self.targets: Dict[str, TargetStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, target: str, size: int, seconds: float, success: bool, hash_seconds: float = 0,
+    ) -> None:
+        metrics.transfer(self.rule, target, size, seconds, success)
+        with self._lock:
+            stats = self.targets.setdefault(target, TargetStats())
+            stats.seconds += seconds
+            stats.hash_seconds += hash_seconds
+            if success:
+                stats.files += 1
+                stats.bytes += size
+            else:
+                stats.errors += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Метод возвращает копию текущей статистики для отчета о ходе выполнения."""
+        with self._lock:
+            return {
+                target: {
+                    'files': stats.files,
+                    'errors': stats.errors,
+                    'bytes': stats.bytes,
+                    'mb_per_sec': round(stats.mb_per_sec, 3),
+                }
+                for target, stats in self.targets.items()
+            }
+
+    def report(self) -> List[str]:
+        with self._lock:
+            return [
+                f'{target}: {stats.summary()}'
+                for target, stats in self.targets.items()
+            ]
+
+
+def completed(result: bool) -> 'Future[bool]':
+    """Функция возвращает уже выполненную задачу, например для файла из каталога."""
+    future: 'Future[bool]' = Future()
+    future.set_result(result)
+    return future
+
+
+class TransferScheduler:
+    """Планировщик параллельных задач копирования с ограничениями на хосты.
+
+    Общее количество одновременных задач ограничено max_workers, количество задач,
+    одновременно работающих с одним хостом (источником или приемником) - max_host_workers.
+
+    Attributes:
+        max_workers (int): общее ограничение на количество одновременных копирований.
+        max_host_workers (int): ограничение на количество одновременных копирований для хоста.
+    """
+
+    def __init__(self, max_workers: int = 1, max_host_workers: int = 1):
+        self.max_workers = max(max_workers, 1)
+        self.max_host_workers = max(max_host_workers, 1)
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='transfer')
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'TransferScheduler':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def submit(
+        self, hosts: Iterable[str], func: Callable[..., bool], *args: Any,
+    ) -> 'Future[bool]':
+        """Метод ставит задачу в очередь, задача стартует после получения слотов всех hosts."""
+        slots = [self._slot(host) for host in sorted(set(hosts))]
+        return self._executor.submit(self._run, slots, func, *args)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_host_workers)
+            return self._host_slots[host]
+
+    def _run(
+        self, slots: List[threading.BoundedSemaphore], func: Callable[..., bool], *args: Any,
+    ) -> bool:
+        # Слоты берутся в порядке сортировки имен хостов, что исключает взаимную блокировку
+        with ExitStack() as stack:
+            for slot in slots:
+                stack.enter_context(slot)
+            success = func(*args)
+        return success
@@ -0,0 +1,104 @@
+# В модуле представлен отбор файлов источника для архивации
+import fnmatch
+import math
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import List, Optional, Pattern
+
+from smb.base import SharedFile
+
+from service.models import Selection
+from service.worker.walker import TreeEntry
+
+REGEX_PREFIX = 're:'
+DAY_SECONDS = 86400
+
+
+def pattern_regex(pattern: str) -> str:
+    """Функция переводит шаблон в регулярное выражение.
+
+    Шаблон glob должен совпасть с именем целиком, регулярное выражение 're:' ищется
+    в любом месте имени.
+    """
+    if pattern.startswith(REGEX_PREFIX):
+        return pattern[len(REGEX_PREFIX):]
+    translated = fnmatch.translate(pattern)
+    return fr'\A{translated}'
+
+
+def compile_patterns(patterns: List[str]) -> Optional[Pattern[str]]:
+    """Функция объединяет шаблоны в одно регулярное выражение."""
+    if not patterns:
+        return None
+    regexes = [pattern_regex(pattern) for pattern in patterns]
+    joined = '|'.join(f'(?:{regex})' for regex in regexes)
+    return re.compile(joined, re.IGNORECASE)
+
+
+def age_limit(now: datetime, days: float) -> float:
+    """Функция возвращает время изменения файла, который старше now на days дней."""
+    return now.timestamp() - days * DAY_SECONDS
+
+
+class FileSelector:
+    """Отбор файлов по правилам Selection и сроку хранения source_storage_days.
+
+    Границы по времени изменения вычисляются один раз при создании. Листинг каталога
+    сортируется по времени изменения, окно по времени находится двоичным поиском,
+    остальные условия проверяются только для файлов внутри окна.
+
+    Срок хранения трактуется как в прежнем period_control: при storage_days != 0 файл
+    отбирается, если он изменен не позже, чем storage_days дней назад, при
+    storage_days = 0 - если месяц изменения совпадает с текущим.
+    """
+
+    def __init__(self, selection: Selection, storage_days: int, now: Optional[datetime] = None):
+        now = now or datetime.now()
+        self.min_size = selection.min_size
+        self.max_size = selection.max_size
+        self.month = now.month if storage_days == 0 else None
+        self.oldest = -math.inf
+        self.newest = math.inf
+        if storage_days != 0:
+            self.newest = (now - timedelta(days=storage_days)).timestamp()
+        if selection.min_age_days is not None:
+            self.newest = min(self.newest, age_limit(now, selection.min_age_days))
+        if selection.max_age_days is not None:
+            self.oldest = age_limit(now, selection.max_age_days)
+        self._include = compile_patterns(selection.include)
+        self._exclude = compile_patterns(selection.exclude)
+
+    def accepts(self, source_file: SharedFile) -> bool:
+        """Метод проверяет один файл, используется при потоковом обходе дерева."""
+        if self.oldest <= source_file.last_write_time <= self.newest:
+            return self._matches(source_file)
+        return False
+
+    def select(self, entries: List[TreeEntry]) -> List[TreeEntry]:
+        """Метод отбирает файлы листинга, результат упорядочен по времени изменения."""
+        ordered = sorted(entries, key=lambda entry: entry[1].last_write_time)
+        times = [entry[1].last_write_time for entry in ordered]
+        start = bisect_left(times, self.oldest)
+        end = bisect_right(times, self.newest)
+        window = ordered[start:end]
+        return [entry for entry in window if self._matches(entry[1])]
+
+    def _matches(self, source_file: SharedFile) -> bool:
+        if not self._size_matches(source_file.file_size):
+            return False
+        if not self._name_matches(source_file.filename):
+            return False
+        if self.month is None:
+            return True
+        return datetime.fromtimestamp(source_file.last_write_time).month == self.month
+
+    def _size_matches(self, size: int) -> bool:
+        if self.min_size is not None and size < self.min_size:
+            return False
+        return self.max_size is None or size <= self.max_size
+
+    def _name_matches(self, filename: str) -> bool:
+        if self._include is not None and not self._include.search(filename):
+            return False
+        return self._exclude is None or not self._exclude.search(filename)
@@ -0,0 +1,118 @@
+# В модуле представлена проверка, что файлы источника больше не записываются
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from smb.base import SharedFile
+
+from service.models import RemoteDir
+from service.worker.remotehost import HostPC
+from service.worker.walker import TreeEntry, subdir
+
+logger = logging.getLogger('service')
+
+# Снимок файла для сравнения листингов: размер и время изменения
+Snapshot = Tuple[int, float]
+# Проверка, что файл уже архивирован и не требует проверки
+Archived = Callable[[TreeEntry], bool]
+# Файлы одного каталога
+Entries = List[TreeEntry]
+
+
+def snapshot(remote_file: SharedFile) -> Snapshot:
+    return remote_file.file_size, remote_file.last_write_time
+
+
+class StabilityCheck:
+    """Отбор файлов, размер и время изменения которых не менялись quiet_seconds секунд.
+
+    Файл, время изменения которого старше quiet_seconds, считается записанным без
+    проверки (часы источника и сервиса предполагаются синхронными). Остальные файлы
+    сравниваются с повторным листингом их каталога, выполненным не раньше чем через
+    quiet_seconds после первого. Файл, который за это время изменился или исчез,
+    считается еще записываемым и в этом запуске не копируется. Содержимое файлов
+    повторно не читается, каждый каталог перечитывается одним запросом listPath.
+
+    Attributes:
+        host (HostPC): компьютер источника.
+        root (RemoteDir): корневой каталог источника.
+        quiet_seconds (float): период, в течение которого файл не должен меняться.
+        workers (int): количество одновременных повторных листингов.
+    """
+
+    def __init__(self, host: HostPC, root: RemoteDir, quiet_seconds: float, workers: int = 4):
+        self.host = host
+        self.root = root
+        self.quiet_seconds = quiet_seconds
+        self.workers = max(workers, 1)
+
+    def stable(
+        self,
+        entries: Iterable[TreeEntry],
+        archived: Optional[Archived] = None,
+    ) -> Iterator[TreeEntry]:
+        """Метод выдает файлы entries, которые не менялись в течение quiet_seconds.
+
+        Файлы обрабатываются по каталогам по мере поступления. Давно измененные файлы и
+        файлы, для которых archived возвращает True, выдаются сразу. Остальные файлы
+        каталога проверяются повторным листингом в фоне, не задерживая следующие каталоги.
+
+        Yields:
+            TreeEntry: файл, который не менялся в течение quiet_seconds.
+        """
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='stability') as executor:
+            checks: List['Future[Entries]'] = []
+            for relative, group in groupby(entries, key=itemgetter(0)):
+                listed_at = time.monotonic()
+                settled, recent = self._split(group, archived)
+                yield from settled
+                if recent:
+                    checks.append(executor.submit(self._check, relative, recent, listed_at))
+                while checks and checks[0].done():
+                    yield from checks.pop(0).result()
+            for check in checks:
+                yield from check.result()
+
+    def is_quiet(self, source_file: SharedFile) -> bool:
+        """Метод проверяет, что файл изменялся не позже чем quiet_seconds назад."""
+        return time.time() - source_file.last_write_time >= self.quiet_seconds
+
+    def _split(
+        self, group: Iterable[TreeEntry], archived: Optional[Archived],
+    ) -> Tuple[Entries, Entries]:
+        """Метод делит файлы каталога на не требующие проверки и недавно измененные."""
+        settled: Entries = []
+        recent: Entries = []
+        for entry in group:
+            if self._settled(entry, archived):
+                settled.append(entry)
+            else:
+                recent.append(entry)
+        return settled, recent
+
+    def _settled(self, entry: TreeEntry, archived: Optional[Archived]) -> bool:
+        if self.is_quiet(entry[1]):
+            return True
+        return archived is not None and archived(entry)
+
+    def _check(self, relative: str, recent: Entries, listed_at: float) -> Entries:
+        remaining = listed_at + self.quiet_seconds - time.monotonic()
+        time.sleep(max(remaining, 0))
+        relisted = self._relist(relative)
+        stable = []
+        for entry in recent:
+            source_file = entry[1]
+            if relisted.get(source_file.filename) != snapshot(source_file):
+                logger.info(f'{source_file.filename} is still being written, skipped')
+                continue
+            stable.append(entry)
+        return stable
+
+    def _relist(self, relative: str) -> Dict[str, Snapshot]:
+        files = self.host.remote_files(subdir(self.root, relative))
+        return {
+            remote_file.filename: snapshot(remote_file) for remote_file in files if remote_file
+        }
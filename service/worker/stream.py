@@ -0,0 +1,286 @@
+# В модуле представлены средства потокового копирования данных между удаленными ПК
+import threading
+from typing import Any, Callable, List, Optional, Sequence
+
+MB = 1024 * 1024
+
+Transfer = Callable[[Any], Any]
+Wrapper = Callable[[Any], Any]
+# Ошибки ветвей общей передачи, None для успешной записи
+BranchErrors = List[Optional[BaseException]]
+
+
+class PipeAbortedError(Exception):
+    """Передача данных через буфер прервана одной из сторон."""
+
+
+class RingBuffer:
+    """Кольцевой буфер ограниченного размера для передачи данных между двумя потоками.
+
+    Поток чтения с источника вызывает write, поток записи в целевой каталог вызывает read.
+    При заполнении буфера write блокируется, поэтому объем памяти на одну передачу не
+    превышает capacity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._head = 0
+        self._size = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def write(self, chunk: bytes) -> int:
+        """Метод помещает данные в буфер, ожидая освобождения места."""
+        view = memoryview(chunk)
+        while view:
+            with self._cond:
+                self._cond.wait_for(self._writable)
+                self._raise_error()
+                written = self._put(view[:self.capacity - self._size])
+                self._cond.notify_all()
+            view = view[written:]
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        """Метод забирает из буфера не более size байт, b'' означает конец данных."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._size or self._closed or self._error)
+            self._raise_error()
+            if size < 0 or size > self._size:
+                size = self._size
+            chunk = self._take(size)
+            self._cond.notify_all()
+        return chunk
+
+    def close(self) -> None:
+        """Метод отмечает окончание данных со стороны источника."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def abort(self, error: BaseException) -> None:
+        """Метод прерывает передачу, обе стороны получат исключение PipeAbortedError."""
+        with self._cond:
+            self._error = error
+            self._cond.notify_all()
+
+    def _writable(self) -> bool:
+        return self._size < self.capacity or self._error is not None
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise PipeAbortedError(str(self._error)) from self._error
+
+    def _put(self, view: memoryview) -> int:
+        tail = (self._head + self._size) % self.capacity
+        first = min(len(view), self.capacity - tail)
+        # запись срезами копирует данные в буфер без промежуточных объектов
+        self._data[tail:tail + first] = view[:first]  # noqa: WPS362
+        self._data[:len(view) - first] = view[first:]  # noqa: WPS362
+        self._size += len(view)
+        return len(view)
+
+    def _take(self, size: int) -> bytes:
+        first = min(size, self.capacity - self._head)
+        chunk = bytes(self._data[self._head:self._head + first])
+        if first < size:
+            chunk += bytes(self._data[:size - first])
+        self._head = (self._head + size) % self.capacity
+        self._size -= size
+        return chunk
+
+
+def pipe_copy(download: Transfer, upload: Transfer, capacity: int) -> None:
+    """Функция одновременно читает данные из источника и записывает их в целевой каталог.
+
+    Arguments:
+        download (Transfer): функция, записывающая данные источника в переданный файл_объект.
+        upload (Transfer): функция, читающая данные из переданного файл_объекта.
+        capacity (int): максимальный объем данных в памяти на одну передачу.
+
+    Raises:
+        PipeAbortedError: передача прервана ошибкой источника.
+        Exception: ошибка записи в целевой каталог.
+    """
+    pipe = RingBuffer(capacity)
+    errors: List[Exception] = []
+
+    def produce() -> None:
+        try:
+            download(pipe)
+        except Exception as exc:
+            errors.append(exc)
+            pipe.abort(exc)
+        finally:
+            pipe.close()
+
+    producer = threading.Thread(target=produce, name='pipe-download', daemon=True)
+    producer.start()
+    try:
+        upload(pipe)
+    except Exception as exc:
+        pipe.abort(exc)
+        raise
+    finally:
+        producer.join()
+    if errors:
+        raise PipeAbortedError(str(errors[0])) from errors[0]
+
+
+class SkippingWriter:
+    """Файл_объект, который пропускает первые skip байт и передает остальное в sink.
+
+    Используется для приемника, который продолжает запись недокачанного файла, когда
+    источник читается с начала.
+    """
+
+    def __init__(self, sink: Any, skip: int):
+        self.sink = sink
+        self.skip = skip
+
+    def write(self, chunk: bytes) -> int:
+        view = memoryview(chunk)
+        if self.skip:
+            skipped = min(self.skip, len(view))
+            self.skip -= skipped
+            view = view[skipped:]
+        if view:
+            self.sink.write(view)
+        return len(chunk)
+
+    def close(self) -> None:
+        self.sink.close()
+
+
+class FanOutWriter:
+    """Файл_объект, который передает каждый блок данных во все ветви.
+
+    Ветвь - кольцевой буфер приемника и файл_объект записи в него с методом close,
+    например сжатие.
+    Запись блока завершается, когда блок помещен в буферы всех ветвей, поэтому источник
+    читается со скоростью самого медленного приемника. Ошибка ветви отключает только ее,
+    после отключения всех ветвей запись прерывается исключением PipeAbortedError.
+    """
+
+    def __init__(self, pipes: List[RingBuffer], writers: List[Any]):
+        self.pipes = pipes
+        self.writers = writers
+        self.errors: BranchErrors = [None for _ in pipes]
+
+    def write(self, chunk: bytes) -> int:
+        for index, writer in enumerate(self.writers):
+            if self.errors[index] is not None:
+                continue
+            try:
+                writer.write(chunk)
+            except Exception as exc:
+                self._fail(index, exc)
+        if all(error is not None for error in self.errors):
+            raise PipeAbortedError('all targets failed')
+        return len(chunk)
+
+    def close(self) -> None:
+        """Метод завершает запись во все работающие ветви."""
+        for index, writer in enumerate(self.writers):
+            if self.errors[index] is None:
+                self._close(index, writer)
+
+    def abort(self, error: BaseException) -> None:
+        for index, branch_error in enumerate(self.errors):
+            if branch_error is None:
+                self._fail(index, error)
+
+    def _close(self, index: int, writer: Any) -> None:
+        try:
+            writer.close()
+        except Exception as exc:
+            self._fail(index, exc)
+            return
+        self.pipes[index].close()
+
+    def _fail(self, index: int, error: BaseException) -> None:
+        self.errors[index] = error
+        self.pipes[index].abort(error)
+
+
+def branch_writer(pipe: RingBuffer, wrap: Optional[Wrapper]) -> Any:
+    return pipe if wrap is None else wrap(pipe)
+
+
+def branch_writers(pipes: List[RingBuffer], wrappers: Sequence[Optional[Wrapper]]) -> List[Any]:
+    """Функция создает файл_объекты записи в буферы ветвей, без обертки - сам буфер."""
+    wraps = list(wrappers) or [None for _ in pipes]
+    return list(map(branch_writer, pipes, wraps))
+
+
+def consume(index: int, upload: Transfer, pipe: RingBuffer, errors: BranchErrors) -> None:
+    """Функция передает приемнику данные из буфера pipe, ошибка сохраняется в errors."""
+    try:
+        upload(pipe)
+    except Exception as exc:
+        errors[index] = exc
+        pipe.abort(exc)
+
+
+def start_consumers(
+    uploads: Sequence[Transfer], pipes: List[RingBuffer], errors: BranchErrors,
+) -> List[threading.Thread]:
+    consumers = [
+        threading.Thread(
+            target=consume,
+            args=(index, upload, pipe, errors),
+            name=f'fanout-upload-{index}',
+            daemon=True,
+        )
+        for index, (upload, pipe) in enumerate(zip(uploads, pipes))
+    ]
+    for consumer in consumers:
+        consumer.start()
+    return consumers
+
+
+def fanout_copy(
+    download: Transfer,
+    uploads: Sequence[Transfer],
+    capacity: int,
+    wrappers: Sequence[Optional[Wrapper]] = (),
+) -> BranchErrors:
+    """Функция читает данные источника один раз и одновременно записывает их в приемники.
+
+    Каждый приемник получает свой кольцевой буфер размером capacity, ошибка одного
+    приемника не прерывает запись в остальные. Функция wrappers по буферу приемника
+    создает файл_объект для записи в него, без wrappers или для None данные записываются
+    в буфер как есть.
+
+    Arguments:
+        download (Transfer): функция, записывающая данные источника в переданный файл_объект.
+        uploads (Sequence[Transfer]): функции, читающие данные из переданного файл_объекта.
+        capacity (int): максимальный объем данных в памяти на один приемник.
+        wrappers (Sequence[Wrapper]): функции, создающие файл_объект записи в буфер.
+
+    Returns:
+        BranchErrors: ошибки приемников, None для успешной записи.
+
+    Raises:
+        Exception: ошибка источника или PipeAbortedError, если отказали все приемники.
+    """
+    pipes = [RingBuffer(capacity) for _ in uploads]
+    fan = FanOutWriter(pipes, branch_writers(pipes, wrappers))
+    upload_errors: BranchErrors = [None for _ in pipes]
+    consumers = start_consumers(uploads, pipes, upload_errors)
+    try:
+        download(fan)
+    except Exception as exc:
+        fan.abort(exc)
+        raise
+    else:
+        fan.close()
+    finally:
+        for thread in consumers:
+            thread.join()
+    return [
+        upload_error or fan_error
+        for upload_error, fan_error in zip(upload_errors, fan.errors)
+    ]
@@ -0,0 +1,170 @@
+# В модуле представлено ограничение скорости обмена данными с удаленными компьютерами
+import threading
+import time
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from service.models import RateWindow, RemoteHost
+from service.worker.stream import MB
+
+# Объем, который можно передать без ожидания после простоя, в секундах текущей скорости
+BURST_SECONDS = 1
+# Максимальное время ожидания до повторной проверки скорости при смене интервала
+RECHECK_SECONDS = 1
+
+
+def window_rate(windows: List[RateWindow], moment: datetime) -> Optional[float]:
+    """Функция возвращает ограничение скорости в байтах в секунду, None - без ограничения."""
+    now = moment.time()
+    for window in windows:
+        if window.start <= window.end:
+            inside = window.start <= now < window.end
+        else:
+            inside = now >= window.start or now < window.end
+        if inside:
+            return None if window.mb_per_sec is None else window.mb_per_sec * MB
+    return None
+
+
+class TokenBucket:
+    """Ограничитель скорости по алгоритму token bucket.
+
+    Скорость пополнения определяется интервалом времени суток и пересчитывается при каждом
+    запросе, поэтому уже идущие передачи переходят на новую скорость при смене интервала.
+    Блок больше накопленного запаса передается в долг, следующие блоки ждут его погашения.
+
+    Attributes:
+        windows (List[RateWindow]): интервалы ограничения скорости.
+    """
+
+    def __init__(
+        self, windows: List[RateWindow], clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.windows = windows
+        self.clock = clock
+        self._tokens: float = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def rate(self) -> Optional[float]:
+        return window_rate(self.windows, self.clock())
+
+    def consume(self, size: int) -> None:
+        """Метод ожидает, пока ограничение скорости позволит передать size байт."""
+        while True:
+            with self._lock:
+                wait = self._take(size)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, RECHECK_SECONDS))
+
+    def _take(self, size: int) -> float:
+        rate = self.rate()
+        now = time.monotonic()
+        if rate is None:
+            self._tokens = 0
+            self._updated = now
+            return 0
+        refill = (now - self._updated) * rate
+        self._tokens = min(rate * BURST_SECONDS, self._tokens + refill)
+        self._updated = now
+        if self._tokens < 0:
+            return -self._tokens / rate
+        self._tokens -= size
+        return 0
+
+
+class RateLimiters:
+    """Реестр ограничителей скорости, один TokenBucket на хост для всех правил и передач."""
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, hostrules: RemoteHost) -> Optional[TokenBucket]:
+        """Метод возвращает ограничитель хоста, None если для хоста не заданы rate_limits.
+
+        Интервалы берутся из последних переданных настроек хоста.
+        """
+        if not hostrules.rate_limits:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(hostrules.host)
+            if bucket is None:
+                bucket = TokenBucket(hostrules.rate_limits)
+                self._buckets[hostrules.host] = bucket
+            bucket.windows = hostrules.rate_limits
+            return bucket
+
+
+class ThrottledWriter:
+    """Файл_объект, который передает данные в sink с ограничением скорости."""
+
+    def __init__(self, sink: Any, bucket: TokenBucket):
+        self.sink = sink
+        self.bucket = bucket
+
+    def write(self, chunk: bytes) -> Any:
+        self.bucket.consume(len(chunk))
+        return self.sink.write(chunk)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sink, name)
+
+
+class ThrottledReader:
+    """Файл_объект, который читает данные из source с ограничением скорости."""
+
+    def __init__(self, source: BinaryIO, bucket: TokenBucket):
+        self.source = source
+        self.bucket = bucket
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        self.bucket.consume(len(chunk))
+        return chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.source, name)
+
+
+class ThrottledConnection:
+    """Обертка SMBConnection, которая ограничивает скорость чтения и записи файлов."""
+
+    def __init__(self, conn: Any, bucket: TokenBucket):
+        self.conn = conn
+        self.bucket = bucket
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.conn, name)
+
+    def retrieveFile(  # noqa: N802 интерфейс SMBConnection
+        self, service_name: str, path: str, file_obj: Any, *args: Any, **kwargs: Any,
+    ) -> Any:
+        return self.conn.retrieveFile(
+            service_name, path, ThrottledWriter(file_obj, self.bucket), *args, **kwargs,
+        )
+
+    def retrieveFileFromOffset(  # noqa: N802 интерфейс SMBConnection
+        self, service_name: str, path: str, file_obj: Any, *args: Any, **kwargs: Any,
+    ) -> Any:
+        return self.conn.retrieveFileFromOffset(
+            service_name, path, ThrottledWriter(file_obj, self.bucket), *args, **kwargs,
+        )
+
+    def storeFile(  # noqa: N802 интерфейс SMBConnection
+        self, service_name: str, path: str, file_obj: BinaryIO, *args: Any, **kwargs: Any,
+    ) -> Any:
+        return self.conn.storeFile(
+            service_name, path, ThrottledReader(file_obj, self.bucket), *args, **kwargs,
+        )
+
+    def storeFileFromOffset(  # noqa: N802 интерфейс SMBConnection
+        self, service_name: str, path: str, file_obj: BinaryIO, *args: Any, **kwargs: Any,
+    ) -> Any:
+        return self.conn.storeFileFromOffset(
+            service_name, path, ThrottledReader(file_obj, self.bucket), *args, **kwargs,
+        )
+
+
+limiters = RateLimiters()
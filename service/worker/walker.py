@@ -0,0 +1,99 @@
+# В модуле представлен параллельный обход дерева каталогов на удаленном компьютере
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from smb.base import SharedFile
+
+from service.models import RemoteDir
+from service.worker.dirindex import SPECIAL_DIRS
+from service.worker.remotehost import HostPC
+
+logger = logging.getLogger('service')
+
+# Файл дерева и путь его каталога относительно корня обхода, '' - сам корень
+TreeEntry = Tuple[str, SharedFile]
+# Содержимое одного каталога без служебных записей
+Listing = List[SharedFile]
+
+
+def subdir(location: RemoteDir, relative: str) -> RemoteDir:
+    """Функция возвращает каталог relative внутри location, relative задается через '/'."""
+    if not relative:
+        return location
+    return RemoteDir(drive=location.drive, dir=f'{location.dir}{relative}/')
+
+
+def split_path(location: RemoteDir, path: str) -> Tuple[RemoteDir, str]:
+    """Функция делит путь файла относительно location на его каталог и имя файла."""
+    relative, _, name = path.rpartition('/')
+    return subdir(location, relative), name
+
+
+def child_path(relative: str, name: str) -> str:
+    return f'{relative}/{name}' if relative else name
+
+
+def visit(
+    relative: str,
+    entries: Listing,
+    schedule: Callable[[str], None],
+) -> Iterator[TreeEntry]:
+    """Функция выдает файлы каталога relative и ставит его подкаталоги в очередь обхода.
+
+    Yields:
+        TreeEntry: путь каталога относительно корня обхода и файл.
+    """
+    for entry in entries:
+        if entry.isDirectory:
+            schedule(child_path(relative, entry.filename))
+        else:
+            yield relative, entry
+
+
+class TreeWalker:
+    """Обход дерева каталогов с ограниченным количеством одновременных листингов.
+
+    Каждый каталог читается одним запросом listPath, подкаталоги ставятся в очередь по мере
+    обнаружения. Файлы выдаются сразу после чтения их каталога, поэтому потребитель
+    может начинать копирование, не дожидаясь окончания обхода.
+
+    Attributes:
+        host (HostPC): компьютер, на котором выполняется обход.
+        root (RemoteDir): корневой каталог обхода.
+        workers (int): количество одновременных запросов listPath.
+    """
+
+    def __init__(self, host: HostPC, root: RemoteDir, workers: int = 4):
+        self.host = host
+        self.root = root
+        self.workers = max(workers, 1)
+
+    def walk(self) -> Iterator[TreeEntry]:
+        """Метод выдает файлы дерева вместе с относительным путем их каталога.
+
+        Yields:
+            TreeEntry: путь каталога относительно root и файл.
+        """
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='walk') as executor:
+            pending: Dict['Future[Listing]', str] = {}
+
+            def schedule(relative: str) -> None:
+                pending[executor.submit(self._list, relative)] = relative
+
+            schedule('')
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative = pending.pop(future)
+                    yield from visit(relative, future.result(), schedule)
+
+    def _list(self, relative: str) -> Listing:
+        location = subdir(self.root, relative)
+        try:
+            entries = self.host.remote_map(location)
+        except Exception:
+            location_key = self.host.location_key(location)
+            logger.warning(f'Fail list {location_key}')
+            return []
+        return [entry for entry in entries if entry and entry.filename not in SPECIAL_DIRS]
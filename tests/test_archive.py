@@ -0,0 +1,67 @@
+import os
+import time
+from pathlib import Path
+
+from smb.smb_structs import OperationFailure
+
+from service.benchmark import SOURCE_DIR, SOURCE_DRIVE, build_rule
+from service.worker.archive import PART_SUFFIX, Actualize
+from service.worker.backends import LocalBackend, LocalConnection
+from service.worker.pool import ConnectionPool
+
+
+class LockedConnection(LocalConnection):
+    """Соединение имитатора, в котором файлы locked заняты и не удаляются."""
+
+    locked = ('archive_00000.bak',)
+
+    def deleteFiles(self, service_name, path_file_pattern, *args, **kwargs):  # noqa: N802
+        if Path(path_file_pattern).name in self.locked:
+            raise OperationFailure(f'Sharing violation on {path_file_pattern}', [])
+        return super().deleteFiles(service_name, path_file_pattern, *args, **kwargs)
+
+
+class LockedBackend(LocalBackend):
+    def __call__(self, hostrules):
+        return LockedConnection(self.root / hostrules.host, self.latency, self.bandwidth)
+
+
+def run_rule(rule, root: Path, backend: LocalBackend) -> Actualize:
+    pool = ConnectionPool(backend=backend)
+    archivator = Actualize(
+        rule.filesmap,
+        pool,
+        rule.name,
+        chunk_index_path=root / 'chunks.sqlite3',
+        catalog_path=root / 'catalog.sqlite3',
+    )
+    archivator.run()
+    pool.close()
+    return archivator
+
+
+def same_content(target: Path, source: Path, name: str) -> bool:
+    return (target / name).read_bytes() == (source / name).read_bytes()
+
+
+def test_locked_stale_copy_fails_only_its_file(tmp_path: Path):
+    rule = build_rule(2, 10_000, 1, tmp_path)
+    run_rule(rule, tmp_path, LocalBackend(tmp_path))
+    source = tmp_path / 'source' / SOURCE_DRIVE / SOURCE_DIR.strip('/')
+    target = tmp_path / 'target0' / SOURCE_DRIVE / 'backup'
+    previous = (target / 'archive_00000.bak').read_bytes()
+    changed_at = time.time() + 60
+    for source_file in source.iterdir():
+        source_file.write_bytes(os.urandom(10_000))
+        os.utime(source_file, (changed_at, changed_at))
+
+    run_rule(rule, tmp_path, LockedBackend(tmp_path))
+
+    assert (target / 'archive_00000.bak').read_bytes() == previous
+    assert (target / f'archive_00000.bak{PART_SUFFIX}').exists()
+    assert same_content(target, source, 'archive_00001.bak')
+
+    run_rule(rule, tmp_path, LocalBackend(tmp_path))
+
+    assert same_content(target, source, 'archive_00000.bak')
+    assert not (target / f'archive_00000.bak{PART_SUFFIX}').exists()
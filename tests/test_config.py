@@ -0,0 +1,137 @@
+import pickle  # noqa: S403 тест подменяет кэш правил
+from pathlib import Path
+
+import pytest
+import yaml
+
+from service import config
+from service.config import ConfigError, cache_path, compile_config, load_from_yaml
+
+HOST = {
+    'host': '10.0.0.1',
+    'pcname': 'pc',
+    'username': 'user',
+    'pwd': 'secret',  # noqa: S105 тестовые учетные данные
+    'namelocalpc': 'local',
+}
+
+
+def make_rule(name: str, source_host, target_host) -> dict:
+    return {
+        'name': name,
+        'method': 1,
+        'filesmap': {
+            'source_host': source_host,
+            'source_dir': {'drive': 'share', 'dir': '/source/'},
+            'rule': {'source_storage_days': 1},
+            'target': [{
+                'target_host': target_host,
+                'target_dir': {'drive': 'share', 'dir': '/backup/'},
+                'target_limit_count': 2,
+            }],
+        },
+    }
+
+
+def profiles_config(name: str = 'first') -> dict:
+    return {
+        'hosts': {'nas': HOST, 'office': dict(HOST, host='10.0.0.2')},
+        'rules': [make_rule(name, 'office', 'nas'), make_rule('second', HOST, 'nas')],
+    }
+
+
+def write_config(path: Path, data) -> Path:
+    path.write_text(yaml.safe_dump(data))
+    return path
+
+
+def test_profiles_are_resolved_and_shared():
+    first, second = compile_config(profiles_config())
+    assert first.filesmap.source_host.host == '10.0.0.2'
+    assert first.filesmap.target[0].target_host.host == '10.0.0.1'
+    assert second.filesmap.source_host.host == '10.0.0.1'
+    assert first.filesmap.target[0].target_host is second.filesmap.target[0].target_host
+
+
+def test_plain_rule_list_is_accepted():
+    rules = compile_config([make_rule('plain', HOST, HOST)])
+    assert [rule.name for rule in rules] == ['plain']
+
+
+def test_errors_are_collected_for_all_rules():
+    data = profiles_config()
+    data['hosts']['broken'] = {'host': 'x'}
+    data['rules'].append(make_rule('third', 'missing', 'nas'))
+    data['rules'].append({'method': 1})
+    with pytest.raises(ConfigError) as error:
+        compile_config(data)
+    messages = error.value.errors
+    assert len(messages) == 3
+    assert messages[0].startswith('host broken:')
+    assert messages[1].startswith('rule 2 third:')
+    assert 'unknown host profile missing' in messages[1]
+    assert messages[2].startswith('rule 3:')
+
+
+def test_rules_section_must_be_a_list():
+    with pytest.raises(ConfigError):
+        compile_config({'hosts': {}, 'rules': {'name': 'x'}})
+
+
+def test_cache_is_used_while_content_is_unchanged(tmp_path: Path, monkeypatch):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    rules = load_from_yaml(path)
+    assert cache_path(path).exists()
+
+    def no_compile(data):
+        raise AssertionError('config must be read from cache')
+
+    monkeypatch.setattr(config, 'compile_config', no_compile)
+    assert load_from_yaml(path) == rules
+
+
+def test_cache_is_rebuilt_when_content_changes(tmp_path: Path):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    load_from_yaml(path)
+    write_config(path, profiles_config('renamed'))
+    assert load_from_yaml(path)[0].name == 'renamed'
+    with open(cache_path(path), 'rb') as fh:
+        _, cached_rules = pickle.load(fh)  # noqa: S301 кэш создан load_from_yaml
+    assert cached_rules[0].name == 'renamed'
+
+
+def test_cache_is_rebuilt_when_models_change(tmp_path: Path, monkeypatch):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    load_from_yaml(path)
+    monkeypatch.setattr(config, 'schema_digest', lambda: b'changed models')
+    compiled = []
+    original = config.compile_config
+
+    def counting_compile(data):
+        compiled.append(data)
+        return original(data)
+
+    monkeypatch.setattr(config, 'compile_config', counting_compile)
+    load_from_yaml(path)
+    assert len(compiled) == 1
+
+
+@pytest.mark.parametrize('content', [b'', b'not a pickle', pickle.dumps(['no', 'key', 'pair'])])
+def test_corrupt_cache_is_ignored(tmp_path: Path, content: bytes):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    cache_path(path).write_bytes(content)
+    assert [rule.name for rule in load_from_yaml(path)] == ['first', 'second']
+    assert cache_path(path).read_bytes() != content
+
+
+def test_stale_cache_key_is_ignored(tmp_path: Path):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    stale = compile_config(profiles_config('stale'))
+    cache_path(path).write_bytes(pickle.dumps(('old key', stale)))
+    assert load_from_yaml(path)[0].name == 'first'
+
+
+def test_cache_can_be_disabled(tmp_path: Path):
+    path = write_config(tmp_path / 'config.yaml', profiles_config())
+    load_from_yaml(path, use_cache=False)
+    assert not cache_path(path).exists()
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+
+from service.worker.cron import CronSchedule, parse_field
+
+
+def test_parse_field_ranges_steps_and_lists():
+    assert parse_field('*', 0, 5) == {0, 1, 2, 3, 4, 5}
+    assert parse_field('2-4', 0, 59) == {2, 3, 4}
+    assert parse_field('*/15', 0, 59) == {0, 15, 30, 45}
+    assert parse_field('10-30/10', 0, 59) == {10, 20, 30}
+    assert parse_field('50/5', 0, 59) == {50, 55}
+    assert parse_field('1,5,10-12', 1, 31) == {1, 5, 10, 11, 12}
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *',
+    '* * * * * *',
+    '60 * * * *',
+    '* 24 * * *',
+    '* * 0 * *',
+    '* * 32 * *',
+    '* * * 13 *',
+    '* * * * 8',
+    '5-1 * * * *',
+    '*/0 * * * *',
+    'a * * * *',
+    '1,,2 * * * *',
+    '@yearly',
+])
+def test_invalid_expression_is_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_next_after_is_strictly_later():
+    schedule = CronSchedule('30 2 * * *')
+    assert schedule.next_after(datetime(2024, 3, 1, 2, 30)) == datetime(2024, 3, 2, 2, 30)
+    assert schedule.next_after(datetime(2024, 3, 1, 2, 29, 59)) == datetime(2024, 3, 1, 2, 30)
+
+
+def test_next_after_with_steps_and_lists():
+    schedule = CronSchedule('*/20 8-9,18 * * *')
+    moment = datetime(2024, 3, 1, 9, 41)
+    runs = []
+    for _ in range(4):
+        moment = schedule.next_after(moment)
+        runs.append(moment)
+    assert runs == [
+        datetime(2024, 3, 1, 18, 0),
+        datetime(2024, 3, 1, 18, 20),
+        datetime(2024, 3, 1, 18, 40),
+        datetime(2024, 3, 2, 8, 0),
+    ]
+
+
+def test_day_of_month_or_day_of_week():
+    # 13 число или пятница, как в cron
+    schedule = CronSchedule('0 0 13 * 5')
+    moment = datetime(2024, 9, 1)
+    runs = []
+    for _ in range(4):
+        moment = schedule.next_after(moment)
+        runs.append(moment.date().isoformat())
+    assert runs == ['2024-09-06', '2024-09-13', '2024-09-20', '2024-09-27']
+
+
+def test_restricted_day_with_any_weekday():
+    schedule = CronSchedule('0 0 13 * *')
+    assert schedule.next_after(datetime(2024, 9, 1)) == datetime(2024, 9, 13)
+    weekly = CronSchedule('0 0 * * 7')
+    assert weekly.next_after(datetime(2024, 9, 1)) == datetime(2024, 9, 8)
+
+
+def test_month_and_year_rollover():
+    monthly = CronSchedule('@monthly')
+    assert monthly.next_after(datetime(2024, 1, 31, 23, 59)) == datetime(2024, 2, 1)
+    assert monthly.next_after(datetime(2024, 12, 15)) == datetime(2025, 1, 1)
+    end_of_month = CronSchedule('0 12 31 * *')
+    assert end_of_month.next_after(datetime(2024, 1, 31, 12, 0)) == datetime(2024, 3, 31, 12, 0)
+    leap_day = CronSchedule('0 0 29 2 *')
+    assert leap_day.next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+
+
+def test_expression_that_never_fires():
+    schedule = CronSchedule('0 0 30 2 *')
+    with pytest.raises(ValueError):
+        schedule.next_after(datetime(2024, 1, 1))
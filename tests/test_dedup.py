@@ -0,0 +1,43 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+
+from service.benchmark import SOURCE_DIR, SOURCE_DRIVE, build_rule
+from service.worker import dedup
+from service.worker.archive import Actualize
+from service.worker.backends import LocalBackend
+from service.worker.pool import ConnectionPool
+from service.worker.remotehost import HostPC
+
+
+@pytest.fixture
+def pool(tmp_path: Path):
+    connection_pool = ConnectionPool(backend=LocalBackend(tmp_path))
+    yield connection_pool
+    connection_pool.close()
+
+
+def test_restore_nested_file_from_mirrored_chunk_store(tmp_path: Path, pool: ConnectionPool):
+    rule = build_rule(1, 50_000, 1, tmp_path, transfer_mode='dedup', recursive=True)
+    source = tmp_path / 'source' / SOURCE_DRIVE / SOURCE_DIR.strip('/')
+    nested = source / 'sub' / 'deeper'
+    nested.mkdir(parents=True)
+    (nested / 'nested.bak').write_bytes(os.urandom(70_000))
+    Actualize(
+        rule.filesmap,
+        pool,
+        rule.name,
+        chunk_index_path=tmp_path / 'chunks.sqlite3',
+        catalog_path=tmp_path / 'catalog.sqlite3',
+    ).run()
+    target = rule.filesmap.target[0]
+    backup = tmp_path / 'target0' / SOURCE_DRIVE / 'backup'
+    assert (backup / 'sub' / 'deeper' / dedup.CHUNK_DIR).is_dir()
+    target_host = HostPC(target.target_host, pool)
+    for relative in ('archive_00000.bak', 'sub/deeper/nested.bak'):
+        output = io.BytesIO()
+        size = dedup.restore(target_host, target.target_dir, relative, output)
+        assert output.getvalue() == (source / relative).read_bytes()
+        assert size == len(output.getvalue())
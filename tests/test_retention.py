@@ -0,0 +1,152 @@
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+from smb.base import SharedFile
+
+from service.benchmark import SOURCE_DRIVE, build_rule
+from service.models import RemoteDir, Retention, TargetData
+from service.worker.archive import Actualize
+from service.worker.backends import LocalBackend
+from service.worker.dedup import CHUNK_DIR
+from service.worker.pool import ConnectionPool
+from service.worker.retention import effective_policy, plan_target
+
+TARGET_DIR = RemoteDir(drive='share', dir='/backup/')
+HOST = {'host': 'target', 'pcname': 'pc', 'username': 'user', 'pwd': '', 'namelocalpc': 'local'}
+
+
+def make_target(limit=None, **policy) -> TargetData:
+    return TargetData(
+        target_host=HOST,
+        target_dir=TARGET_DIR,
+        target_limit_count=limit,
+        retention=Retention(**policy) if policy else None,
+    )
+
+
+def shared_file(name: str) -> SharedFile:
+    return SharedFile(0, 0, 0, 0, 0, 0, 0, '', name)
+
+
+def plan(moments: List[datetime], target: TargetData):
+    dated_files = [
+        (shared_file(moment.strftime('%Y%m%d_%H%M.bak')), moment) for moment in moments
+    ]
+    policy = effective_policy(target)
+    assert policy is not None
+    return plan_target(target, TARGET_DIR, 'target/share/backup/', dated_files, policy)
+
+
+def kept(retention_plan) -> List[str]:
+    return sorted(planned.file.filename for planned in retention_plan.keep)
+
+
+def deleted(retention_plan) -> List[str]:
+    return [planned.file.filename for planned in retention_plan.delete]
+
+
+def test_policy_requires_something_to_keep():
+    assert effective_policy(make_target()) is None
+    assert effective_policy(make_target(0, keep_daily=0)) is None
+
+
+def test_limit_count_is_legacy_keep_last():
+    assert effective_policy(make_target(3)).keep_last == 3
+    assert effective_policy(make_target(3, keep_last=5)).keep_last == 5
+    assert effective_policy(make_target(3, keep_daily=2)).keep_last == 3
+
+
+def test_keep_last_matches_legacy_cleanup():
+    start = datetime(2024, 3, 1)
+    moments = [start + timedelta(hours=hour) for hour in (5, 1, 4, 2, 3)]
+    result = plan(moments, make_target(2))
+    assert kept(result) == ['20240301_0400.bak', '20240301_0500.bak']
+    assert deleted(result) == ['20240301_0100.bak', '20240301_0200.bak', '20240301_0300.bak']
+
+
+def test_keep_daily_keeps_newest_copy_of_each_day():
+    moments = [
+        datetime(2024, 3, 3, 23, 59),
+        datetime(2024, 3, 4, 0, 0),
+        datetime(2024, 3, 4, 12, 0),
+        datetime(2024, 3, 5, 6, 0),
+        datetime(2024, 3, 2, 10, 0),
+    ]
+    result = plan(moments, make_target(keep_daily=3))
+    assert kept(result) == ['20240303_2359.bak', '20240304_1200.bak', '20240305_0600.bak']
+    assert deleted(result) == ['20240302_1000.bak', '20240304_0000.bak']
+
+
+def test_keep_weekly_splits_weeks_on_monday():
+    moments = [
+        datetime(2024, 3, 3, 22, 0),  # воскресенье 9 недели
+        datetime(2024, 3, 3, 8, 0),
+        datetime(2024, 3, 4, 1, 0),  # понедельник 10 недели
+        datetime(2024, 2, 26, 9, 0),  # понедельник 9 недели
+        datetime(2024, 2, 25, 9, 0),  # воскресенье 8 недели
+    ]
+    result = plan(moments, make_target(keep_weekly=2))
+    assert kept(result) == ['20240303_2200.bak', '20240304_0100.bak']
+
+
+def test_keep_monthly_splits_months_at_midnight():
+    moments = [
+        datetime(2024, 1, 31, 23, 59),
+        datetime(2024, 1, 15, 0, 0),
+        datetime(2024, 2, 1, 0, 0),
+        datetime(2024, 2, 29, 12, 0),
+        datetime(2023, 12, 31, 12, 0),
+    ]
+    result = plan(moments, make_target(keep_monthly=2))
+    assert kept(result) == ['20240131_2359.bak', '20240229_1200.bak']
+    assert len(result.delete) == 3
+
+
+def test_periods_combine_and_report_reasons():
+    moments = [datetime(2024, 3, 1) - timedelta(days=days) for days in range(60)]
+    result = plan(moments, make_target(keep_last=2, keep_daily=3, keep_monthly=3))
+    reasons = {planned.file.filename: planned.reasons for planned in result.keep}
+    assert reasons['20240301_0000.bak'] == ['last', 'daily', 'monthly']
+    assert reasons['20240229_0000.bak'] == ['last', 'daily', 'monthly']
+    assert reasons['20240228_0000.bak'] == ['daily']
+    assert reasons['20240131_0000.bak'] == ['monthly']
+    assert len(result.keep) == 4
+    assert len(result.delete) == 56
+
+
+def test_recursive_retention_cleans_mirrored_subdirectories(tmp_path: Path):
+    rule = build_rule(1, 100, 1, tmp_path, recursive=True)
+    target = rule.filesmap.target[0]
+    target.target_limit_count = 1
+    backup = tmp_path / 'target0' / SOURCE_DRIVE / 'backup'
+    nested = backup / 'sub' / 'deeper'
+    chunks = backup / 'sub' / CHUNK_DIR
+    for directory in (nested, chunks):
+        directory.mkdir(parents=True)
+    for directory in (backup, backup / 'sub', nested, chunks):
+        for age in range(3):
+            copy_path = directory / f'copy_{age}.bak'
+            copy_path.write_bytes(b'copy')
+            moment = datetime(2024, 3, 1).timestamp() - age * 86400
+            os.utime(copy_path, (moment, moment))
+    pool = ConnectionPool(backend=LocalBackend(tmp_path))
+    with Actualize(
+        rule.filesmap,
+        pool,
+        rule.name,
+        chunk_index_path=tmp_path / 'chunks.sqlite3',
+        catalog_path=tmp_path / 'catalog.sqlite3',
+    ) as archivator:
+        locations = [retention_plan.location for retention_plan in archivator.retention_plan()]
+        assert archivator.garbage_clean()
+    pool.close()
+    assert sorted(locations) == [
+        'target0/share/backup/',
+        'target0/share/backup/sub/',
+        'target0/share/backup/sub/deeper/',
+    ]
+    for directory in (backup, backup / 'sub', nested):
+        assert sorted(path.name for path in directory.glob('*.bak')) == ['copy_0.bak']
+    assert len(list(chunks.iterdir())) == 3
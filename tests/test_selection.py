@@ -0,0 +1,113 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from smb.base import SharedFile
+
+from service.models import Selection
+from service.worker.selection import FileSelector
+
+NOW = datetime(2024, 3, 15, 0, 0)
+
+
+def source_file(name: str, moment: datetime, size: int = 100) -> SharedFile:
+    mtime = moment.timestamp()
+    return SharedFile(mtime, mtime, mtime, mtime, size, size, 0, '', name)
+
+
+def period_control(target_file: SharedFile, rule: int, now: datetime) -> bool:
+    """Прежняя проверка срока хранения Archivator.period_control с заданным now."""
+    file_date = datetime.fromtimestamp(target_file.last_write_time)
+    control_date = now - timedelta(days=rule)
+    if rule != 0:
+        return control_date >= file_date
+    return control_date.month == file_date.month
+
+
+def selected_names(selector: FileSelector, files):
+    return [entry[1].filename for entry in selector.select([('', file) for file in files])]
+
+
+def sample_files():
+    moments = [NOW - timedelta(hours=hours) for hours in range(0, 24 * 70, 7)]
+    moments.extend([
+        datetime(2024, 3, 1, 0, 0),
+        datetime(2024, 2, 29, 23, 59, 59),
+        datetime(2023, 3, 20, 12, 0),
+        NOW + timedelta(days=2),
+    ])
+    return [source_file(f'file_{number:04d}.bak', moment) for number, moment in enumerate(moments)]
+
+
+@pytest.mark.parametrize('storage_days', [0, 1, 7, 30, -1, -3])
+def test_select_matches_period_control(storage_days):
+    files = sample_files()
+    random.Random(storage_days).shuffle(files)
+    selector = FileSelector(Selection(), storage_days, NOW)
+    expected = sorted(
+        (file for file in files if period_control(file, storage_days, NOW)),
+        key=lambda file: file.last_write_time,
+    )
+    assert selected_names(selector, files) == [file.filename for file in expected]
+    assert [file for file in files if selector.accepts(file)] == [
+        file for file in files if period_control(file, storage_days, NOW)
+    ]
+
+
+def test_month_mode_ignores_year_and_day():
+    files = [
+        source_file('first_day.bak', datetime(2024, 3, 1, 0, 0)),
+        source_file('last_february.bak', datetime(2024, 2, 29, 23, 59, 59)),
+        source_file('last_year.bak', datetime(2023, 3, 31, 23, 59)),
+        source_file('april.bak', datetime(2024, 4, 1, 0, 0)),
+    ]
+    selector = FileSelector(Selection(), 0, NOW)
+    assert selected_names(selector, files) == ['last_year.bak', 'first_day.bak']
+
+
+def test_storage_days_window_edge_at_midnight():
+    edge = NOW - timedelta(days=3)
+    files = [
+        source_file('edge.bak', edge),
+        source_file('after_edge.bak', edge + timedelta(seconds=1)),
+        source_file('before_edge.bak', edge - timedelta(seconds=1)),
+    ]
+    selector = FileSelector(Selection(), 3, NOW)
+    assert selected_names(selector, files) == ['before_edge.bak', 'edge.bak']
+
+
+def test_age_window_edges_are_inclusive():
+    files = [
+        source_file('too_old.bak', NOW - timedelta(days=10, seconds=1)),
+        source_file('oldest.bak', NOW - timedelta(days=10)),
+        source_file('newest.bak', NOW - timedelta(days=2)),
+        source_file('too_new.bak', NOW - timedelta(days=2) + timedelta(seconds=1)),
+    ]
+    selection = Selection(min_age_days=2, max_age_days=10)
+    selector = FileSelector(selection, -1, NOW)
+    assert selected_names(selector, files) == ['oldest.bak', 'newest.bak']
+
+
+def test_empty_listing():
+    assert FileSelector(Selection(), 0, NOW).select([]) == []
+    assert FileSelector(Selection(), 5, NOW).select([]) == []
+
+
+def test_unsorted_input_is_filtered_and_ordered():
+    moments = [NOW - timedelta(days=days) for days in (4, 9, 1, 6, 3)]
+    files = [
+        source_file(f'day_{moment.day}.{extension}', moment, size)
+        for moment, extension, size in zip(
+            moments, ['bak', 'bak', 'bak', 'tmp', 'bak'], [10, 500, 500, 500, 500],
+        )
+    ]
+    selection = Selection(include=['*.BAK'], exclude=['re:_1[0-9]'], min_size=100)
+    selector = FileSelector(selection, 2, NOW)
+    names = selected_names(selector, files)
+    expected = [
+        file.filename
+        for file in sorted(files, key=lambda file: file.last_write_time)
+        if selector.accepts(file)
+    ]
+    assert names == expected
+    assert names == ['day_6.bak']
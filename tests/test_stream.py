@@ -0,0 +1,143 @@
+import io
+import threading
+from pathlib import Path
+
+import pytest
+
+from service.benchmark import SOURCE_DIR, SOURCE_DRIVE, build_rule
+from service.worker.archive import Actualize
+from service.worker.backends import LocalBackend
+from service.worker.pool import ConnectionPool
+from service.worker.stream import (
+    PipeAbortedError,
+    RingBuffer,
+    SkippingWriter,
+    fanout_copy,
+    pipe_copy,
+)
+
+PAYLOAD = bytes(range(256)) * 40
+
+
+def reader(sink: io.BytesIO, block: int = 7):
+    def upload(pipe):
+        while True:
+            chunk = pipe.read(block)
+            if not chunk:
+                return
+            sink.write(chunk)
+    return upload
+
+
+def writer(data: bytes, block: int = 13):
+    def download(fh):
+        for start in range(0, len(data), block):
+            fh.write(data[start:start + block])
+    return download
+
+
+def failing_upload(pipe):
+    pipe.read(5)
+    raise OSError('target is gone')
+
+
+class DeadHostBackend(LocalBackend):
+    """Имитатор хранилищ, в котором хост dead_host недоступен."""
+
+    def __init__(self, root: Path, dead_host: str):
+        super().__init__(root)
+        self.dead_host = dead_host
+
+    def __call__(self, hostrules):
+        if hostrules.host == self.dead_host:
+            raise OSError(f'{self.dead_host} is unreachable')
+        return super().__call__(hostrules)
+
+
+def test_ring_buffer_wraps_around():
+    pipe = RingBuffer(10)
+    pipe.write(b'abcdefgh')
+    assert pipe.read(6) == b'abcdef'
+    pipe.write(b'ijklmnop')
+    assert pipe.read() == b'ghijklmnop'
+
+
+def test_ring_buffer_blocks_until_read():
+    pipe = RingBuffer(16)
+    producer = threading.Thread(target=lambda: (writer(PAYLOAD)(pipe), pipe.close()))
+    producer.start()
+    received = io.BytesIO()
+    reader(received)(pipe)
+    producer.join()
+    assert received.getvalue() == PAYLOAD
+
+
+def test_ring_buffer_abort_reaches_reader():
+    pipe = RingBuffer(4)
+    pipe.abort(OSError('source failed'))
+    with pytest.raises(PipeAbortedError):
+        pipe.read()
+
+
+def test_pipe_copy_reports_source_error():
+    def broken_download(fh):
+        fh.write(b'partial')
+        raise OSError('source failed')
+
+    with pytest.raises(PipeAbortedError):
+        pipe_copy(broken_download, reader(io.BytesIO()), 8)
+
+
+def test_fanout_copy_isolates_failed_branch():
+    first, last = io.BytesIO(), io.BytesIO()
+    uploads = [reader(first), failing_upload, reader(last)]
+    errors = fanout_copy(writer(PAYLOAD), uploads, 32)
+    assert errors[0] is None
+    assert isinstance(errors[1], OSError)
+    assert errors[2] is None
+    assert first.getvalue() == PAYLOAD
+    assert last.getvalue() == PAYLOAD
+
+
+def test_fanout_copy_fails_when_all_branches_fail():
+    with pytest.raises(PipeAbortedError):
+        fanout_copy(writer(PAYLOAD), [failing_upload, failing_upload], 32)
+
+
+def test_skipping_writer_resumes_from_offset():
+    sink = io.BytesIO()
+    skipping = SkippingWriter(sink, 100)
+    writer(PAYLOAD, block=33)(skipping)
+    assert sink.getvalue() == PAYLOAD[100:]
+    assert skipping.skip == 0
+
+
+def test_fanout_copy_resumes_branch_from_offset():
+    fresh, resumed = io.BytesIO(), io.BytesIO()
+    wrappers = [None, lambda pipe: SkippingWriter(pipe, 500)]
+    errors = fanout_copy(writer(PAYLOAD), [reader(fresh), reader(resumed)], 64, wrappers)
+    assert errors == [None, None]
+    assert fresh.getvalue() == PAYLOAD
+    assert resumed.getvalue() == PAYLOAD[500:]
+
+
+@pytest.mark.parametrize('transfer_mode', ['tempfile', 'stream'])
+def test_missing_target_does_not_stop_others(tmp_path: Path, transfer_mode: str):
+    rule = build_rule(3, 50_000, 2, tmp_path, transfer_mode=transfer_mode, fanout=True)
+    for target in rule.filesmap.target:
+        target.target_host.retry.base_delay = 0
+    pool = ConnectionPool(backend=DeadHostBackend(tmp_path, 'target1'))
+    archivator = Actualize(
+        rule.filesmap,
+        pool,
+        rule.name,
+        chunk_index_path=tmp_path / 'chunks.sqlite3',
+        catalog_path=tmp_path / 'catalog.sqlite3',
+    )
+    archivator.run()
+    pool.close()
+    source = tmp_path / 'source' / SOURCE_DRIVE / SOURCE_DIR.strip('/')
+    for source_file in source.iterdir():
+        copied = tmp_path / 'target0' / SOURCE_DRIVE / 'backup' / source_file.name
+        assert copied.read_bytes() == source_file.read_bytes()
+    assert not list((tmp_path / 'target1' / SOURCE_DRIVE / 'backup').iterdir())
@@ -0,0 +1,98 @@
+from datetime import datetime, time
+
+import pytest
+
+from service.models import RateWindow
+from service.worker import throttle
+from service.worker.stream import MB
+from service.worker.throttle import TokenBucket, window_rate
+
+NOON = datetime(2024, 1, 1, 12, 0)
+NIGHT = datetime(2024, 1, 1, 23, 30)
+
+
+class FakeTime:
+    """Монотонные часы, которые sleep переводит вперед без ожидания."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeTime:
+    fake = FakeTime()
+    monkeypatch.setattr(throttle, 'time', fake)
+    return fake
+
+
+def window(start: str, end: str, mb_per_sec) -> RateWindow:
+    return RateWindow(start=start, end=end, mb_per_sec=mb_per_sec)
+
+
+def day_bucket(mb_per_sec: float = 1) -> TokenBucket:
+    return TokenBucket([window('09:00', '18:00', mb_per_sec)], clock=lambda: NOON)
+
+
+def test_window_rate_selects_window_by_time_of_day():
+    windows = [window('09:00', '18:00', 2), window('22:00', '06:00', 8)]
+    assert window_rate(windows, NOON) == 2 * MB
+    assert window_rate(windows, NIGHT) == 8 * MB
+    assert window_rate(windows, datetime(2024, 1, 2, 5, 59)) == 8 * MB
+    assert window_rate(windows, datetime(2024, 1, 1, 18, 0)) is None
+    assert window_rate(windows, datetime(2024, 1, 1, 9, 0)) == 2 * MB
+
+
+def test_window_rate_first_match_and_unlimited_window():
+    windows = [window('00:00', '23:59', None), window('09:00', '18:00', 2)]
+    assert window_rate(windows, NOON) is None
+    assert window_rate([], NOON) is None
+
+
+def test_yaml_minutes_are_read_as_time():
+    assert window(1080, 420, 1).start == time(18, 0)
+
+
+@pytest.mark.parametrize('mb_per_sec', [0, -1])
+def test_non_positive_rate_is_rejected(mb_per_sec):
+    with pytest.raises(ValueError):
+        window('09:00', '18:00', mb_per_sec)
+
+
+def test_bucket_waits_for_refill(clock):
+    bucket = day_bucket()
+    bucket.consume(MB)
+    bucket.consume(1)
+    assert clock.sleeps == [1]
+
+
+def test_bucket_repays_debt_of_large_block(clock):
+    bucket = day_bucket()
+    bucket.consume(3 * MB)
+    assert not clock.sleeps
+    bucket.consume(1)
+    assert clock.sleeps == [1, 1, 1]
+
+
+def test_bucket_burst_is_capped_after_idle(clock):
+    bucket = day_bucket()
+    clock.now += 100
+    bucket.consume(MB)
+    bucket.consume(MB)
+    assert not clock.sleeps
+    bucket.consume(1)
+    assert clock.sleeps == [1]
+
+
+def test_bucket_outside_windows_is_unlimited(clock):
+    bucket = TokenBucket([window('09:00', '18:00', 1)], clock=lambda: NIGHT)
+    for _ in range(10):
+        bucket.consume(MB)
+    assert not clock.sleeps